@@ -41,11 +41,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'viewer.metrics.MetricsMiddleware',
+    'viewer.instrumentation.RequestInstrumentationMiddleware',
+    'viewer.routing.ReadReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'viewer.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,9 +86,32 @@ DATABASES = {
         'PASSWORD': 'yourpassword',   # Your PostgreSQL password
         'HOST': 'localhost',          # Database host
         'PORT': '5432',               # Default PostgreSQL port
+        'CONN_MAX_AGE': 60,           # Keep connections open between requests
+        'CONN_HEALTH_CHECKS': True,   # and check them before reuse
     }
 }
 
+# Optional read-only replica that serves GET requests, so imports and
+# statistics on the primary do not compete with viewer traffic (see
+# viewer/routing.py). Set DATABASE_REPLICA_HOST to enable it.
+if os.environ.get('DATABASE_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DATABASE_REPLICA_HOST'],
+        'PORT': os.environ.get('DATABASE_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['viewer.routing.PrimaryReplicaRouter']
+DATABASE_REPLICA_ALIAS = 'replica'
+
+# Seconds a client keeps reading from the primary after a request that wrote,
+# covering replication lag
+DATABASE_STICKY_SECONDS = 5
+
+# Seconds before retrying a replica that could not be reached
+DATABASE_REPLICA_RETRY_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -126,6 +153,81 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'genomics/static'),  # Adjusted path
 ]
 
+# Per-request SQL and timing instrumentation (see viewer/instrumentation.py)
+
+REQUEST_INSTRUMENTATION = os.environ.get('REQUEST_INSTRUMENTATION', '') == '1'
+REQUEST_INSTRUMENTATION_SLOW_QUERIES = 5
+REQUEST_INSTRUMENTATION_DUPLICATE_THRESHOLD = 5
+
+# Staff-only ?_profile=cpu|mem request profiling (see viewer/profiling.py)
+
+REQUEST_PROFILING = True
+REQUEST_PROFILING_MAX_CONCURRENT = 1
+REQUEST_PROFILING_SAMPLE_INTERVAL = 0.001  # Seconds between stack samples
+
+# Request, cache, store and ingestion metrics served at /metrics (see viewer/metrics.py).
+# All processes add their counts to the same file, so keep it on a local disk
+
+METRICS_ENABLED = True
+METRICS_DB = os.path.join(BASE_DIR, 'data', 'metrics.sqlite3')
+METRICS_FLUSH_INTERVAL = 1.0  # Seconds between writes of a process's buffered counts
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'viewer.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# On-disk interaction store (see viewer/interaction_store.py)
+
+INTERACTION_STORE_DIR = os.path.join(BASE_DIR, 'data', 'interaction_store')
+
+# Resolutions (in nt) of the binned contact matrices kept per contig pair
+CONTACT_MATRIX_BIN_SIZES = [100, 1000, 10000, 100000, 1000000]
+
+# Memory-mapped k-mer index over all contigs used by /search/sequence/
+# (see viewer/sequence_index.py), rebuilt with `manage.py build_sequence_index`
+SEQUENCE_INDEX_DIR = os.path.join(BASE_DIR, 'data', 'sequence_index')
+
+# Most mismatches a sequence search may allow
+SEQUENCE_SEARCH_MAX_MISMATCHES = 3
+# Longest query a sequence search accepts, in bases
+SEQUENCE_SEARCH_MAX_LENGTH = 1000
+
+# Most regions, and most bases over all regions, one /regions/batch request
+# may fetch, and how close two regions of a contig must be to be read as one
+BATCH_REGION_LIMIT = 200
+BATCH_REGION_MAX_BASES = 2_000_000
+BATCH_REGION_MERGE_GAP = 1000
+
+# Background jobs run by `manage.py run_jobs` (see viewer/jobs.py): seconds
+# between polls of an empty queue and between heartbeats of a running job,
+# and seconds without a heartbeat after which a job is resumed elsewhere
+JOB_POLL_SECONDS = 2
+JOB_HEARTBEAT_SECONDS = 10
+JOB_STALE_SECONDS = 60
+
+# Values derived from the genome data (index page totals, ...) are cached
+# per data version, which each process rechecks every DATA_VERSION_SECONDS
+# (see viewer/data_version.py)
+DATA_VERSION_SECONDS = 5
+DATA_CACHE_SECONDS = 3600
+
+# Threads (and so database connections) per process used by the async views
+# under ASGI to run their reads concurrently (see viewer/async_views.py)
+ASYNC_READ_WORKERS = 8
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
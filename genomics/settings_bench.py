@@ -0,0 +1,18 @@
+"""
+Settings for running benchmarks against a local SQLite database.
+
+Usage:
+    DJANGO_SETTINGS_MODULE=genomics.settings_bench python manage.py benchmark_views --scales S M
+"""
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCH_DB', os.path.join(BASE_DIR, 'bench', 'bench.sqlite3')),
+    }
+}
+
+ALLOWED_HOSTS = ['localhost', '127.0.0.1', 'testserver']
+
+INTERACTION_STORE_DIR = os.path.join(BASE_DIR, 'bench', 'interaction_store')
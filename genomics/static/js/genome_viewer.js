@@ -8,7 +8,8 @@ function initGenomeViewer(
     highlightedFeatureEnd,
     nucleotideData,
     colorBy,
-    interactions
+    interactions,
+    coverage
 ) {
     // Show the loading overlay
     document.getElementById('loading-overlay').classList.remove('hidden');
@@ -27,25 +28,52 @@ function initGenomeViewer(
         window.location.href = `${window.location.pathname}?${params.toString()}`;
     });
 
-    // Map positions to features for quick lookup
-    const positionFeatureMap = {};
-
-    features.forEach((feature) => {
-        for (let pos = feature.start; pos <= feature.end; pos++) {
-            if (!positionFeatureMap[pos]) {
-                positionFeatureMap[pos] = [];
+    // Windows longer than this are drawn on a canvas instead of one element per nucleotide
+    const CANVAS_THRESHOLD = 10000;
+    const NT_COLORS = { A: '#99ccff', C: '#ff9999', G: '#99ff99', T: '#ffff99' };
+
+    // Feature coverage arrives as runs [start, end, featureIds] sorted by start,
+    // so tooltips are built once per run instead of once per nucleotide
+    const featureById = new Map(features.map(f => [f.id, f]));
+    const runTitles = coverage.map(run => run[2]
+        .map(id => featureById.get(id))
+        .filter(f => f)
+        .map(f => `${f.type}: ${f.description}`)
+        .join('\n'));
+
+    // Returns the index of the run covering pos, or -1
+    function runAt(pos) {
+        let lo = 0;
+        let hi = coverage.length - 1;
+        while (lo <= hi) {
+            const mid = (lo + hi) >> 1;
+            if (coverage[mid][1] < pos) {
+                lo = mid + 1;
+            } else if (coverage[mid][0] > pos) {
+                hi = mid - 1;
+            } else {
+                return mid;
             }
-            positionFeatureMap[pos].push(feature);
         }
-    });
+        return -1;
+    }
+
+    let highlightedFeatureId = null;
+    let canvasLayout = null;
 
     // Visualize sequence with highlighted features and coloring
     function displaySequence(seq, start) {
+        if (seq.length > CANVAS_THRESHOLD) {
+            drawSequenceCanvas(seq, start);
+            return;
+        }
+        canvasLayout = null;
         sequenceViewer.innerHTML = '';
 
         const seqLength = seq.length;
         const charsPerLine = Math.floor(sequenceViewer.clientWidth / 12); // Adjust based on nt-box width
         const lines = Math.ceil(seqLength / charsPerLine);
+        let runIndex = 0;
 
         for (let line = 0; line < lines; line++) {
             const lineStartIndex = line * charsPerLine;
@@ -64,11 +92,14 @@ function initGenomeViewer(
                 ntDiv.title = `Position ${pos}`;
                 ntDiv.id = `nt-box-${pos}`;
 
-                if (positionFeatureMap[pos]) {
+                // Positions only increase, so walk the runs alongside them
+                while (runIndex < coverage.length && coverage[runIndex][1] < pos) {
+                    runIndex++;
+                }
+                if (runIndex < coverage.length && coverage[runIndex][0] <= pos) {
                     ntDiv.classList.add('feature-nt');
                     // Add feature info to tooltip
-                    const featureInfo = positionFeatureMap[pos].map(f => `${f.type}: ${f.description}`).join('\n');
-                    ntDiv.title += `\nFeatures:\n${featureInfo}`;
+                    ntDiv.title += `\nFeatures:\n${runTitles[runIndex]}`;
                 }
 
                 if (highlightedFeatureStart && highlightedFeatureEnd &&
@@ -95,6 +126,133 @@ function initGenomeViewer(
         drawInteractions();
     }
 
+    function baseColor(seq, i) {
+        if (colorBy === 'nucleotide') {
+            return NT_COLORS[seq[i].toUpperCase()] || '#ffffff';
+        }
+        if (nucleotideData && nucleotideData[i] != null) {
+            return valueToColor(nucleotideData[i]);
+        }
+        return '#CCCCCC';
+    }
+
+    // Draw long windows on a canvas: each row holds basesPerRow nucleotides as
+    // colored cells, with a band below them for feature runs
+    function drawSequenceCanvas(seq, start) {
+        sequenceViewer.innerHTML = '';
+
+        const cell = seq.length > 200000 ? 1 : 2;
+        const baseHeight = 6;
+        const rowHeight = 11;
+        const width = sequenceViewer.clientWidth;
+        const basesPerRow = Math.max(1, Math.floor(width / cell));
+        const rows = Math.ceil(seq.length / basesPerRow);
+        canvasLayout = { start, cell, baseHeight, rowHeight, basesPerRow };
+
+        const canvas = document.createElement('canvas');
+        canvas.id = 'sequence-canvas';
+        canvas.width = width;
+        canvas.height = rows * rowHeight;
+        sequenceViewer.appendChild(canvas);
+        const ctx = canvas.getContext('2d');
+
+        // Consecutive bases of the same color are filled as one rectangle
+        for (let row = 0; row < rows; row++) {
+            const rowEnd = Math.min((row + 1) * basesPerRow, seq.length);
+            let i = row * basesPerRow;
+            let color = baseColor(seq, i);
+            while (i < rowEnd) {
+                let j = i + 1;
+                let next = null;
+                while (j < rowEnd && (next = baseColor(seq, j)) === color) {
+                    j++;
+                }
+                ctx.fillStyle = color;
+                ctx.fillRect((i - row * basesPerRow) * cell, row * rowHeight, (j - i) * cell, baseHeight);
+                i = j;
+                color = next;
+            }
+        }
+
+        // Feature coverage, one rectangle per run and row
+        ctx.fillStyle = 'grey';
+        coverage.forEach(run => fillRange(ctx, run[0], run[1], baseHeight + 1, 2));
+
+        if (highlightedFeatureStart && highlightedFeatureEnd) {
+            ctx.fillStyle = 'black';
+            fillRange(ctx, highlightedFeatureStart, highlightedFeatureEnd, baseHeight + 3, 2);
+        }
+
+        const highlighted = featureById.get(highlightedFeatureId);
+        if (highlighted) {
+            ctx.fillStyle = 'orange';
+            fillRange(ctx, highlighted.start, highlighted.end, 0, baseHeight + 5);
+        }
+
+        drawCanvasInteractions(ctx);
+
+        canvas.addEventListener('mousemove', function (event) {
+            const rect = canvas.getBoundingClientRect();
+            const pos = canvasPosition(event.clientX - rect.left, event.clientY - rect.top);
+            if (pos === null) {
+                canvas.title = '';
+                return;
+            }
+            const runIndex = runAt(pos);
+            canvas.title = `Position ${pos}` + (runIndex >= 0 ? `\nFeatures:\n${runTitles[runIndex]}` : '');
+        });
+    }
+
+    // Fills [from, to] (1-based, inclusive, clipped to the window) at offset y within each row
+    function fillRange(ctx, from, to, y, height) {
+        const { start, cell, rowHeight, basesPerRow } = canvasLayout;
+        let i = Math.max(from, start + 1) - start - 1;
+        const last = Math.min(to, endPos) - start - 1;
+        while (i <= last) {
+            const row = Math.floor(i / basesPerRow);
+            const rowLast = Math.min(last, (row + 1) * basesPerRow - 1);
+            ctx.fillRect((i - row * basesPerRow) * cell, row * rowHeight + y, (rowLast - i + 1) * cell, height);
+            i = rowLast + 1;
+        }
+    }
+
+    function canvasPoint(pos) {
+        const { start, cell, baseHeight, rowHeight, basesPerRow } = canvasLayout;
+        const i = pos - start - 1;
+        const row = Math.floor(i / basesPerRow);
+        return [(i - row * basesPerRow + 0.5) * cell, row * rowHeight + baseHeight / 2];
+    }
+
+    function canvasPosition(x, y) {
+        const { start, cell, rowHeight, basesPerRow } = canvasLayout;
+        const col = Math.floor(x / cell);
+        if (col >= basesPerRow) {
+            return null;
+        }
+        const pos = start + Math.floor(y / rowHeight) * basesPerRow + col + 1;
+        return pos <= endPos ? pos : null;
+    }
+
+    function drawCanvasInteractions(ctx) {
+        ctx.lineWidth = 1;
+        interactions.forEach(function (interaction) {
+            const fromPos = interaction.from_position;
+            const toPos = interaction.to_position;
+            if (fromPos <= startPos || fromPos > endPos || toPos <= startPos || toPos > endPos) {
+                return;
+            }
+            const [x1, y1] = canvasPoint(fromPos);
+            const [x2, y2] = canvasPoint(toPos);
+            const controlPointY = y1 - Math.min(100, Math.abs(x2 - x1) / 2);
+
+            ctx.strokeStyle = `rgba(255, 0, 0, ${interaction.weight})`;
+            ctx.beginPath();
+            ctx.moveTo(x1, y1);
+            ctx.bezierCurveTo(x1, controlPointY, x2, controlPointY, x2, y2);
+            ctx.stroke();
+        });
+    }
+
     // Function to map values between -1 and 1 to colors
     function valueToColor(value) {
         // Adjust value to be between -1 and 1
@@ -222,16 +380,23 @@ function initGenomeViewer(
 
     // Function to highlight a feature
     function highlightFeature(featureId) {
+        highlightedFeatureId = featureId;
+        if (canvasLayout) {
+            displaySequence(sequence, startPos);
+            return;
+        }
+
         // Remove previous highlights
         document.querySelectorAll('.highlighted-feature').forEach(function(elem) {
             elem.classList.remove('highlighted-feature');
         });
 
         // Find the feature
-        const feature = features.find(f => f.id === featureId);
+        const feature = featureById.get(featureId);
         if (feature) {
-            // Highlight the nucleotides in the feature
-            for (let pos = feature.start; pos <= feature.end; pos++) {
+            // Highlight the nucleotides of the feature within the window
+            const last = Math.min(feature.end, endPos);
+            for (let pos = Math.max(feature.start, startPos + 1); pos <= last; pos++) {
                 const ntDiv = document.getElementById(`nt-box-${pos}`);
                 if (ntDiv) {
                     ntDiv.classList.add('highlighted-feature');
@@ -301,4 +466,48 @@ function initGenomeViewer(
     window.addEventListener('resize', function () {
         displaySequence(sequence, startPos);
     });
-}
\ No newline at end of file
+}
+
+// Draw a binned contact matrix for a region as a heatmap on a canvas.
+// The payload size is bounded by maxBins regardless of how many interactions the region holds.
+function drawContactMatrix(canvas, contigName, start, end, maxBins = 500) {
+    const params = new URLSearchParams({ max_bins: maxBins });
+    if (start !== null && end !== null) {
+        params.set('start', start);
+        params.set('end', end);
+    }
+
+    return fetch(`/viewer/${encodeURIComponent(contigName)}/contact-matrix?${params.toString()}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+            return response.json();
+        })
+        .then(data => {
+            const firstBin = Math.floor((data.start - 1) / data.bin_size);
+            const lastBin = Math.floor((data.end - 1) / data.bin_size);
+            const nBins = lastBin - firstBin + 1;
+            const cellSize = canvas.width / nBins;
+            const maxValue = data.values.reduce((max, value) => Math.max(max, value), 0) || 1;
+
+            const ctx = canvas.getContext('2d');
+            ctx.fillStyle = '#ffffff';
+            ctx.fillRect(0, 0, canvas.width, canvas.height);
+
+            for (let i = 0; i < data.values.length; i++) {
+                // Log scale so that sparse long-range contacts remain visible
+                const intensity = Math.log1p(data.values[i]) / Math.log1p(maxValue);
+                ctx.fillStyle = `rgba(255, 0, 0, ${intensity})`;
+                ctx.fillRect(
+                    (data.cols[i] - firstBin) * cellSize,
+                    (data.rows[i] - firstBin) * cellSize,
+                    Math.max(cellSize, 1),
+                    Math.max(cellSize, 1)
+                );
+            }
+
+            canvas.title = `${data.start}-${data.end}, ${data.bin_size} nt bins`;
+            return data;
+        });
+}
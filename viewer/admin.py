@@ -1,15 +1,15 @@
 from django.contrib import admin
-from .models import Genome, Sequence, Feature, NucleotideData, Interaction, FeatureSummaryStat, RepeatRegionMethod, CasGene
+from .models import Genome, Sequence, Feature, NucleotideData, Interaction, FeatureSummaryStat, RepeatRegionMethod, CasGene, Job
 
 @admin.register(Genome)
 class GenomeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'strain_name', 'total_length', 'feature_count', 'repeat_region_count', 'has_crispr_repeat', 'cas_gene_count')
+    list_display = ('name', 'strain_name', 'total_length', 'contig_count', 'n50', 'l50', 'feature_count', 'repeat_region_count', 'has_crispr_repeat', 'cas_gene_count')
     list_filter = ('has_crispr_repeat',)
     search_fields = ('name', 'strain_name')
 
 @admin.register(Sequence)
 class SequenceAdmin(admin.ModelAdmin):
-    list_display = ('contig', 'genome', 'length')
+    list_display = ('contig', 'genome', 'length', 'gc_count', 'n_count', 'iupac_count')
     list_filter = ('genome',)
     search_fields = ('contig', 'genome__name')
 
@@ -17,7 +17,7 @@ class SequenceAdmin(admin.ModelAdmin):
 class FeatureAdmin(admin.ModelAdmin):
     list_display = ('id', 'sequence', 'type', 'start', 'end', 'strand')
     list_filter = ('type', 'sequence__genome')
-    search_fields = ('sequence__contig', 'type', 'attributes')
+    search_fields = ('sequence__contig', 'type', 'product', 'gene', 'name', 'locus_tag')
 
 @admin.register(NucleotideData)
 class NucleotideDataAdmin(admin.ModelAdmin):
@@ -46,4 +46,10 @@ class RepeatRegionMethodAdmin(admin.ModelAdmin):
 class CasGeneAdmin(admin.ModelAdmin):
     list_display = ('genome', 'name', 'count')
     list_filter = ('genome',)
-    search_fields = ('genome__name', 'name')
\ No newline at end of file
+    search_fields = ('genome__name', 'name')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'command', 'status', 'progress_done', 'progress_total', 'attempts', 'worker', 'created_at')
+    list_filter = ('status', 'command')
+    search_fields = ('command', 'message')
@@ -0,0 +1,217 @@
+"""
+Analytics pages. Their plotting and clustering dependencies (numpy, scipy,
+plotly) are imported inside the views that need them, so workers and
+management commands that only load the URLconf do not pay for them.
+"""
+from itertools import combinations
+import json
+
+from django.db.models import Avg, Count, StdDev, F, Sum
+from django.shortcuts import render
+
+from . import repeat_calls
+from .instrumentation import span
+from .models import Genome, Sequence, RepeatRegionMethod, RepeatCall, CasGene, GeneInfluence
+
+
+def cas_interactions(request):
+    TOP_N = 10  # Number of top genes to display
+
+    # Retrieve the full equation entry
+    equation_entry = GeneInfluence.objects.filter(gene_name='__equation__').first()
+    full_equation = equation_entry.full_equation if equation_entry else None
+
+    # Retrieve influence data excluding the equation entry
+    influences = GeneInfluence.objects.exclude(gene_name='__equation__')
+
+    # Get all influencers and sort them by the absolute value of their coefficients
+    all_influencers = list(influences)
+    all_influencers.sort(key=lambda x: abs(x.coefficient), reverse=True)
+
+    # Get top N influencers
+    top_influencers = all_influencers[:TOP_N]
+
+    context = {
+        'top_influencers': top_influencers,
+        'full_equation': full_equation,
+        'top_n': TOP_N,
+    }
+    return render(request, 'viewer/cas_interactions.html', context)
+
+def cas_heatmap(request):
+    import numpy as np
+    import plotly.graph_objs as go
+    from scipy.cluster import hierarchy
+
+    # Get all unique Cas genes
+    cas_genes = list(CasGene.objects.values_list('name', flat=True).distinct())
+    
+    # Get all genomes
+    genomes = list(Genome.objects.all().order_by('name'))
+    
+    # Create a matrix of Cas gene presence
+    heatmap_data = []
+    for genome in genomes:
+        genome_cas_genes = genome.cas_genes.values_list('name', flat=True)
+        row = [1 if gene in genome_cas_genes else 0 for gene in cas_genes]
+        heatmap_data.append(row)
+    
+    # Convert to numpy array
+    heatmap_data = np.array(heatmap_data)
+    
+    # Perform clustering
+    with span('cas_heatmap.linkage'):
+        row_linkage = hierarchy.linkage(heatmap_data, method='ward')
+        col_linkage = hierarchy.linkage(heatmap_data.T, method='ward')
+
+        # Reorder the data based on clustering
+        row_order = hierarchy.dendrogram(row_linkage, no_plot=True)['leaves']
+        col_order = hierarchy.dendrogram(col_linkage, no_plot=True)['leaves']
+
+    heatmap_data = heatmap_data[row_order, :][:, col_order]
+    
+    # Create heatmap
+    heatmap = go.Heatmap(
+        z=heatmap_data,
+        x=[cas_genes[i] for i in col_order],
+        y=[genomes[i].name for i in row_order],
+        colorscale=[[0, 'white'], [1, 'red']],
+    )
+    
+    layout = go.Layout(
+        title='Cas Gene Heatmap',
+        xaxis=dict(
+            title='Cas Genes',
+            tickangle=90,
+            side='bottom',
+            tickfont=dict(size=10),
+        ),
+        yaxis=dict(
+            title='Genomes',
+            tickfont=dict(size=10),
+            automargin=True,
+        ),
+        height=800,
+        width=1200,
+        margin=dict(l=200, r=50, b=200, t=50),
+    )
+    
+    fig = go.Figure(data=[heatmap], layout=layout)
+    
+    # Convert the figure to JSON
+    with span('cas_heatmap.plot_json'):
+        plot_json = fig.to_json()
+    
+    context = {
+        'plot_json': plot_json,
+    }
+    
+    return render(request, 'viewer/cas_heatmap.html', context)
+
+def crispr_plot(request):
+    genomes = Genome.objects.all().order_by('name').values_list('id', 'name')
+    methods = RepeatRegionMethod.objects.values_list('method', flat=True).distinct()
+
+    # Calls per genome and method, counted from the repeat call index
+    counts = {
+        (row['genome_id'], row['method']): row['count']
+        for row in RepeatCall.objects.values('genome_id', 'method').annotate(count=Count('*')).order_by()
+    }
+
+    scatter_data = []
+    for method1, method2 in combinations(methods, 2):
+        for genome_id, genome_name in genomes:
+            scatter_data.append({
+                'genome_name': genome_name,
+                'method1': method1,
+                'method2': method2,
+                'count1': counts.get((genome_id, method1), 0),
+                'count2': counts.get((genome_id, method2), 0),
+            })
+
+    context = {
+        'scatter_data': json.dumps(scatter_data),
+        'methods': list(methods),
+    }
+
+    return render(request, 'viewer/crispr_plot.html', context)
+
+def evaluation(request):
+    methods = list(RepeatRegionMethod.objects.values_list('method', flat=True).distinct().order_by('method'))
+
+    counts_per_method = {}
+    avg_length_per_method = {}
+    std_dev_per_method = {}
+    crispr_fraction_per_method = {}
+    crisprs_per_1000nt = {}
+
+    total_genome_length = Sequence.objects.aggregate(Sum('length'))['length__sum'] or 0
+
+    # Lengths here have always been end - start, one less than RepeatCall.length
+    span_length = F('length') - 1
+    stats = {
+        row['method']: row
+        for row in RepeatCall.objects.values('method').annotate(
+            calls=Count('*'),
+            avg=Avg(span_length),
+            std=StdDev(span_length),
+            total=Sum(span_length),
+        ).order_by()
+    }
+    repeats_by_method = repeat_calls.calls_by_method()
+
+    for method in methods:
+        method_stats = stats.get(method, {})
+        counts_per_method[method] = sum(len(calls) for calls in repeats_by_method[method].values())
+
+        avg_length = method_stats.get('avg')
+        std_dev = method_stats.get('std')
+        avg_length_per_method[method] = round(avg_length, 2) if avg_length else 0
+        std_dev_per_method[method] = round(std_dev, 2) if std_dev else 0
+
+        # Calculate fraction of genome that is CRISPR
+        total_crispr_length = method_stats.get('total') or 0
+        crispr_fraction_per_method[method] = (total_crispr_length / total_genome_length) if total_genome_length > 0 else 0
+
+        total_crisprs = method_stats.get('calls', 0)
+        crisprs_per_1000nt[method] = (total_crisprs / total_genome_length) * 1000 if total_genome_length > 0 else 0
+
+    # Distinct locations called by any method
+    locations = set()
+    for method in methods:
+        for sequence_id, calls in repeats_by_method[method].items():
+            locations.update((sequence_id, start, end) for start, end in calls)
+    total_repeats = len(locations)
+
+    def compute_overlap_matrix(min_overlap, percentage_overlap=None):
+        overlap_matrix = {}
+        for method1, method2 in combinations(methods, 2):
+            key = f"{method1}__{method2}"
+            overlap_matrix[key] = repeat_calls.count_overlaps(
+                repeats_by_method[method1], repeats_by_method[method2], min_overlap, percentage_overlap
+            )
+        return overlap_matrix
+
+    with span('evaluation.overlaps'):
+        overlap_matrix_100nt = compute_overlap_matrix(100)
+        overlap_matrix_1nt = compute_overlap_matrix(1)
+        overlap_matrix_80percent = compute_overlap_matrix(1, 0.8)
+
+    overlap_matrices = [
+        ('100nt', overlap_matrix_100nt, 'Overlap of Predictions between Methods (≥100 nt):'),
+        ('1nt', overlap_matrix_1nt, 'Overlap of Predictions between Methods (≥1 nt):'),
+        ('80percent', overlap_matrix_80percent, 'Overlap of Predictions between Methods (≥80% of sequence length):'),
+    ]
+
+    context = {
+        'methods': methods,
+        'counts_per_method': counts_per_method,
+        'avg_length_per_method': avg_length_per_method,
+        'std_dev_per_method': std_dev_per_method,
+        'total_repeats': total_repeats,
+        'overlap_matrices': overlap_matrices,
+        'crisprs_per_1000nt': crisprs_per_1000nt,
+        'crispr_fraction_per_method': crispr_fraction_per_method,
+    }
+
+    return render(request, 'viewer/evaluation.html', context)
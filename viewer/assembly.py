@@ -0,0 +1,68 @@
+"""
+Contig and assembly statistics, computed when sequences are loaded.
+
+The loaders set Sequence.length, gc_count, n_count and iupac_count from
+the parsed sequence text as they write it, and update_genome() then
+derives the genome's total length, contig count, N50 and L50 from the
+stored contig lengths. Views and statistics commands read these columns
+and never need the sequence text for sizes.
+"""
+from .models import Genome, Sequence
+
+# IUPAC ambiguity codes other than N
+AMBIGUITY_CODES = 'RYSWKMBDHV'
+
+
+def contig_fields(sequence):
+    """
+    Returns the Sequence statistics fields of a sequence.
+    """
+    upper = sequence.upper()
+    return {
+        'length': len(sequence),
+        'gc_count': upper.count('G') + upper.count('C'),
+        'n_count': upper.count('N'),
+        'iupac_count': sum(upper.count(code) for code in AMBIGUITY_CODES),
+    }
+
+
+def n50(lengths):
+    """
+    Returns (N50, L50) of contig lengths: the length of the contig that
+    brings the largest contigs to half the total length, and how many
+    contigs that takes. (0, 0) for no contigs.
+    """
+    lengths = sorted(lengths, reverse=True)
+    total = sum(lengths)
+    covered = 0
+    for count, length in enumerate(lengths, 1):
+        covered += length
+        if covered * 2 >= total:
+            return length, count
+    return 0, 0
+
+
+def genome_fields(lengths):
+    """
+    Returns the Genome assembly fields for its contig lengths.
+    """
+    lengths = list(lengths)
+    n50_length, l50_count = n50(lengths)
+    return {
+        'total_length': sum(lengths),
+        'contig_count': len(lengths),
+        'n50': n50_length,
+        'l50': l50_count,
+    }
+
+
+def update_genome(genome):
+    """
+    Recomputes the assembly fields of a genome from its stored contig lengths.
+    """
+    fields = genome_fields(Sequence.objects.filter(genome=genome).values_list('length', flat=True))
+    Genome.objects.filter(id=genome.id).update(**fields)
+    for name, value in fields.items():
+        setattr(genome, name, value)
+    return fields
+
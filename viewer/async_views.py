@@ -0,0 +1,133 @@
+"""
+Async variants of the contig viewer and its track endpoints, for ASGI.
+
+The reads behind these pages are independent of each other, so instead of
+running them one after another they are issued together on a bounded
+thread pool (settings.ASYNC_READ_WORKERS threads). Each pool thread keeps
+its own database connection, reused across requests as CONN_MAX_AGE allows,
+so the pool size also bounds the connections these views hold open.
+
+Served under WSGI these views still work, but each request then gets its own
+event loop and the synchronous views in views.py are the better fit.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from . import metrics, region_data
+from .instrumentation import capture_queries
+
+_pool = None
+
+
+def read_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'ASYNC_READ_WORKERS', 8),
+            thread_name_prefix='viewer-read',
+        )
+    return _pool
+
+
+def _run(fn, args):
+    # Same connection handling as around a request: drop connections that are
+    # broken or older than CONN_MAX_AGE before and after the read
+    close_old_connections()
+    try:
+        with metrics.count_queries(), capture_queries():
+            return fn(*args)
+    finally:
+        close_old_connections()
+
+
+async def read(fn, *args):
+    """
+    Runs fn(*args) on the read pool, in a copy of the caller's context.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(read_pool(), context.run, _run, fn, args)
+
+
+async def _tracks(sequence_id, sources, start, end):
+    values = await asyncio.gather(*(
+        read(region_data.track_values, sequence_id, data_source, start, end) for data_source in sources
+    ))
+    return [{'name': data_source, 'values': rows} for data_source, rows in zip(sources, values)]
+
+
+async def viewer(request, contig_name):
+    sequence = await read(region_data.get_sequence, contig_name)
+    region = region_data.viewer_region(request, sequence.length)
+    start, end = region['start'], region['end']
+    color_by = region['color_by']
+
+    sources = asyncio.ensure_future(read(region_data.data_sources, sequence.id))
+    selected = asyncio.ensure_future(
+        read(region_data.get_feature, region['selected_feature_id'])
+        if region['selected_feature_id'] else asyncio.sleep(0)
+    )
+
+    async def segment():
+        # Fetched alongside the data source list and dropped if color_by is not one of them
+        if color_by == 'nucleotide':
+            return None
+        values = await read(region_data.track_segment, sequence.id, color_by, start, end)
+        return values if color_by in await sources else None
+
+    async def heatmap():
+        feature = await selected
+        if feature is None:
+            return []
+        return await _tracks(sequence.id, await sources, feature.start, feature.end)
+
+    (segment_text, nucleotide_data, features_data, all_features_data, interactions_data,
+     heatmap_data, highlighted, available_data_sources) = await asyncio.gather(
+        read(region_data.sequence_segment, sequence.id, start, end),
+        segment(),
+        read(region_data.displayed_features, sequence.id, start, end),
+        read(region_data.all_features, sequence.id),
+        read(region_data.interactions, sequence.id, start, end),
+        heatmap(),
+        read(region_data.highlighted_feature, sequence.id, region['position']),
+        sources,
+    )
+
+    context = region_data.viewer_context(
+        sequence, region, segment_text, available_data_sources, nucleotide_data, features_data,
+        all_features_data, interactions_data, heatmap_data, highlighted,
+    )
+    # Context processors may touch the session and user, which is sync ORM work
+    return await read(render, request, 'viewer/viewer.html', context)
+
+
+async def feature_tracks(request, contig_name, key):
+    sequence = await read(region_data.get_sequence, contig_name)
+    feature_id = request.GET.get('feature_id')
+
+    if not feature_id:
+        return JsonResponse({'error': 'No feature selected'}, status=400)
+
+    feature, sources = await asyncio.gather(
+        read(region_data.get_feature, feature_id),
+        read(region_data.data_sources, sequence.id),
+    )
+    if feature is None:
+        return JsonResponse({'error': 'Feature not found'}, status=404)
+
+    tracks = await _tracks(sequence.id, sources, feature.start, feature.end)
+    return JsonResponse({key: tracks, 'feature': region_data.feature_summary(feature)})
+
+
+async def get_heatmap_data(request, contig_name):
+    return await feature_tracks(request, contig_name, 'heatmap_data')
+
+
+async def get_feature_data(request, contig_name):
+    return await feature_tracks(request, contig_name, 'feature_data')
@@ -0,0 +1,81 @@
+"""
+A version of the loaded genome data, for caching what is derived from it.
+
+The version combines a counter that every loader and deletion path bumps
+(ingest.apply_diff, bulk.copy_rows, viewer/deletion.py) with a fingerprint
+of the Genome table (count, highest id and the sums of the statistics
+generate_stats and the loaders write) and the highest Sequence id, which
+catches statistics and admin edits. Any of these writes changes it, so
+cached values keyed by it are replaced without being invalidated
+explicitly, in every process. It is recomputed at most every
+settings.DATA_VERSION_SECONDS per process.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Sum
+
+from . import metrics
+from .models import DataVersion, Genome, Sequence
+
+_lock = threading.Lock()
+_version = None
+_checked_at = 0.0
+
+
+def _fingerprint():
+    genomes = Genome.objects.aggregate(
+        count=Count('id'), max_id=Max('id'), length=Sum('total_length'), features=Sum('feature_count'),
+        repeats=Sum('repeat_region_count'), cas_genes=Sum('cas_gene_count'), contigs=Sum('contig_count'),
+        n50=Sum('n50'),
+    )
+    max_sequence_id = Sequence.objects.aggregate(max_id=Max('id'))['max_id']
+    counter = DataVersion.objects.values_list('counter', flat=True).first()
+    parts = [genomes[key] for key in sorted(genomes)] + [max_sequence_id, counter]
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+def bump():
+    """
+    Marks the genome data as changed, for every process. Call after writing
+    rows that cached values derive from.
+    """
+    global _version
+    if not DataVersion.objects.filter(id=1).update(counter=F('counter') + 1):
+        DataVersion.objects.get_or_create(id=1, defaults={'counter': 1})
+    with _lock:
+        # This process sees its own write right away
+        _version = None
+
+
+def current():
+    """
+    Returns the current data version.
+    """
+    global _version, _checked_at
+    now = time.monotonic()
+    with _lock:
+        if _version is not None and now - _checked_at < settings.DATA_VERSION_SECONDS:
+            return _version
+    version = _fingerprint()
+    with _lock:
+        _version, _checked_at = version, now
+    return version
+
+
+def cached(name, key, compute, timeout=None):
+    """
+    Returns compute() from the cache, stored under name, key and the data
+    version. Lookups are counted in the cache metrics under name.
+    """
+    # key may be any string; hashed to stay a valid key on every cache backend
+    cache_key = f'viewer:{name}:{current()}:{hashlib.sha1(key.encode()).hexdigest()}'
+    value = cache.get(cache_key)
+    metrics.record_cache(name, value is not None)
+    if value is None:
+        value = compute()
+        cache.set(cache_key, value, timeout if timeout is not None else settings.DATA_CACHE_SECONDS)
+    return value
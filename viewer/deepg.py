@@ -0,0 +1,204 @@
+"""
+Decoding of deepG prediction files (.rds) and calling of CRISPR regions
+from their per-position confidences.
+
+load_rds_for_deepG_track runs call_regions() for many files in a process
+pool. It only reads the file and computes, returning plain data and the
+lines to log, so workers never touch the database and the command's
+process does every write.
+"""
+import os
+import re
+
+import pandas as pd
+import pyreadr
+
+# 'GCA_012932375.1_ASM1293237v1_genomic_1.rds' -> genome name, contig index
+FILENAME_PATTERN = re.compile(r'^(.*?_genomic)_(\d+)\.rds$')
+# Contig names end with _<contig index>
+CONTIG_INDEX_PATTERN = re.compile(r'_(\d+)$')
+
+# Parameters of filter_crispr, as in the R implementation
+CRISPR_PARAMETERS = {
+    'crispr_gap': 10,
+    'conf_cutoff': 0.5,
+    'pos_rate': 0.8,
+    'min_seq_len': 120,
+    'maxlen': 200,
+}
+
+
+def parse_filename(filename):
+    """
+    Returns (genome name, contig index as a string), or None if the name does not match.
+    """
+    match = FILENAME_PATTERN.match(filename)
+    if not match:
+        return None
+    return match.group(1), str(int(match.group(2)))
+
+
+def contig_index(contig):
+    """
+    Returns the contig index a contig name ends with, or None.
+    """
+    match = CONTIG_INDEX_PATTERN.search(contig)
+    return match.group(1) if match else None
+
+
+def call_regions(path):
+    """
+    Reads a prediction file and calls CRISPR regions in it. Returns
+    ([(start, end)] or None if the file could not be used, [(style, line)]
+    to log, where style names a command style or is None).
+    """
+    log = []
+    filename = os.path.basename(path)
+    try:
+        # Read the .rds file using pyreadr
+        result = pyreadr.read_r(path)
+    except Exception as e:
+        log.append(('ERROR', f'Failed to read .rds file "{filename}": {e}'))
+        return None, log
+
+    # Assuming the DataFrame is the first object in the R workspace
+    if len(result) == 0:
+        log.append(('ERROR', f'No DataFrame found in file "{filename}". Skipping.'))
+        return None, log
+
+    df = next(iter(result.values()))
+    if not {'position', 'pred'}.issubset(df.columns):
+        log.append(('ERROR', f'Required columns "position" and "pred" not found in file "{filename}". Skipping.'))
+        return None, log
+
+    # Ensure position and pred columns are numeric
+    df['position'] = pd.to_numeric(df['position'], errors='coerce')
+    df['pred'] = pd.to_numeric(df['pred'], errors='coerce')
+    df.dropna(subset=['position', 'pred'], inplace=True)
+
+    # Convert positions to integers
+    df['position'] = df['position'].astype(int)
+
+    # Create states_df similar to R code
+    states_df = df[['position', 'pred']].copy()
+    states_df.rename(columns={'pred': 'conf_CRISPR'}, inplace=True)
+    states_df['conf_non_CRISPR'] = 1 - states_df['conf_CRISPR']
+    states_df['seq_end'] = states_df['position']
+
+    # Sort by seq_end
+    states_df = states_df[['seq_end', 'conf_CRISPR', 'conf_non_CRISPR']].sort_values('seq_end').reset_index(drop=True)
+
+    log.append((None, f'First 5 rows of DataFrame from "{filename}":'))
+    log.append((None, str(states_df.head())))
+
+    regions = filter_crispr(states_df, log=log, **CRISPR_PARAMETERS)
+    return [(int(region_df['seq_end'].min()), int(region_df['seq_end'].max())) for region_df in regions], log
+
+
+def filter_crispr(states_df,
+                  crispr_gap=10,
+                  conf_cutoff=0.5,
+                  pos_rate=0.8,
+                  min_seq_len=120,
+                  maxlen=200,
+                  log=None):
+    """
+    Filters CRISPR regions based on specified criteria. Lines to log are
+    appended to log as (style, line).
+    """
+    if log is None:
+        log = []
+
+    required_columns = {'conf_CRISPR', 'conf_non_CRISPR', 'seq_end'}
+    if not required_columns.issubset(states_df.columns):
+        raise ValueError(f"states_df must contain columns: {required_columns}")
+
+    if states_df['seq_end'].duplicated().any():
+        raise ValueError("positions should all be unique (seq_end column in states_df)")
+
+    # Calculate step size
+    if len(states_df) >= 2:
+        step = states_df['seq_end'].iloc[1] - states_df['seq_end'].iloc[0]
+    else:
+        step = 1  # Default step size if only one position present
+
+    # Filter states_df to only include rows where conf_CRISPR > conf_cutoff
+    states_df = states_df[states_df['conf_CRISPR'] > conf_cutoff].copy()
+    states_df.sort_values('seq_end', inplace=True)
+    row_num = len(states_df)
+
+    crispr_list = []
+    if row_num == 0:
+        log.append((None, "All confidence scores below conf_cutoff"))
+        return crispr_list
+
+    crispr_index = 1
+    crispr_start = states_df['seq_end'].iloc[0]
+
+    if row_num > 1:
+        for i in range(row_num - 1):
+            current_pos = states_df['seq_end'].iloc[i]
+            next_pos = states_df['seq_end'].iloc[i + 1]
+
+            if (abs(current_pos - next_pos) > crispr_gap) and (i != row_num - 2):
+                index = (states_df['seq_end'] >= crispr_start) & (states_df['seq_end'] <= current_pos)
+                region = states_df.loc[index].copy()
+                crispr_list.append(region)
+                crispr_start = next_pos
+                crispr_index += 1
+
+            if i == row_num - 2:
+                # Last iteration
+                if abs(current_pos - next_pos) <= crispr_gap:
+                    index = states_df['seq_end'] >= crispr_start
+                    region = states_df.loc[index].copy()
+                    crispr_list.append(region)
+                else:
+                    index = (states_df['seq_end'] >= crispr_start) & (states_df['seq_end'] <= current_pos)
+                    region = states_df.loc[index].copy()
+                    crispr_list.append(region)
+
+                    # Single sample at end
+                    crispr_index += 1
+                    region = states_df.iloc[[row_num - 1]].copy()
+                    crispr_list.append(region)
+    else:
+        # Only one row
+        region = states_df.copy()
+        crispr_list.append(region)
+
+    # Filter by positivity rate
+    filtered_crispr_list = []
+    for df in crispr_list:
+        seq_len = df['seq_end'].iloc[-1] - df['seq_end'].iloc[0]
+        num_possible_pos_pred = ((seq_len - 1) / step) + 1
+        cov_rate = len(df) / num_possible_pos_pred if num_possible_pos_pred > 0 else 0
+        if cov_rate >= pos_rate:
+            filtered_crispr_list.append(df)
+        else:
+            log.append((
+                'WARNING',
+                f'    - Discarded region due to low coverage rate: '
+                f'Coverage Rate={cov_rate:.2f}'
+            ))
+
+    # Filter by size
+    final_crispr_list = []
+    for df in filtered_crispr_list:
+        seq_len = df['seq_end'].iloc[-1] - df['seq_end'].iloc[0] + 1
+        if seq_len >= min_seq_len:
+            final_crispr_list.append(df)
+        else:
+            log.append((
+                'WARNING',
+                f'    - Discarded region due to insufficient length: '
+                f'Length={seq_len}'
+            ))
+
+    # Optionally compute seq_middle or other attributes
+    # for df in final_crispr_list:
+    #     df['seq_middle'] = df['seq_end'] - (maxlen / 2)
+
+    log.append((None, f'  - Detected {len(final_crispr_list)} potential CRISPR regions after filtering.'))
+
+    return final_crispr_list
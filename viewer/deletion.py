@@ -0,0 +1,154 @@
+"""
+Set-based deletion of genomes, contigs and whole tables.
+
+QuerySet.delete() collects every cascaded row in Python before deleting it,
+which takes hours and gigabytes for a genome with millions of track values.
+Here each dependent table is instead cleared with one DELETE per contig,
+children before parents, so no rows are loaded and each contig is removed
+in its own short transaction. Wiping everything uses the backend's flush
+statement (TRUNCATE on PostgreSQL).
+
+The plans below list every table that cascades from a sequence or genome.
+check_plans() compares them with the models so a new relation cannot be
+forgotten silently.
+"""
+from collections import Counter
+
+from django.core.management.color import no_style
+from django.db import connections, models, router, transaction
+
+from . import data_version, interaction_store
+from .models import (
+    Genome, Sequence, Feature, FeatureSearch, FeatureTrigram, NucleotideData, Interaction,
+    FeatureSummaryStat, RepeatRegionMethod, RepeatCall, CasGene, IngestedFile,
+)
+
+RepeatMembership = RepeatRegionMethod.repeats.through
+
+# (model, lookup of the sequence id), children before parents
+SEQUENCE_PLAN = [
+    (FeatureTrigram, 'sequence_id'),
+    (FeatureSearch, 'sequence_id'),
+    (RepeatCall, 'sequence_id'),
+    (FeatureSummaryStat, 'feature__sequence_id'),
+    (RepeatMembership, 'feature__sequence_id'),
+    (NucleotideData, 'sequence_id'),
+    (Interaction, 'from_sequence_id'),
+    (Interaction, 'to_sequence_id'),
+    (Feature, 'sequence_id'),
+    (Sequence, 'id'),
+]
+
+# (model, lookup of the genome id), run after SEQUENCE_PLAN for each contig
+GENOME_PLAN = [
+    (FeatureTrigram, 'genome_id'),
+    (FeatureSearch, 'genome_id'),
+    (RepeatCall, 'genome_id'),
+    (RepeatMembership, 'repeatregionmethod__genome_id'),
+    (RepeatRegionMethod, 'genome_id'),
+    (CasGene, 'genome_id'),
+    (IngestedFile, 'genome_id'),
+    (Genome, 'id'),
+]
+
+# Every table the plans touch, children before parents
+TABLES = list(dict.fromkeys(model for model, _ in SEQUENCE_PLAN + GENOME_PLAN))
+
+
+def _cascades(model):
+    """
+    Returns the models whose rows are deleted along with rows of model.
+    """
+    dependents = set()
+    for relation in model._meta.related_objects:
+        if relation.many_to_many:
+            dependents.add(relation.through)
+        elif relation.on_delete is models.CASCADE:
+            dependents.add(relation.related_model)
+    return dependents
+
+
+def check_plans():
+    """
+    Raises RuntimeError if a table cascading from a genome is missing from the plans.
+    """
+    covered = set(TABLES)
+    pending = [Genome]
+    seen = set()
+    while pending:
+        model = pending.pop()
+        if model in seen:
+            continue
+        seen.add(model)
+        missing = _cascades(model) - covered
+        if missing:
+            names = ', '.join(sorted(dependent._meta.db_table for dependent in missing))
+            raise RuntimeError(f'deletion plans do not cover {names}, which cascade from {model._meta.db_table}')
+        pending.extend(_cascades(model))
+
+
+def _delete(model, lookup, value, removed, progress):
+    count = model.objects.filter(**{lookup: value})._raw_delete(router.db_for_write(model))
+    if count:
+        removed[model._meta.db_table] += count
+        if progress:
+            progress(model._meta.db_table, count)
+
+
+def delete_sequences(sequence_ids, progress=None):
+    """
+    Deletes contigs with everything that depends on them, one transaction per
+    contig. progress, if given, is called with (table, rows) after each
+    DELETE. Returns a Counter of rows removed per table.
+    """
+    check_plans()
+    removed = Counter()
+    sequence_ids = list(sequence_ids)
+    for sequence_id in sequence_ids:
+        with transaction.atomic():
+            for model, lookup in SEQUENCE_PLAN:
+                _delete(model, lookup, sequence_id, removed, progress)
+    # The on-disk store is derived from the interaction table
+    interaction_store.delete_pairs(sequence_ids)
+    data_version.bump()
+    return removed
+
+
+def delete_genome(genome, progress=None):
+    """
+    Deletes a genome contig by contig, then its genome-level rows. Returns a
+    Counter of rows removed per table.
+    """
+    sequence_ids = Sequence.objects.filter(genome=genome).order_by('id').values_list('id', flat=True)
+    removed = delete_sequences(sequence_ids, progress)
+    with transaction.atomic():
+        for model, lookup in GENOME_PLAN:
+            _delete(model, lookup, genome.id, removed, progress)
+    data_version.bump()
+    return removed
+
+
+def delete_all(progress=None, tables=None):
+    """
+    Empties the given tables (default: all genome data) with the backend's
+    flush statement. Returns a Counter of rows removed per table.
+    """
+    check_plans()
+    tables = tables or TABLES
+    removed = Counter()
+    using = router.db_for_write(tables[0])
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        for model in tables:
+            count = model.objects.using(using).count()
+            removed[model._meta.db_table] = count
+            if progress:
+                progress(model._meta.db_table, count)
+        statements = connection.ops.sql_flush(
+            no_style(), [model._meta.db_table for model in tables], allow_cascade=False
+        )
+        connection.ops.execute_sql_flush(statements)
+    if Interaction in tables:
+        interaction_store.delete_pairs()
+    data_version.bump()
+    return removed
@@ -0,0 +1,210 @@
+"""
+Streaming exports of sequences, features and tracks.
+
+Every exporter is a generator of text lines. Rows are read with
+.iterator() (a server-side cursor on PostgreSQL, fetchmany elsewhere) and
+sequences are read in slices cut by the database, so memory use does not
+grow with the size of the export. The views wrap the generators in a
+StreamingHttpResponse and the export command writes them to a file.
+"""
+from urllib.parse import quote
+
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Substr
+from django.db.models.fields.json import KT
+
+from .models import Sequence, Feature, NucleotideData
+
+FASTA_LINE_WIDTH = 60
+SEQUENCE_READ_SIZE = 1000020  # Bases per read, a multiple of the line width
+ITERATOR_CHUNK_SIZE = 2000
+
+FEATURE_FORMATS = ('gff3', 'bed')
+REPEAT_FORMATS = ('fasta',) + FEATURE_FORMATS
+
+
+def sequence_slices(sequence_id, start, end, size=SEQUENCE_READ_SIZE):
+    """
+    Yields the 0-based half-open range [start, end) of a sequence in pieces
+    of at most size bases.
+    """
+    for position in range(start, end, size):
+        yield Sequence.objects.filter(id=sequence_id).annotate(
+            piece=Substr('sequence', position + 1, min(size, end - position))
+        ).values_list('piece', flat=True).get()
+
+
+def fasta_record(header, pieces, width=FASTA_LINE_WIDTH):
+    """
+    Yields a FASTA record with the sequence from pieces wrapped at width.
+    """
+    yield f'>{header}\n'
+    rest = ''
+    for piece in pieces:
+        rest += piece
+        full = len(rest) - len(rest) % width
+        for i in range(0, full, width):
+            yield rest[i:i + width] + '\n'
+        rest = rest[full:]
+    if rest:
+        yield rest + '\n'
+
+
+def fasta(sequences, start=None, end=None):
+    """
+    Yields FASTA for sequences, an iterable of (id, contig, length). If start
+    or end are given, only that 0-based half-open range of each is exported.
+    """
+    for sequence_id, contig, length in sequences:
+        first = max(start or 0, 0)
+        last = length if end is None else min(end, length)
+        header = contig if (first, last) == (0, length) else f'{contig}:{first + 1}-{last}'
+        yield from fasta_record(header, sequence_slices(sequence_id, first, last))
+
+
+def sequences_for(genome=None, contig=None):
+    """
+    Returns (id, contig, length) of the matching sequences in a stable order,
+    the length taken from the column set at load time.
+    """
+    sequences = Sequence.objects.all()
+    if genome is not None:
+        sequences = sequences.filter(genome__name=genome)
+    if contig is not None:
+        sequences = sequences.filter(contig=contig)
+    return sequences.order_by('genome_id', 'id').values_list('id', 'contig', 'length').iterator(
+        chunk_size=ITERATOR_CHUNK_SIZE
+    )
+
+
+def features_for(genome=None, contig=None, start=None, end=None, types=None):
+    """
+    Returns the matching features ordered by contig and start, with the contig
+    name joined in.
+    """
+    features = Feature.objects.all()
+    if genome is not None:
+        features = features.filter(sequence__genome__name=genome)
+    if contig is not None:
+        features = features.filter(sequence__contig=contig)
+    if start is not None:
+        features = features.filter(end__gte=start + 1)
+    if end is not None:
+        features = features.filter(start__lte=end)
+    if types:
+        features = features.filter(type__in=types)
+    return features.order_by('sequence_id', 'start', 'id').annotate(contig=F('sequence__contig'))
+
+
+def _gff3_escape(value):
+    # Characters with a meaning in column 9, percent-encoded as GFF3 requires
+    return quote(str(value), safe=' !"#$\'()*+-./:<>?@[\\]^_`{|}~')
+
+
+def _gff3_attributes(feature):
+    attributes = feature['attributes'] or {}
+    if not attributes:
+        return '.'
+    return ';'.join(
+        f"{_gff3_escape(key)}={','.join(_gff3_escape(v) for v in (value if isinstance(value, list) else [value]))}"
+        for key, value in attributes.items()
+    )
+
+
+def _feature_name(feature):
+    for key in ('name', 'gff_id', 'locus_tag', 'gene'):
+        if feature[key]:
+            return str(feature[key])
+    return feature['type']
+
+
+def _dot(value):
+    return '.' if value is None or value == '' else str(value)
+
+
+def gff3(features):
+    """
+    Yields GFF3 for a feature queryset from features_for().
+    """
+    yield '##gff-version 3\n'
+    rows = features.values(
+        'contig', 'source', 'type', 'start', 'end', 'score', 'strand', 'phase', 'attributes'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    for feature in rows:
+        yield '\t'.join((
+            feature['contig'], _dot(feature['source']), feature['type'],
+            str(feature['start']), str(feature['end']), _dot(feature['score']),
+            _dot(feature['strand']), _dot(feature['phase']), _gff3_attributes(feature),
+        )) + '\n'
+
+
+def bed(features):
+    """
+    Yields BED6 (0-based, half-open) for a feature queryset from features_for().
+    """
+    rows = features.values(
+        'contig', 'type', 'start', 'end', 'score', 'strand', 'name', 'locus_tag', 'gene',
+        gff_id=KT('attributes__ID'),
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    for feature in rows:
+        score = 0 if feature['score'] is None else max(0, min(int(feature['score']), 1000))
+        strand = feature['strand'] if feature['strand'] in ('+', '-') else '.'
+        yield (f"{feature['contig']}\t{feature['start'] - 1}\t{feature['end']}\t"
+               f"{_feature_name(feature)}\t{score}\t{strand}\n")
+
+
+def bedgraph(sequence, data_source, start=None, end=None):
+    """
+    Yields bedGraph for one track of a sequence, merging adjacent positions
+    with equal values into one interval. start and end are 0-based half-open.
+    """
+    values = NucleotideData.objects.filter(sequence=sequence, data_source=data_source)
+    if start is not None:
+        values = values.filter(position__gte=start + 1)
+    if end is not None:
+        values = values.filter(position__lte=end)
+    rows = values.order_by('position').values_list('position', 'value').iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+    yield f'track type=bedGraph name="{data_source}"\n'
+    run_start = run_end = run_value = None
+    for position, value in rows:
+        if run_end is not None and position == run_end + 1 and value == run_value:
+            run_end = position
+            continue
+        if run_start is not None:
+            yield f'{sequence.contig}\t{run_start - 1}\t{run_end}\t{run_value:g}\n'
+        run_start = run_end = position
+        run_value = value
+    if run_start is not None:
+        yield f'{sequence.contig}\t{run_start - 1}\t{run_end}\t{run_value:g}\n'
+
+
+def repeat_regions_for(genome=None, method=None):
+    """
+    Returns the repeat_region features of a genome and/or detection method.
+    """
+    features = features_for(genome=genome, types=['repeat_region'])
+    if method is not None:
+        features = features.filter(repeat_methods__method=method)
+        if genome is not None:
+            features = features.filter(repeat_methods__genome__name=genome)
+    return features
+
+
+def repeat_region_fasta(features, flank=0):
+    """
+    Yields FASTA of each feature with flank bases either side, clipped to the
+    contig. The database cuts out each region while rows are read, so contigs
+    are never loaded whole.
+    """
+    flanked_start = Greatest(F('start') - flank, Value(1))
+    rows = features.annotate(
+        flanked_start=flanked_start,
+        region=Substr('sequence__sequence', flanked_start, F('end') + flank - flanked_start + 1),
+    ).values_list('id', 'contig', 'start', 'end', 'strand', 'flanked_start', 'region')
+
+    for feature_id, contig, start, end, strand, region_start, region in rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        region_end = region_start + len(region) - 1
+        header = (f'{contig}:{region_start}-{region_end} repeat_region={feature_id} '
+                  f'location={start}-{end} strand={strand or "."} flank={flank}')
+        yield from fasta_record(header, [region])
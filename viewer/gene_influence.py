@@ -0,0 +1,71 @@
+"""
+Regression helpers for the compute_gene_influence command.
+
+Kept free of Django imports so that process pool workers can import this
+module without configuring settings.
+"""
+import numpy as np
+from multiprocessing import shared_memory
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+
+def fit_ridge(X, y, alpha):
+    """
+    Fits a standardised Ridge model and returns (coefficients, intercept).
+    """
+    model = make_pipeline(StandardScaler(), Ridge(alpha=alpha))
+    model.fit(X, y)
+    ridge = model.named_steps['ridge']
+    return ridge.coef_, ridge.intercept_
+
+
+def share_array(array):
+    """
+    Copies an array into a new shared memory block and returns the block.
+    The caller is responsible for closing and unlinking it.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    shared[:] = array
+    return shm
+
+
+def bootstrap_chunk(shm_name, shape, dtype, y, alpha, seed_seq, n_resamples):
+    """
+    Runs n_resamples bootstrap fits over genomes (rows) of the shared design
+    matrix and returns the coefficients as an (n_resamples, n_genes) array.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        # View onto the parent's buffer, no copy of the design matrix is made
+        X = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        rng = np.random.default_rng(seed_seq)
+        n_rows = shape[0]
+        coefs = np.empty((n_resamples, shape[1]))
+        for i in range(n_resamples):
+            rows = rng.integers(0, n_rows, size=n_rows)
+            coefs[i], _ = fit_ridge(X[rows], y[rows], alpha)
+        del X
+        return coefs
+    finally:
+        shm.close()
+
+
+def bootstrap_summary(coefs, confidence=0.95):
+    """
+    Returns (ci_lower, ci_upper, p_values) from bootstrap coefficient samples.
+
+    Confidence intervals are percentile intervals. The two-sided p-value is
+    the fraction of resamples on the far side of zero, doubled, with the
+    usual +1 correction so that it is never exactly zero.
+    """
+    n = coefs.shape[0]
+    tail = (1 - confidence) / 2 * 100
+    ci_lower = np.percentile(coefs, tail, axis=0)
+    ci_upper = np.percentile(coefs, 100 - tail, axis=0)
+    below = (coefs <= 0).sum(axis=0)
+    above = (coefs >= 0).sum(axis=0)
+    p_values = np.minimum(1.0, 2 * (np.minimum(below, above) + 1) / (n + 1))
+    return ci_lower, ci_upper, p_values
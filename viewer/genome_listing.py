@@ -0,0 +1,197 @@
+"""
+The paginated genome table of the index page.
+
+Pages are read with keyset pagination: the cursor holds the sort, its value and the
+id of the last (or first) row shown, and the next page is the rows after
+it in index order. Every page costs one index range scan however deep it
+is, unlike OFFSET, and no COUNT is needed to page. Totals are shown from
+the data version cache (see viewer/data_version.py).
+
+A row shows only its contig count column; the contig list is fetched from
+genome_contigs when it is opened, so a fragmented assembly does not add
+hundreds of links to every page.
+"""
+import base64
+import json
+
+from django.db.models import Count, Prefetch, Q, prefetch_related_objects
+from django.urls import reverse
+
+from . import data_version
+from .models import Genome, RepeatRegionMethod, Feature, Sequence, NucleotideData
+
+PAGE_SIZE = 10
+
+# Sort option -> (field, descending), each backed by an index on (field, id)
+SORTS = {
+    'name': ('name', False),
+    'cas_genes': ('cas_gene_count', True),
+    'repeat_regions': ('repeat_region_count', True),
+    'length': ('total_length', True),
+}
+DEFAULT_SORT = 'name'
+
+
+def encode_cursor(sort, value, genome_id):
+    return base64.urlsafe_b64encode(json.dumps([sort, value, genome_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """
+    Returns (sort value, id), or None if the cursor is invalid or was made
+    for another sort.
+    """
+    try:
+        cursor_sort, value, genome_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        genome_id = int(genome_id)
+    except (TypeError, ValueError):
+        return None
+    if cursor_sort != sort:
+        return None
+    field, _ = SORTS[sort]
+    # Name cursors hold strings, the other sorts integers
+    expected = str if field == 'name' else int
+    if not isinstance(value, expected) or isinstance(value, bool):
+        return None
+    return value, genome_id
+
+
+def filtered_genomes(show_crispr=False, query=''):
+    genomes = Genome.objects.all()
+    if show_crispr:
+        # Matches the condition of the partial index genome_crispr_name_idx
+        genomes = genomes.filter(repeat_region_count__gt=0)
+    if query:
+        genomes = genomes.filter(Q(name__icontains=query) | Q(strain_name__icontains=query))
+    return genomes
+
+
+def genome_count(show_crispr=False, query=''):
+    return data_version.cached(
+        'genome_count', json.dumps([show_crispr, query]), lambda: filtered_genomes(show_crispr, query).count()
+    )
+
+
+def dashboard_counts():
+    """
+    Returns the totals shown above the genome table.
+    """
+    def compute():
+        return {
+            'total_genomes': Genome.objects.count(),
+            # Count distinct methods across all genomes
+            'total_crispr_methods': RepeatRegionMethod.objects.values('method').distinct().count(),
+            'total_crispr_arrays': Feature.objects.filter(type='repeat_region').count(),
+        }
+    return data_version.cached('dashboard', '', compute)
+
+
+def _after(field, descending, value, genome_id):
+    # Rows strictly after (value, id) in (field, id) order
+    if descending:
+        return Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': genome_id})
+    return Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': genome_id})
+
+
+def page(genomes, sort=DEFAULT_SORT, after=None, before=None, last=False, size=PAGE_SIZE):
+    """
+    Returns (genomes on the page, cursor of the previous page or None,
+    cursor of the next page or None). after and before are cursors; last
+    asks for the final page.
+    """
+    if sort not in SORTS:
+        sort = DEFAULT_SORT
+    field, descending = SORTS[sort]
+    order = [f'-{field}', '-id'] if descending else [field, 'id']
+    reverse_order = [field, 'id'] if descending else [f'-{field}', '-id']
+
+    # A cursor that does not fit the sort counts as none, which gives the first page
+    after = decode_cursor(after, sort) if after else None
+    before = decode_cursor(before, sort) if before else None
+    backwards = before is not None or (last and after is None)
+    if backwards:
+        if before is not None:
+            genomes = genomes.filter(_after(field, not descending, *before))
+        rows = list(genomes.order_by(*reverse_order)[:size + 1])
+        has_more_before = len(rows) > size
+        rows = rows[:size][::-1]
+        has_more_after = before is not None
+    else:
+        if after is not None:
+            genomes = genomes.filter(_after(field, descending, *after))
+        rows = list(genomes.order_by(*order)[:size + 1])
+        has_more_after = len(rows) > size
+        rows = rows[:size]
+        has_more_before = after is not None
+
+    previous_cursor = encode_cursor(sort, getattr(rows[0], field), rows[0].id) if rows and has_more_before else None
+    next_cursor = encode_cursor(sort, getattr(rows[-1], field), rows[-1].id) if rows and has_more_after else None
+    return rows, previous_cursor, next_cursor
+
+
+def with_details(genomes):
+    """
+    Loads the repeat regions and Cas genes shown for a page of genomes, in
+    one query each.
+    """
+    prefetch_related_objects(
+        genomes,
+        Prefetch(
+            'repeat_region_methods__repeats',
+            queryset=Feature.objects.select_related('sequence').only(
+                'id', 'start', 'end', 'sequence__id', 'sequence__contig'
+            ),
+        ),
+        'cas_genes',
+    )
+    return genomes
+
+
+def _genome_contigs(genome_id):
+    sequences = list(
+        Sequence.objects.filter(genome_id=genome_id).order_by('id')
+        .only('id', 'contig', 'length', 'gc_count', 'n_count', 'iupac_count')
+    )
+    if not sequences:
+        return None if not Genome.objects.filter(id=genome_id).exists() else []
+
+    feature_counts = {
+        row['sequence_id']: row
+        for row in Feature.objects.filter(sequence__genome_id=genome_id).values('sequence_id').annotate(
+            features=Count('id'), repeat_regions=Count('id', filter=Q(type='repeat_region'))
+        )
+    }
+    data_sources = {}
+    for sequence_id, data_source in (
+        NucleotideData.objects.filter(sequence__genome_id=genome_id)
+        .values_list('sequence_id', 'data_source').distinct()
+    ):
+        data_sources.setdefault(sequence_id, []).append(data_source)
+
+    contigs = []
+    for sequence in sequences:
+        counts = feature_counts.get(sequence.id, {})
+        gc_content = sequence.gc_content
+        contigs.append({
+            'contig': sequence.contig,
+            'url': reverse('viewer', kwargs={'contig_name': sequence.contig}),
+            'length': sequence.length,
+            'gc_content': None if gc_content is None else round(gc_content, 4),
+            'n_count': sequence.n_count,
+            'iupac_count': sequence.iupac_count,
+            'features': counts.get('features', 0),
+            'repeat_regions': counts.get('repeat_regions', 0),
+            'data_sources': sorted(data_sources.get(sequence.id, [])),
+            'has_tracks': sequence.id in data_sources,
+        })
+    return contigs
+
+
+def genome_contigs(genome_id):
+    """
+    Returns the contigs of a genome with their lengths, feature counts and
+    which tracks they have, or None if there is no such genome. Only
+    metadata columns are read, never the sequence text, and the result is
+    cached per genome and data version.
+    """
+    return data_version.cached('genome_contigs', str(genome_id), lambda: _genome_contigs(genome_id))
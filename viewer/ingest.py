@@ -0,0 +1,220 @@
+"""
+Incremental re-ingestion of source files.
+
+The IngestedFile manifest records the content hash, size and mtime of every
+GFF and RDS file loaded. A file whose size and mtime still match is skipped
+without being read; otherwise it is hashed, and only if the hash differs
+is it loaded again. A nightly sync of the whole directory therefore reads
+just the files that changed.
+
+A changed genome is not deleted and reloaded. Its features in the database
+are diffed in memory against the features parsed from the file, and only
+the added, removed and changed rows are written, so unchanged features keep
+their ids (and with them their summary statistics and repeat calls).
+"""
+import hashlib
+import os
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from . import data_version
+from .models import Feature, Genome, IngestedFile, FEATURE_ATTRIBUTE_COLUMNS, attribute_columns
+
+HASH_CHUNK_SIZE = 1 << 20
+WRITE_BATCH_SIZE = 5000
+
+UNCHANGED = 'unchanged'
+CHANGED = 'changed'
+NEW = 'new'
+
+# Compared to tell a changed feature from an unchanged one with the same key
+FEATURE_VALUE_FIELDS = ('source', 'score', 'strand', 'phase', 'attributes')
+
+# Default of SourceFile(entry=...): read the manifest entry of the file, and of
+# record(genome=...): keep the genome of the entry
+_LOOKUP = object()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SourceFile:
+    """
+    A source file and its state relative to the manifest.
+    """
+
+    def __init__(self, path, kind, entry=_LOOKUP):
+        self.path = os.path.abspath(path)
+        self.kind = kind
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        if entry is _LOOKUP:
+            entry = IngestedFile.objects.filter(path=self.path).first()
+        self.entry = entry
+        self._sha256 = None
+        # Unchanged content with a new mtime, stored by record()
+        self.touched = False
+
+    @classmethod
+    def many(cls, paths, kind):
+        """
+        Returns a SourceFile per path, reading their manifest entries in one query.
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        entries = IngestedFile.objects.in_bulk(paths, field_name='path')
+        return [cls(path, kind, entries.get(path)) for path in paths]
+
+    @property
+    def sha256(self):
+        if self._sha256 is None:
+            self._sha256 = file_hash(self.path)
+        return self._sha256
+
+    @property
+    def status(self):
+        if self.entry is None:
+            return NEW
+        if (self.entry.size, self.entry.mtime_ns) == (self.size, self.mtime_ns):
+            return UNCHANGED
+        if self.entry.sha256 == self.sha256:
+            # Touched but not edited; record() remembers the new mtime so it is not hashed again
+            self.touched = True
+            return UNCHANGED
+        return CHANGED
+
+    def record(self, genome=_LOOKUP):
+        """
+        Marks the file as ingested in its current state, for genome (by
+        default the genome it was recorded for before). Nothing is written
+        until this is called, so dry runs leave the manifest alone.
+        """
+        genome_id = getattr(genome, 'id', None)
+        if genome is _LOOKUP:
+            genome_id = self.entry.genome_id if self.entry else None
+        IngestedFile.objects.update_or_create(path=self.path, defaults={
+            'kind': self.kind,
+            'genome_id': genome_id,
+            'sha256': self.sha256,
+            'size': self.size,
+            'mtime_ns': self.mtime_ns,
+        })
+
+
+class FeatureDiff:
+    """
+    Features to add, delete and update to turn the stored features of a
+    genome into the parsed ones.
+    """
+
+    def __init__(self):
+        self.added = []  # Parsed feature dicts
+        self.removed = []  # Feature ids
+        self.changed = []  # (feature id, parsed feature dict)
+        self.unchanged = 0
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def summary(self):
+        return {
+            'added': len(self.added),
+            'removed': len(self.removed),
+            'changed': len(self.changed),
+            'unchanged': self.unchanged,
+        }
+
+
+def feature_key(contig, feature):
+    return contig, feature['type'], feature['start'], feature['end']
+
+
+def diff_features(stored, parsed):
+    """
+    Diffs two iterables of (contig, feature dict) by (contig, type, start,
+    end). Stored dicts carry their 'id'. Features sharing a key are paired
+    up in order.
+    """
+    diff = FeatureDiff()
+    existing = defaultdict(list)
+    for contig, feature in stored:
+        existing[feature_key(contig, feature)].append(feature)
+
+    for contig, feature in parsed:
+        candidates = existing.get(feature_key(contig, feature))
+        if not candidates:
+            diff.added.append((contig, feature))
+            continue
+        old = candidates.pop(0)
+        if any(old[field] != feature[field] for field in FEATURE_VALUE_FIELDS):
+            diff.changed.append((old['id'], feature))
+        else:
+            diff.unchanged += 1
+
+    for features in existing.values():
+        diff.removed.extend(feature['id'] for feature in features)
+    return diff
+
+
+def stored_features(genome, **filters):
+    """
+    Yields (contig, feature dict with id) for the features of a genome.
+    """
+    rows = Feature.objects.filter(sequence__genome=genome, **filters).order_by('id').values(
+        'id', 'sequence__contig', 'type', 'start', 'end', *FEATURE_VALUE_FIELDS
+    )
+    for row in rows.iterator(chunk_size=5000):
+        yield row.pop('sequence__contig'), row
+
+
+def apply_diff(diff, sequence_ids):
+    """
+    Writes a FeatureDiff. sequence_ids maps contig names to sequence ids.
+    Returns the created features.
+    """
+    with transaction.atomic():
+        for i in range(0, len(diff.removed), WRITE_BATCH_SIZE):
+            Feature.objects.filter(id__in=diff.removed[i:i + WRITE_BATCH_SIZE]).delete()
+
+        created = Feature.objects.bulk_create(
+            [
+                Feature(sequence_id=sequence_ids[contig], **feature, **attribute_columns(feature['attributes']))
+                for contig, feature in diff.added
+            ],
+            batch_size=WRITE_BATCH_SIZE,
+        )
+
+        updated = []
+        for feature_id, feature in diff.changed:
+            updated.append(Feature(
+                id=feature_id,
+                **{field: feature[field] for field in FEATURE_VALUE_FIELDS},
+                **attribute_columns(feature['attributes']),
+            ))
+        Feature.objects.bulk_update(
+            updated, FEATURE_VALUE_FIELDS + tuple(FEATURE_ATTRIBUTE_COLUMNS), batch_size=WRITE_BATCH_SIZE
+        )
+    if diff:
+        data_version.bump()
+    return created
+
+
+def update_feature_counts(genome):
+    """
+    Recomputes the feature and repeat region counts of a genome, as
+    generate_stats does, after its features were written.
+    """
+    counts = Feature.objects.filter(sequence__genome=genome).aggregate(
+        feature_count=Count('id'), repeat_region_count=Count('id', filter=Q(type='repeat_region'))
+    )
+    Genome.objects.filter(id=genome.id).update(**counts)
+    for name, value in counts.items():
+        setattr(genome, name, value)
+    return counts
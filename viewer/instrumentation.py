@@ -0,0 +1,177 @@
+"""
+Opt-in per-request instrumentation.
+
+RequestInstrumentationMiddleware records, for every request, the number of
+SQL queries, total SQL time, the slowest statements, statements repeated
+often enough to suggest an N+1 pattern, and the time spent in named spans.
+Results are returned as a Server-Timing header and logged as one JSON line
+on the 'viewer.instrumentation' logger.
+
+Enable it with REQUEST_INSTRUMENTATION = True. When disabled the middleware
+removes itself at startup and span() only does a context variable lookup.
+"""
+import contextvars
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('viewer.instrumentation')
+
+_current = contextvars.ContextVar('request_instrumentation', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = []  # (sql, duration in seconds)
+        self.spans = {}  # name -> total duration in seconds
+
+    def record_query(self, sql, duration):
+        self.queries.append((sql, duration))
+
+    def timed_execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record_query(sql, time.perf_counter() - start)
+
+    def record_span(self, name, duration):
+        self.spans[name] = self.spans.get(name, 0.0) + duration
+
+    def sql_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def slowest(self, n):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:n]
+
+    def duplicates(self, threshold):
+        """
+        Returns {sql: count} for statements executed at least threshold times.
+        Statements are compared before parameter binding, so the same query
+        issued once per row of a loop shows up here.
+        """
+        counts = {}
+        for sql, _ in self.queries:
+            counts[sql] = counts.get(sql, 0) + 1
+        return {sql: count for sql, count in counts.items() if count >= threshold}
+
+
+def current_metrics():
+    """
+    Returns the metrics of the request being served, or None if
+    instrumentation is disabled or there is no request.
+    """
+    return _current.get()
+
+
+@contextmanager
+def capture_queries():
+    """
+    Records queries this thread runs toward the current request. Sync
+    requests are wrapped in this by the middleware; async views wrap each
+    read they hand to a thread, with the request's context copied to it.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics.timed_execute))
+        yield
+
+
+@contextmanager
+def span(name):
+    """
+    Times the enclosed block as a named span of the current request.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.record_span(name, time.perf_counter() - start)
+
+
+class RequestInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.slow_queries = getattr(settings, 'REQUEST_INSTRUMENTATION_SLOW_QUERIES', 5)
+        self.duplicate_threshold = getattr(settings, 'REQUEST_INSTRUMENTATION_DUPLICATE_THRESHOLD', 5)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with capture_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, total):
+        response['Server-Timing'] = self.server_timing(metrics, total)
+        self.log(request, response, metrics, total)
+        return response
+
+    def server_timing(self, metrics, total):
+        entries = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={metrics.sql_time() * 1000:.1f};desc="{len(metrics.queries)} queries"',
+        ]
+        entries.extend(f'{name};dur={duration * 1000:.1f}' for name, duration in metrics.spans.items())
+        return ', '.join(entries)
+
+    def log(self, request, response, metrics, total):
+        duplicates = metrics.duplicates(self.duplicate_threshold)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(getattr(request, 'resolver_match', None), 'view_name', None),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'queries': len(metrics.queries),
+            'sql_ms': round(metrics.sql_time() * 1000, 2),
+            'slowest': [
+                {'sql': sql, 'ms': round(duration * 1000, 2)}
+                for sql, duration in metrics.slowest(self.slow_queries)
+            ],
+            'duplicates': [{'sql': sql, 'count': count} for sql, count in duplicates.items()],
+            'spans_ms': {name: round(duration * 1000, 2) for name, duration in metrics.spans.items()},
+        }
+        if duplicates:
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+
@@ -0,0 +1,190 @@
+"""
+Compact on-disk store for interactions between two contigs.
+
+Each (from_sequence, to_sequence) pair is kept as column arrays twice, once
+sorted by from_position and once sorted by to_position. A window query is two
+binary searches: rows whose from_position falls in the window come from the
+first copy, and rows whose to_position falls in the window (but whose
+from_position does not, so nothing is returned twice) come from the second.
+Arrays are .npy files opened memory-mapped, so only the touched pages are read.
+
+Alongside the raw interactions each pair keeps binned contact matrices at the
+resolutions in settings.CONTACT_MATRIX_BIN_SIZES, as sparse COO arrays (row
+bin, column bin, summed weight) sorted by row, for zoomed-out views.
+"""
+import os
+import shutil
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+
+COLUMNS = ('from_position', 'to_position', 'weight')
+DTYPES = {'from_position': np.int32, 'to_position': np.int32, 'weight': np.float32}
+
+
+def store_dir():
+    return settings.INTERACTION_STORE_DIR
+
+
+def pair_dir(from_sequence_id, to_sequence_id):
+    return os.path.join(store_dir(), f"{from_sequence_id}_{to_sequence_id}")
+
+
+def has_pair(from_sequence_id, to_sequence_id):
+    return os.path.isdir(pair_dir(from_sequence_id, to_sequence_id))
+
+
+def write_pair(from_sequence_id, to_sequence_id, from_positions, to_positions, weights):
+    """
+    Writes (replacing) the store for one contig pair. Returns the row count.
+    """
+    columns = {
+        'from_position': np.asarray(from_positions, dtype=DTYPES['from_position']),
+        'to_position': np.asarray(to_positions, dtype=DTYPES['to_position']),
+        'weight': np.asarray(weights, dtype=DTYPES['weight']),
+    }
+
+    target = pair_dir(from_sequence_id, to_sequence_id)
+    tmp = target + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    for key in ('from_position', 'to_position'):
+        order = np.argsort(columns[key], kind='stable')
+        side_dir = os.path.join(tmp, f"by_{key.split('_')[0]}")
+        os.makedirs(side_dir)
+        for name in COLUMNS:
+            np.save(os.path.join(side_dir, f"{name}.npy"), columns[name][order])
+
+    # Swap the finished directory in so readers never see a partial pair
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    return len(columns['weight'])
+
+
+def write_contact_matrices(from_sequence_id, to_sequence_id, from_positions, to_positions, weights, bin_sizes=None):
+    """
+    Bins interactions at each resolution and writes the sparse matrices for
+    one contig pair. Must be called after write_pair.
+    """
+    from_positions = np.asarray(from_positions, dtype=np.int64)
+    to_positions = np.asarray(to_positions, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    target = pair_dir(from_sequence_id, to_sequence_id)
+
+    for bin_size in bin_sizes or settings.CONTACT_MATRIX_BIN_SIZES:
+        rows, cols, values = bin_interactions(from_positions, to_positions, weights, bin_size)
+        matrix_dir = os.path.join(target, f"matrix_{bin_size}")
+        os.makedirs(matrix_dir, exist_ok=True)
+        np.save(os.path.join(matrix_dir, 'row.npy'), rows.astype(np.int32))
+        np.save(os.path.join(matrix_dir, 'col.npy'), cols.astype(np.int32))
+        np.save(os.path.join(matrix_dir, 'weight.npy'), values.astype(np.float32))
+
+
+def bin_interactions(from_positions, to_positions, weights, bin_size):
+    """
+    Sums weights per (row bin, column bin) of 1-based positions. Returns COO
+    arrays sorted by row, then column.
+    """
+    rows = (from_positions - 1) // bin_size
+    cols = (to_positions - 1) // bin_size
+    if len(rows) == 0:
+        return rows, cols, weights
+    width = int(cols.max()) + 1
+    keys, inverse = np.unique(rows * width + cols, return_inverse=True)
+    values = np.bincount(inverse, weights=weights)
+    return keys // width, keys % width, values
+
+
+def choose_bin_size(start, end, max_bins, bin_sizes=None):
+    """
+    Returns the finest resolution that covers [start, end] in at most max_bins
+    bins, or the coarsest resolution if none does.
+    """
+    bin_sizes = sorted(bin_sizes or settings.CONTACT_MATRIX_BIN_SIZES)
+    span = max(end - start + 1, 1)
+    for bin_size in bin_sizes:
+        if -(-span // bin_size) <= max_bins:
+            return bin_size
+    return bin_sizes[-1]
+
+
+def query_contact_matrix(from_sequence_id, to_sequence_id, start, end, bin_size):
+    """
+    Returns (rows, cols, values) for bins with both ends in [start, end], or
+    None if the matrix has not been built at this resolution.
+    """
+    matrix_dir = os.path.join(pair_dir(from_sequence_id, to_sequence_id), f"matrix_{bin_size}")
+    if not os.path.isdir(matrix_dir):
+        return None
+
+    rows = np.load(os.path.join(matrix_dir, 'row.npy'), mmap_mode='r')
+    first_bin = (start - 1) // bin_size
+    last_bin = (end - 1) // bin_size
+    lo = np.searchsorted(rows, first_bin, side='left')
+    hi = np.searchsorted(rows, last_bin, side='right')
+
+    rows = np.asarray(rows[lo:hi])
+    cols = np.asarray(np.load(os.path.join(matrix_dir, 'col.npy'), mmap_mode='r')[lo:hi])
+    values = np.asarray(np.load(os.path.join(matrix_dir, 'weight.npy'), mmap_mode='r')[lo:hi])
+    metrics.record_store_read('contact_matrix', rows.nbytes + cols.nbytes + values.nbytes)
+    inside = (cols >= first_bin) & (cols <= last_bin)
+    return rows[inside], cols[inside], values[inside]
+
+
+def delete_pairs(sequence_ids=None):
+    """
+    Deletes stored pairs touching any of sequence_ids, or the whole store.
+    """
+    root = store_dir()
+    if not os.path.isdir(root):
+        return
+    if sequence_ids is None:
+        shutil.rmtree(root)
+        return
+    sequence_ids = {str(sequence_id) for sequence_id in sequence_ids}
+    for name in os.listdir(root):
+        if set(name.split('.')[0].split('_')) & sequence_ids:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def _load_side(from_sequence_id, to_sequence_id, side):
+    side_dir = os.path.join(pair_dir(from_sequence_id, to_sequence_id), f"by_{side}")
+    return {name: np.load(os.path.join(side_dir, f"{name}.npy"), mmap_mode='r') for name in COLUMNS}
+
+
+def query_window(from_sequence_id, to_sequence_id, start, end):
+    """
+    Returns column arrays of interactions with either end in [start, end]
+    (1-based, inclusive), or None if the pair has not been stored.
+    """
+    if not has_pair(from_sequence_id, to_sequence_id):
+        return None
+
+    by_from = _load_side(from_sequence_id, to_sequence_id, 'from')
+    lo = np.searchsorted(by_from['from_position'], start, side='left')
+    hi = np.searchsorted(by_from['from_position'], end, side='right')
+    anchored = {name: np.asarray(by_from[name][lo:hi]) for name in COLUMNS}
+
+    by_to = _load_side(from_sequence_id, to_sequence_id, 'to')
+    lo = np.searchsorted(by_to['to_position'], start, side='left')
+    hi = np.searchsorted(by_to['to_position'], end, side='right')
+    partnered = {name: np.asarray(by_to[name][lo:hi]) for name in COLUMNS}
+
+    metrics.record_store_read('interactions', sum(
+        column.nbytes for side in (anchored, partnered) for column in side.values()
+    ))
+
+    # Rows with both ends in the window were already taken from the first side
+    outside = (partnered['from_position'] < start) | (partnered['from_position'] > end)
+    return {name: np.concatenate([anchored[name], partnered[name][outside]]) for name in COLUMNS}
+
+
+def window_as_dicts(columns):
+    """
+    Converts query_window output to the dict rows used by the viewer.
+    """
+    return [
+        {'from_position': int(f), 'to_position': int(t), 'weight': round(float(w), 6)}
+        for f, t, w in zip(columns['from_position'], columns['to_position'], columns['weight'])
+    ]
@@ -0,0 +1,298 @@
+"""
+Background jobs: management commands queued in the Job table and run by
+`manage.py run_jobs`, which uses the database as its queue.
+
+A worker claims the oldest queued job with a conditional UPDATE, so any
+number of workers (on any backend) can share the queue, and runs the
+command in-process. While it runs, a heartbeat thread stamps the job every
+settings.JOB_HEARTBEAT_SECONDS and picks up cancellation requests. A
+running job whose heartbeat is older than settings.JOB_STALE_SECONDS
+belonged to a worker that died and is queued again.
+
+Commands report through current(), which is a no-op outside a worker:
+
+    job = jobs.current()
+    job.start(total=len(genomes))
+    for genome in genomes:
+        if job.is_done(genome.name):
+            continue
+        ...
+        job.checkpoint(genome.name)
+
+Each checkpoint is a JobCheckpoint row, so a job that is resumed after a
+crash, restart or cancellation skips the work it already finished.
+Cancellation is cooperative: checkpoint() and advance() raise JobCancelled
+once it has been requested.
+"""
+import contextvars
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job, JobCheckpoint
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class _NoJob:
+    """
+    Stands in for the job context when a command is run directly.
+    """
+    total = None
+
+    def start(self, total=None):
+        pass
+
+    def is_done(self, key):
+        return False
+
+    def checkpoint(self, key, message=None):
+        pass
+
+    def advance(self, count=1, message=None):
+        pass
+
+    def each(self, items):
+        return iter(items)
+
+
+class JobContext:
+    """
+    Progress, checkpoints and cancellation of the job a worker is running.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.total = job.progress_total
+        self.done_keys = set(JobCheckpoint.objects.filter(job=job).values_list('key', flat=True))
+        self.cancelled = threading.Event()
+
+    def start(self, total=None):
+        """
+        Records how many items the job will checkpoint or advance through.
+        Commands called by another command leave the outer total alone.
+        """
+        if self.total is None and total is not None:
+            self.total = total
+            Job.objects.filter(id=self.job.id).update(progress_total=total)
+
+    def is_done(self, key):
+        return str(key) in self.done_keys
+
+    def checkpoint(self, key, message=None):
+        """
+        Marks the unit of work key as finished, so a resumed job skips it.
+        """
+        key = str(key)
+        if key not in self.done_keys:
+            try:
+                JobCheckpoint.objects.create(job_id=self.job.id, key=key)
+            except IntegrityError:
+                pass
+            self.done_keys.add(key)
+            self.advance(message=message)
+        else:
+            self._check_cancelled()
+
+    def advance(self, count=1, message=None):
+        """
+        Adds count to the progress of the job.
+        """
+        update = {'progress_done': F('progress_done') + count}
+        if message is not None:
+            update['message'] = message[:255]
+        Job.objects.filter(id=self.job.id).update(**update)
+        self._check_cancelled()
+
+    def each(self, items):
+        """
+        Yields items, advancing the progress as each one is finished.
+        """
+        for item in items:
+            yield item
+            self.advance()
+
+    def _check_cancelled(self):
+        if self.cancelled.is_set():
+            raise JobCancelled(f'Job {self.job.id} was cancelled')
+
+
+_NO_JOB = _NoJob()
+_current = contextvars.ContextVar('job', default=None)
+
+
+def current():
+    """
+    Returns the context of the job being run, or a no-op stand-in.
+    """
+    return _current.get() or _NO_JOB
+
+
+def enqueue(command, arguments=()):
+    """
+    Queues a management command with its command-line arguments.
+    """
+    return Job.objects.create(command=command, arguments=[str(argument) for argument in arguments])
+
+
+def cancel(job_id):
+    """
+    Cancels a queued job right away and asks a running one to stop at its
+    next checkpoint. Returns False if the job does not exist or has ended.
+    """
+    if Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+        status=Job.CANCELLED, cancel_requested=True, finished_at=timezone.now()
+    ):
+        return True
+    return bool(Job.objects.filter(id=job_id, status=Job.RUNNING).update(cancel_requested=True))
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def requeue_stale():
+    """
+    Queues running jobs whose worker stopped sending heartbeats again, to be
+    resumed from their checkpoints. Returns the number of jobs requeued.
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    stale = Job.objects.filter(
+        Q(heartbeat_at__lt=stale_before) | Q(heartbeat_at__isnull=True), status=Job.RUNNING
+    )
+    stale.filter(cancel_requested=True).update(status=Job.CANCELLED, finished_at=timezone.now())
+    requeued = stale.update(status=Job.QUEUED, worker='')
+    if requeued:
+        logger.warning('Requeued %d job(s) of workers that stopped', requeued)
+    return requeued
+
+
+def claim(worker):
+    """
+    Marks the oldest queued job as running on worker and returns it, or
+    returns None if the queue is empty.
+    """
+    requeue_stale()
+    while True:
+        job_id = (
+            Job.objects.filter(status=Job.QUEUED).order_by('created_at', 'id').values_list('id', flat=True).first()
+        )
+        if job_id is None:
+            return None
+        now = timezone.now()
+        # Only one worker's UPDATE matches while the job is still queued
+        claimed = Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, started_at=now, heartbeat_at=now,
+            attempts=F('attempts') + 1, progress_at_start=F('progress_done'),
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+
+
+def _heartbeat(job_id, worker, stop, cancelled):
+    try:
+        while not stop.wait(settings.JOB_HEARTBEAT_SECONDS):
+            try:
+                owned = Job.objects.filter(id=job_id, worker=worker, status=Job.RUNNING)
+                if not owned.update(heartbeat_at=timezone.now()):
+                    # Requeued as stale and possibly claimed by another worker: stop at the next checkpoint
+                    logger.warning('Job %d is no longer owned by %s; stopping it', job_id, worker)
+                    cancelled.set()
+                elif owned.filter(cancel_requested=True).exists():
+                    cancelled.set()
+            except DatabaseError:
+                # A locked or dropped database must not end the heartbeat while the command runs
+                logger.exception('Heartbeat of job %d failed; retrying', job_id)
+                connection.close()
+    finally:
+        connection.close()
+
+
+def run(job, stdout=None, stderr=None):
+    """
+    Runs a claimed job to the end and records how it ended.
+    """
+    context = JobContext(job)
+    if job.cancel_requested:
+        context.cancelled.set()
+    stop = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat, args=(job.id, job.worker, stop, context.cancelled), daemon=True
+    )
+    heartbeat.start()
+
+    token = _current.set(context)
+    try:
+        call_command(job.command, *job.arguments, stdout=stdout, stderr=stderr)
+        status, error = Job.DONE, ''
+    except JobCancelled:
+        status, error = Job.CANCELLED, ''
+    except Exception:
+        status, error = Job.FAILED, traceback.format_exc()
+    except BaseException:
+        # The worker is stopping; the next one resumes the job
+        Job.objects.filter(id=job.id, worker=job.worker).update(status=Job.QUEUED, worker='')
+        raise
+    finally:
+        _current.reset(token)
+        stop.set()
+        heartbeat.join()
+
+    # A job requeued while this worker ran it belongs to whichever worker claimed it since
+    if not Job.objects.filter(id=job.id, worker=job.worker, status=Job.RUNNING).update(
+        status=status, error=error, finished_at=timezone.now()
+    ):
+        logger.warning('Job %d was taken over by another worker; not recording it as %s', job.id, status)
+    return status
+
+
+def throughput(job, now=None):
+    """
+    Returns (items per second, seconds left or None) of the current attempt.
+    """
+    if job.started_at is None:
+        return 0.0, None
+    end = job.finished_at if job.status != Job.RUNNING and job.finished_at else (now or timezone.now())
+    elapsed = (end - job.started_at).total_seconds()
+    done = job.progress_done - job.progress_at_start
+    rate = done / elapsed if elapsed > 0 else 0.0
+    remaining = None
+    if job.status == Job.RUNNING and job.progress_total is not None and rate > 0:
+        remaining = max(job.progress_total - job.progress_done, 0) / rate
+    return rate, remaining
+
+
+def job_summary(job, now=None):
+    rate, remaining = throughput(job, now)
+    return {
+        'id': job.id,
+        'command': job.command,
+        'arguments': job.arguments,
+        'status': job.status,
+        'cancel_requested': job.cancel_requested,
+        'progress': job.progress_done,
+        'total': job.progress_total,
+        'message': job.message,
+        'attempts': job.attempts,
+        'worker': job.worker,
+        'items_per_second': round(rate, 3),
+        'seconds_remaining': None if remaining is None else round(remaining),
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'heartbeat_at': job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+    }
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from viewer.models import Genome, Sequence
+from viewer import assembly, jobs
+
+class Command(BaseCommand):
+    help = ('Fill the length and base count columns of sequences loaded before they existed from their '
+            'sequence text, and the assembly statistics of their genomes. Safe to run again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--genome',
+            type=str,
+            default=None,
+            help='Only backfill the sequences of this genome (by name)',
+        )
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=100,
+            help='Sequences read and updated per transaction (default: 100)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        sequences = Sequence.objects.all()
+        genomes = Genome.objects.order_by('id')
+        if options['genome']:
+            genome = Genome.objects.filter(name=options['genome']).first()
+            if genome is None:
+                raise CommandError(f'Genome "{options["genome"]}" does not exist.')
+            sequences = sequences.filter(genome=genome)
+            genomes = genomes.filter(id=genome.id)
+
+        total = sequences.count()
+        job = jobs.current()
+        job.start(total=total)
+        self.stdout.write(f"Backfilling {total} sequences...")
+
+        fields = ['length', 'gc_count', 'n_count', 'iupac_count']
+        started = time.perf_counter()
+        done = 0
+        last_id = 0
+        while True:
+            # Keyset batches, so each read starts at an index seek however far along
+            rows = list(
+                sequences.filter(id__gt=last_id).order_by('id').values_list('id', 'sequence')[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updated = [Sequence(id=sequence_id, **assembly.contig_fields(text)) for sequence_id, text in rows]
+            with transaction.atomic():
+                Sequence.objects.bulk_update(updated, fields, batch_size=1000)
+
+            done += len(rows)
+            job.advance(len(rows))
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {done}/{total} sequences ({done / (time.perf_counter() - started):.0f}/s)")
+
+        for genome in genomes:
+            assembly.update_genome(genome)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {done} sequences and {genomes.count()} genomes in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from viewer.models import Feature, Genome, FEATURE_ATTRIBUTE_COLUMNS, attribute_columns
+from viewer import jobs
+
+class Command(BaseCommand):
+    help = ('Fill the product, gene, name and locus_tag columns of features loaded before they existed '
+            'from their attributes, in batches. Safe to run again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--genome',
+            type=str,
+            default=None,
+            help='Only backfill the features of this genome (by name)',
+        )
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=5000,
+            help='Features read and updated per transaction (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        features = Feature.objects.all()
+        if options['genome']:
+            genome = Genome.objects.filter(name=options['genome']).first()
+            if genome is None:
+                raise CommandError(f'Genome "{options["genome"]}" does not exist.')
+            features = features.filter(sequence__genome=genome)
+
+        total = features.count()
+        job = jobs.current()
+        job.start(total=total)
+        self.stdout.write(f"Backfilling {total} features...")
+
+        columns = list(FEATURE_ATTRIBUTE_COLUMNS)
+        started = time.perf_counter()
+        done = 0
+        last_id = 0
+        while True:
+            # Keyset batches, so each read starts at an index seek however far along
+            rows = list(
+                features.filter(id__gt=last_id).order_by('id').values_list('id', 'attributes')[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updated = [Feature(id=feature_id, **attribute_columns(attributes)) for feature_id, attributes in rows]
+            with transaction.atomic():
+                Feature.objects.bulk_update(updated, columns, batch_size=1000)
+
+            done += len(rows)
+            job.advance(len(rows))
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {done}/{total} features ({done / (time.perf_counter() - started):.0f}/s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {done} features in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from viewer.models import Sequence, Feature
+
+
+class Command(BaseCommand):
+    help = ('Compare latency under concurrent load of the synchronous views served through the '
+            'WSGI handler with their async variants served through the ASGI handler.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[1, 8, 32],
+            help='Numbers of requests kept in flight (default: 1 8 32).'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Requests per endpoint and concurrency level (default: 200).'
+        )
+        parser.add_argument(
+            '--endpoints',
+            type=str,
+            nargs='+',
+            default=None,
+            help='Only benchmark these endpoints (viewer, feature_data, heatmap_data).'
+        )
+        parser.add_argument(
+            '--query_latency_ms',
+            type=float,
+            default=0.0,
+            help='Add this delay to every query, to approximate a database across the network '
+                 'when benchmarking against a local SQLite file (default: 0).'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Write results as JSON to this file.'
+        )
+
+    def handle(self, *args, **options):
+        if options['query_latency_ms'] > 0:
+            self.add_query_latency(options['query_latency_ms'] / 1000)
+
+        endpoints = self.endpoints()
+        if options['endpoints']:
+            endpoints = [endpoint for endpoint in endpoints if endpoint[0] in options['endpoints']]
+
+        results = {}
+        for name, wsgi_url, asgi_url in endpoints:
+            results[name] = {}
+            for concurrency in options['concurrency']:
+                wsgi = self.run_wsgi(wsgi_url, concurrency, options['requests'])
+                asgi = asyncio.run(self.run_asgi(asgi_url, concurrency, options['requests']))
+                results[name][concurrency] = {'wsgi': wsgi, 'asgi': asgi}
+                for server, entry in (('wsgi', wsgi), ('asgi', asgi)):
+                    self.stdout.write(
+                        f"  {name:<13} c={concurrency:<3} {server}  p50={entry['p50_ms']:.1f}ms "
+                        f"p95={entry['p95_ms']:.1f}ms {entry['requests_per_s']:.1f} req/s"
+                    )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def add_query_latency(self, delay):
+        def delayed_execute(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def on_connect(sender, connection, **kwargs):
+            # Outermost, since execute_wrapper() blocks already open pop the last entry on exit
+            if delayed_execute not in connection.execute_wrappers:
+                connection.execute_wrappers.insert(0, delayed_execute)
+
+        # Connections are opened per thread, by the test clients and the read pool alike
+        connection_created.connect(on_connect, weak=False)
+        connections.close_all()
+
+    def endpoints(self):
+        """
+        Returns (name, wsgi url, asgi url) for a contig with features, preferring one with track data.
+        """
+        sequence = Sequence.objects.filter(features__isnull=False, nucleotide_data__isnull=False).order_by('id').first() \
+            or Sequence.objects.filter(features__isnull=False).order_by('id').first()
+        if sequence is None:
+            raise CommandError('No sequences with features found; seed the database first.')
+        feature = Feature.objects.filter(sequence=sequence).order_by('start').first()
+        contig = sequence.contig
+        query = f'?feature_id={feature.id}'
+
+        return [
+            ('viewer', reverse('viewer', args=[contig]) + '?start=0&end=5000',
+             reverse('viewer_async', args=[contig]) + '?start=0&end=5000'),
+            ('feature_data', reverse('get_feature_data', args=[contig]) + query,
+             reverse('get_feature_data_async', args=[contig]) + query),
+            ('heatmap_data', reverse('get_heatmap_data', args=[contig]) + query,
+             reverse('get_heatmap_data_async', args=[contig]) + query),
+        ]
+
+    def run_wsgi(self, url, concurrency, total):
+        local = threading.local()
+
+        def fetch(_):
+            if not hasattr(local, 'client'):
+                local.client = Client(HTTP_HOST='localhost')
+            start = time.perf_counter()
+            response = local.client.get(url)
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}')
+            return elapsed
+
+        def close(_):
+            connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(fetch, range(total)))
+            list(pool.map(close, range(concurrency)))
+        return self.summary(latencies, time.perf_counter() - started)
+
+    async def run_asgi(self, url, concurrency, total):
+        client = AsyncClient(HTTP_HOST='localhost')
+        slots = asyncio.Semaphore(concurrency)
+
+        async def fetch():
+            async with slots:
+                start = time.perf_counter()
+                response = await client.get(url)
+                elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}')
+            return elapsed
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(fetch() for _ in range(total)))
+        return self.summary(latencies, time.perf_counter() - started)
+
+    def summary(self, latencies, wall):
+        latencies = np.array(latencies) * 1000
+        return {
+            'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+            'mean_ms': round(float(latencies.mean()), 3),
+            'requests_per_s': round(len(latencies) / wall, 2),
+        }
@@ -0,0 +1,107 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a web worker imports before serving its first request
+WORKER_BOOT = (
+    "import genomics.wsgi; "
+    "from django.urls import get_resolver; "
+    "get_resolver().url_patterns"
+)
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = ('Measure worker startup import time with python -X importtime and fail when it '
+            'exceeds a budget or pulls in modules reserved for the analytics views.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget_ms',
+            type=float,
+            default=600.0,
+            help='Maximum median import time in milliseconds (default: 600).'
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='Number of fresh interpreters to measure (default: 5).'
+        )
+        parser.add_argument(
+            '--forbid',
+            type=str,
+            nargs='*',
+            default=['numpy', 'scipy', 'plotly', 'pandas', 'sklearn'],
+            help='Top-level packages that must not be imported at startup.'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=15,
+            help='Show this many slowest imports (default: 15).'
+        )
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1.')
+
+        totals = []
+        for _ in range(options['runs']):
+            modules = self.measure()
+            # Top-level entries already include the time of everything they import
+            totals.append(sum(cumulative for cumulative, depth, _ in modules.values() if depth == 0) / 1000)
+
+        self.stdout.write(self.style.NOTICE('Slowest imports (cumulative, last run):'))
+        slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:options['top']]
+        for name, (cumulative, depth, _) in slowest:
+            self.stdout.write(f"  {cumulative / 1000:8.1f}ms  {'  ' * depth}{name}")
+
+        median = statistics.median(totals)
+        self.stdout.write(
+            f"Startup imports: median {median:.1f}ms, min {min(totals):.1f}ms over {len(totals)} runs "
+            f"(budget {options['budget_ms']:.0f}ms)"
+        )
+
+        failures = []
+        loaded = {name.split('.')[0] for name in modules}
+        forbidden = sorted(loaded & set(options['forbid']))
+        if forbidden:
+            failures.append(f"imported at startup: {', '.join(forbidden)}")
+        if median > options['budget_ms']:
+            failures.append(f"median {median:.1f}ms exceeds budget of {options['budget_ms']:.0f}ms")
+
+        if failures:
+            for failure in failures:
+                self.stderr.write(self.style.ERROR(failure))
+            raise CommandError('Import time budget exceeded.')
+        self.stdout.write(self.style.SUCCESS('Within import time budget.'))
+
+    def measure(self):
+        """
+        Returns {module: (cumulative_us, depth, self_us)} for one fresh interpreter.
+        """
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'genomics.settings'))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', WORKER_BOOT],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Startup failed:\n{result.stderr[-2000:]}')
+
+        modules = {}
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                modules[name] = (int(cumulative_us), (len(indent) - 1) // 2, int(self_us))
+        return modules
@@ -0,0 +1,219 @@
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from viewer.models import Genome, Sequence, Feature
+
+class Command(BaseCommand):
+    help = ('Benchmark view latency, query counts and peak memory per endpoint, optionally on '
+            'SQLite databases seeded at several scales, and compare against a baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            type=str,
+            nargs='+',
+            default=None,
+            help='Seed and benchmark one SQLite database per scale (e.g. S M). '
+                 'Requires a SQLite default database, see genomics/settings_bench.py. '
+                 'If omitted the current database is benchmarked as is.'
+        )
+        parser.add_argument(
+            '--db_dir',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'bench'),
+            help='Directory holding the per-scale SQLite databases (default: ./bench).'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Timed requests per endpoint (default: 20).'
+        )
+        parser.add_argument(
+            '--endpoints',
+            type=str,
+            nargs='+',
+            default=None,
+            help='Only benchmark these endpoints.'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Write results as JSON to this file.'
+        )
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            default=None,
+            help='JSON results of a previous run to compare against.'
+        )
+        parser.add_argument(
+            '--max_p95_growth',
+            type=float,
+            default=0.2,
+            help='Allowed relative growth of p95 latency over the baseline (default: 0.2).'
+        )
+
+    def handle(self, *args, **options):
+        scales = options['scales']
+        results = {}
+
+        if scales:
+            if connection.vendor != 'sqlite':
+                raise CommandError(
+                    'Scale fixtures require a SQLite default database. '
+                    'Run with DJANGO_SETTINGS_MODULE=genomics.settings_bench.'
+                )
+            os.makedirs(options['db_dir'], exist_ok=True)
+            for scale in scales:
+                self.use_scale_database(scale, options['db_dir'])
+                results[scale] = self.run_endpoints(options)
+        else:
+            results['current'] = self.run_endpoints(options)
+
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'iterations': options['iterations'],
+            'results': results,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['max_p95_growth'])
+
+    def use_scale_database(self, scale, db_dir):
+        """
+        Points the default connection at bench_<scale>.sqlite3, migrating and
+        seeding it with synthetic data on first use.
+        """
+        connection.close()
+        connection.settings_dict['NAME'] = os.path.join(db_dir, f'bench_{scale}.sqlite3')
+        settings.INTERACTION_STORE_DIR = os.path.join(db_dir, f'interaction_store_{scale}')
+
+        call_command('migrate', verbosity=0)
+        if not Genome.objects.exists():
+            self.stdout.write(f'Seeding benchmark database for scale {scale}...')
+            with open(os.devnull, 'w') as devnull:
+                call_command('generate_synthetic_data', scale=scale, seed=0, index=True, stdout=devnull)
+                call_command('generate_stats', stdout=devnull, stderr=devnull)
+        self.stdout.write(self.style.NOTICE(f'Benchmarking scale {scale} ({Genome.objects.count()} genomes)'))
+
+    def endpoints(self):
+        """
+        Returns (name, url) pairs for the endpoints to benchmark, using a
+        contig and a feature from the current database.
+        """
+        sequence = Sequence.objects.filter(features__isnull=False).order_by('id').first()
+        if sequence is None:
+            raise CommandError('No sequences with features found; seed the database first.')
+        feature = Feature.objects.filter(sequence=sequence).exclude(type='gene').order_by('start').first() \
+            or Feature.objects.filter(sequence=sequence).order_by('start').first()
+        contig = sequence.contig
+
+        return [
+            ('index', reverse('index')),
+            ('index_crispr', reverse('index') + '?show_crispr=true'),
+            ('viewer', reverse('viewer', args=[contig]) + '?start=0&end=5000'),
+            ('viewer_track', reverse('viewer', args=[contig]) + '?start=0&end=5000&color_by=dummy'),
+            ('evaluation', reverse('evaluation')),
+            ('crispr_plot', reverse('crispr_plot')),
+            ('cas_heatmap', reverse('cas_heatmap')),
+            ('search_features', reverse('search_features', args=[contig]) + '?q=protein'),
+            ('feature_info', reverse('feature_info', args=[contig]) + f'?feature_id={feature.id}'),
+            ('feature_data', reverse('get_feature_data', args=[contig]) + f'?feature_id={feature.id}'),
+            ('heatmap_data', reverse('get_heatmap_data', args=[contig]) + f'?feature_id={feature.id}'),
+        ]
+
+    def run_endpoints(self, options):
+        client = Client(HTTP_HOST='localhost')
+        selected = options['endpoints']
+        results = {}
+
+        for name, url in self.endpoints():
+            if selected and name not in selected:
+                continue
+
+            # Warm-up request doubles as the query count pass. The query log is
+            # bounded, so clear it first or a full log would hide new queries
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            status = response.status_code
+
+            latencies = []
+            for _ in range(options['iterations']):
+                start = time.perf_counter()
+                client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            tracemalloc.start()
+            client.get(url)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results[name] = {
+                'url': url,
+                'status': status,
+                'queries': len(queries.captured_queries),
+                'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+                'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+                'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+                'mean_ms': round(float(np.mean(latencies)), 3),
+                'peak_memory_kb': round(peak / 1024, 1),
+            }
+            entry = results[name]
+            self.stdout.write(
+                f"  {name:<16} status={status} queries={entry['queries']:<5} "
+                f"p50={entry['p50_ms']:.1f}ms p95={entry['p95_ms']:.1f}ms peak={entry['peak_memory_kb']:.0f}KB"
+            )
+
+        return results
+
+    def compare(self, report, baseline_path, max_p95_growth):
+        """
+        Fails when an endpoint does not respond with 200, or its query count
+        or p95 latency grew past the baseline. A failing endpoint is not
+        compared further, since a fast error is no improvement, and neither is
+        one whose baseline was an error, since there is nothing to compare to.
+        """
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        regressions = []
+        for scale, endpoints in report['results'].items():
+            for name, entry in endpoints.items():
+                previous = baseline.get('results', {}).get(scale, {}).get(name)
+                if entry['status'] != 200:
+                    regressions.append(f"{scale}/{name}: status {entry['status']}")
+                    continue
+                if not previous:
+                    continue
+                if previous.get('status', 200) != 200:
+                    self.stdout.write(f"{scale}/{name}: baseline status {previous['status']}, not compared.")
+                    continue
+                if entry['queries'] > previous['queries']:
+                    regressions.append(f"{scale}/{name}: queries {previous['queries']} -> {entry['queries']}")
+                if entry['p95_ms'] > previous['p95_ms'] * (1 + max_p95_growth):
+                    regressions.append(f"{scale}/{name}: p95 {previous['p95_ms']:.1f}ms -> {entry['p95_ms']:.1f}ms")
+
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR(f"Regression: {regression}"))
+            raise CommandError(f'{len(regressions)} regression(s) against {baseline_path}.')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}.'))
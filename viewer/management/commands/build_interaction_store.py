@@ -0,0 +1,115 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from viewer.models import Sequence, Interaction
+from viewer import interaction_store
+
+class Command(BaseCommand):
+    help = 'Build the sorted on-disk interaction store and binned contact matrices from the Interaction table or from interaction files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            type=str,
+            nargs='+',
+            default=None,
+            help='Tab-separated file(s) with columns from_contig, to_contig, from_position, to_position, weight. '
+                 'If omitted the store is built from the Interaction table.'
+        )
+        parser.add_argument(
+            '--contig',
+            type=str,
+            default=None,
+            help='Only build the store for interactions starting on this contig.'
+        )
+        parser.add_argument(
+            '--chunk_size',
+            type=int,
+            default=1000000,
+            help='Rows read per chunk from files (default: 1000000).'
+        )
+
+    def handle(self, *args, **options):
+        contig = options['contig']
+
+        if options['file']:
+            pairs = self.pairs_from_files(options['file'], options['chunk_size'], contig)
+        else:
+            pairs = self.pairs_from_table(contig)
+
+        total_pairs = 0
+        total_rows = 0
+        for (from_id, to_id), (from_positions, to_positions, weights) in pairs:
+            rows = interaction_store.write_pair(from_id, to_id, from_positions, to_positions, weights)
+            interaction_store.write_contact_matrices(from_id, to_id, from_positions, to_positions, weights)
+            total_pairs += 1
+            total_rows += rows
+            self.stdout.write(f'  - Stored {rows} interactions for sequence pair {from_id} -> {to_id}.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Interaction store built for {total_pairs} sequence pairs ({total_rows} interactions).'
+        ))
+
+    def pairs_from_table(self, contig):
+        """
+        Yields one contig pair at a time so that only a single pair is in memory.
+        """
+        interactions = Interaction.objects.all()
+        if contig:
+            interactions = interactions.filter(from_sequence__contig=contig)
+
+        pair_ids = interactions.values_list('from_sequence_id', 'to_sequence_id').distinct().order_by()
+        for from_id, to_id in pair_ids:
+            rows = Interaction.objects.filter(
+                from_sequence_id=from_id,
+                to_sequence_id=to_id
+            ).values_list('from_position', 'to_position', 'weight').iterator(chunk_size=50000)
+            data = np.fromiter(rows, dtype=[('f', np.int64), ('t', np.int64), ('w', np.float64)])
+            yield (from_id, to_id), (data['f'], data['t'], data['w'])
+
+    def pairs_from_files(self, paths, chunk_size, contig):
+        """
+        Reads interaction files in chunks, appending each chunk's rows to a
+        temporary file per contig pair, then yields the pairs one at a time.
+        Only one chunk or one pair is in memory at once.
+        """
+        contig_ids = dict(Sequence.objects.values_list('contig', 'id'))
+        record = np.dtype([('f', np.int64), ('t', np.int64), ('w', np.float64)])
+
+        with tempfile.TemporaryDirectory(prefix='interactions-') as spill_dir:
+            pair_files = {}
+            for path in paths:
+                if not os.path.isfile(path):
+                    raise CommandError(f'Interaction file "{path}" does not exist.')
+                self.stdout.write(f'Reading interactions from "{path}".')
+
+                reader = pd.read_csv(
+                    path,
+                    sep='\t',
+                    usecols=['from_contig', 'to_contig', 'from_position', 'to_position', 'weight'],
+                    chunksize=chunk_size,
+                )
+                for chunk in reader:
+                    if contig:
+                        chunk = chunk[chunk['from_contig'] == contig]
+                    for (from_contig, to_contig), rows in chunk.groupby(['from_contig', 'to_contig'], sort=False):
+                        if from_contig not in contig_ids or to_contig not in contig_ids:
+                            self.stdout.write(self.style.WARNING(
+                                f'  - Skipping {len(rows)} interactions for unknown contigs {from_contig} -> {to_contig}.'
+                            ))
+                            continue
+                        key = (contig_ids[from_contig], contig_ids[to_contig])
+                        pair_file = pair_files.setdefault(key, os.path.join(spill_dir, f'{key[0]}_{key[1]}.bin'))
+                        data = np.empty(len(rows), dtype=record)
+                        data['f'] = rows['from_position'].to_numpy()
+                        data['t'] = rows['to_position'].to_numpy()
+                        data['w'] = rows['weight'].to_numpy()
+                        with open(pair_file, 'ab') as f:
+                            data.tofile(f)
+
+            for key, pair_file in pair_files.items():
+                data = np.fromfile(pair_file, dtype=record)
+                os.unlink(pair_file)
+                yield key, (data['f'], data['t'], data['w'])
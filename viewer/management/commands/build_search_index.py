@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from viewer.models import Genome
+from viewer.search import index_genome
+from viewer import jobs
+
+class Command(BaseCommand):
+    help = 'Build the trigram search index for features of all genomes or a single genome'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--genome',
+            type=str,
+            default=None,
+            help='Name of a single genome to (re)index (default: all genomes)',
+        )
+
+    def handle(self, *args, **options):
+        genome_name = options['genome']
+
+        genomes = Genome.objects.order_by('name')
+        if genome_name:
+            genomes = genomes.filter(name=genome_name)
+            if not genomes.exists():
+                raise CommandError(f'Genome "{genome_name}" does not exist.')
+
+        total_genomes = genomes.count()
+        total_indexed = 0
+        job = jobs.current()
+        job.start(total=total_genomes)
+        for i, genome in enumerate(genomes.iterator(), 1):
+            if job.is_done(genome.name):
+                continue
+            indexed = index_genome(genome)
+            total_indexed += indexed
+            self.stdout.write(f"Indexed {indexed} features for genome {i}/{total_genomes}: {genome.name}")
+            job.checkpoint(genome.name)
+
+        self.stdout.write(self.style.SUCCESS(f"Search index built for {total_indexed} features."))
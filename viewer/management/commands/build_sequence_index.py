@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from viewer.models import Sequence
+from viewer import sequence_index
+
+class Command(BaseCommand):
+    help = ('Build the memory-mapped k-mer index over all contig sequences used by /search/sequence/. '
+            'Rebuild it after loading or deleting genomes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--k',
+            type=int,
+            default=sequence_index.DEFAULT_K,
+            help=f'k-mer length between 4 and 14; the offsets table has 4**k entries '
+                 f'(default: {sequence_index.DEFAULT_K}).'
+        )
+        parser.add_argument(
+            '--chunk_size',
+            type=int,
+            default=sequence_index.CHUNK_SIZE,
+            help=f'Bases processed at a time, bounding memory use (default: {sequence_index.CHUNK_SIZE}).'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        sequences = Sequence.objects.order_by('id').values_list('id', 'sequence').iterator(chunk_size=100)
+
+        try:
+            contigs, positions = sequence_index.build(sequences, k=options['k'], chunk_size=options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {positions} positions of {contigs} contigs in {time.perf_counter() - started:.1f}s "
+            f"into {sequence_index.index_dir()}."
+        ))
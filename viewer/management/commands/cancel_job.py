@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+from viewer import jobs
+
+class Command(BaseCommand):
+    help = 'Cancel a queued job, or ask a running one to stop at its next checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_id', type=int, help='ID of the job')
+
+    def handle(self, *args, **options):
+        if not jobs.cancel(options['job_id']):
+            raise CommandError(f"Job {options['job_id']} does not exist or has already ended.")
+        self.stdout.write(self.style.SUCCESS(f"Cancellation of job {options['job_id']} requested."))
@@ -1,84 +1,139 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 from django.core.management.base import BaseCommand
-from django.db.models import Q
 from viewer.models import Genome, Feature, GeneInfluence
+from viewer import jobs
+from viewer.gene_influence import fit_ridge, share_array, bootstrap_chunk, bootstrap_summary
+import numpy as np
 import pandas as pd
 from sklearn.linear_model import Ridge
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import make_pipeline
+from sklearn.model_selection import GridSearchCV, KFold
+
+# Bootstrap resamples are dispatched in fixed-size chunks so that results for a
+# given seed do not depend on the number of workers
+BOOTSTRAP_CHUNK_SIZE = 50
 
 class Command(BaseCommand):
     help = 'Computes the influence of genes on CRISPR arrays using Ridge Regression to address multicollinearity'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--folds',
+            type=int,
+            default=5,
+            help='Number of cross-validation folds used to choose alpha (default: 5)',
+        )
+        parser.add_argument(
+            '--alphas',
+            type=float,
+            nargs='+',
+            default=list(np.logspace(-3, 3, 13)),
+            help='Candidate regularisation strengths (default: 13 values from 1e-3 to 1e3)',
+        )
+        parser.add_argument(
+            '--bootstrap',
+            type=int,
+            default=1000,
+            help='Number of bootstrap resamples for confidence intervals and p-values (default: 1000, 0 to skip)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes (default: number of CPUs)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Seed for fold shuffling and bootstrap resampling (optional)',
+        )
+
     def handle(self, *args, **options):
-        # Gather data
-        genomes = Genome.objects.all()
-        data = []
-        gene_set = set()
-
-        for genome in genomes:
-            num_crispr_arrays = genome.repeat_region_count or 0
-
-            # Get all genes for the genome
-            genes = Feature.objects.filter(
-                sequence__genome=genome,
-                type='gene'
-            ).filter(Q(attributes__has_key='gene'))
-
-            genome_gene_presence = {}
-            for gene in genes:
-                gene_name = gene.attributes.get('gene')
-                if gene_name:
-                    genome_gene_presence[gene_name] = 1
-                    gene_set.add(gene_name)
-
-            data.append({
-                'genome': genome.name,
-                'num_crispr_arrays': num_crispr_arrays,
-                'gene_presence': genome_gene_presence
-            })
-
-        if not data:
+        folds = options['folds']
+        alphas = options['alphas']
+        n_bootstrap = options['bootstrap']
+        workers = max(1, options['workers'])
+        seed = options['seed']
+
+        # Gather gene presence for all genomes in a single query
+        genomes = list(Genome.objects.order_by('id').values_list('id', 'repeat_region_count'))
+        if not genomes:
             self.stdout.write(self.style.WARNING('No data available to compute gene influence.'))
             return
 
-        # Prepare data for regression
-        gene_list = sorted(gene_set)
-        X_data = []
-        y_data = []
+        row_index = {genome_id: row for row, (genome_id, _) in enumerate(genomes)}
+        gene_rows = Feature.objects.filter(
+            type='gene'
+        ).exclude(gene='').values_list('sequence__genome_id', 'gene').distinct()
 
-        for entry in data:
-            presence = [entry['gene_presence'].get(gene, 0) for gene in gene_list]
-            X_data.append(presence)
-            y_data.append(entry['num_crispr_arrays'])
+        presence = set()
+        for genome_id, gene_name in gene_rows:
+            if gene_name:
+                presence.add((row_index[genome_id], gene_name))
+
+        # Prepare data for regression
+        gene_list = sorted({gene_name for _, gene_name in presence})
+        gene_columns = {gene_name: column for column, gene_name in enumerate(gene_list)}
+        X_data = np.zeros((len(genomes), len(gene_list)), dtype=np.float64)
+        for row, gene_name in presence:
+            X_data[row, gene_columns[gene_name]] = 1.0
+        y_data = np.array([count or 0 for _, count in genomes], dtype=np.float64)
 
         # Convert to pandas DataFrame for better handling
         X = pd.DataFrame(X_data, columns=gene_list)
         y = pd.Series(y_data)
 
-        # Remove columns with zero variance (genes not present in any genome)
+        # Remove columns with zero variance (genes present in all or no genomes)
         X = X.loc[:, (X != X.iloc[0]).any()]
 
         if X.empty:
             self.stdout.write(self.style.ERROR('All genes have zero variance. Cannot perform regression.'))
             return
 
-        # Fit Ridge Regression model with alpha=1.0 (regularization strength)
-        model = make_pipeline(StandardScaler(), Ridge(alpha=1.0))
-        model.fit(X, y)
-        coefficients = model.named_steps['ridge'].coef_
-        intercept = model.named_steps['ridge'].intercept_
+        # Choose the regularisation strength by k-fold cross-validation
+        n_splits = min(folds, len(X))
+        if n_splits >= 2:
+            search = GridSearchCV(
+                make_pipeline(StandardScaler(), Ridge()),
+                {'ridge__alpha': alphas},
+                cv=KFold(n_splits=n_splits, shuffle=True, random_state=seed),
+                scoring='neg_mean_squared_error',
+                n_jobs=workers,
+            )
+            search.fit(X, y)
+            alpha = search.best_params_['ridge__alpha']
+            self.stdout.write(f"Selected alpha={alpha:g} by {n_splits}-fold cross-validation")
+        else:
+            alpha = 1.0
+            self.stdout.write(self.style.WARNING('Too few genomes for cross-validation, using alpha=1.0'))
+
+        design = np.ascontiguousarray(X.to_numpy(dtype=np.float64))
+        target = y.to_numpy(dtype=np.float64)
+        coefficients, intercept = fit_ridge(design, target, alpha)
+
+        ci_lower = ci_upper = p_values = [None] * len(coefficients)
+        if n_bootstrap > 0:
+            boot_coefs = self.run_bootstrap(design, target, alpha, n_bootstrap, workers, seed)
+            ci_lower, ci_upper, p_values = bootstrap_summary(boot_coefs)
+            self.stdout.write(f"Computed {n_bootstrap} bootstrap resamples on {workers} worker(s)")
 
         # Clear previous GeneInfluence objects
         GeneInfluence.objects.all().delete()
 
-        # Save coefficients, set p_value to None since Ridge does not provide p-values
-        for gene_name, coef in zip(X.columns, coefficients):
-            GeneInfluence.objects.create(
+        GeneInfluence.objects.bulk_create([
+            GeneInfluence(
                 gene_name=gene_name,
                 coefficient=coef,
-                p_value=None,  # No p-values available
+                p_value=self.to_float(p_value),
+                ci_lower=self.to_float(lower),
+                ci_upper=self.to_float(upper),
                 is_cas_gene=gene_name.lower().startswith('cas')
             )
+            for gene_name, coef, p_value, lower, upper in zip(X.columns, coefficients, p_values, ci_lower, ci_upper)
+        ])
 
         # Save the full regression equation (excluding intercept)
         equation_terms = [f"{coef:.4f}*{name}" for name, coef in zip(X.columns, coefficients)]
@@ -91,4 +146,43 @@ class Command(BaseCommand):
             full_equation=full_equation
         )
 
-        self.stdout.write(self.style.SUCCESS('Gene influence computed and saved successfully using Ridge Regression.'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Gene influence computed and saved successfully using Ridge Regression.'))
+
+    def run_bootstrap(self, design, target, alpha, n_bootstrap, workers, seed):
+        """
+        Fans bootstrap resamples out over a process pool. The design matrix is
+        placed in shared memory once and attached by every worker.
+        """
+        chunk_sizes = [BOOTSTRAP_CHUNK_SIZE] * (n_bootstrap // BOOTSTRAP_CHUNK_SIZE)
+        if n_bootstrap % BOOTSTRAP_CHUNK_SIZE:
+            chunk_sizes.append(n_bootstrap % BOOTSTRAP_CHUNK_SIZE)
+        seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+        job = jobs.current()
+        job.start(total=len(chunk_sizes))
+
+        shm = share_array(design)
+        try:
+            if workers == 1:
+                results = [
+                    bootstrap_chunk(shm.name, design.shape, design.dtype, target, alpha, chunk_seed, size)
+                    for chunk_seed, size in job.each(zip(seeds, chunk_sizes))
+                ]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        executor.submit(bootstrap_chunk, shm.name, design.shape, design.dtype, target, alpha, chunk_seed, size)
+                        for chunk_seed, size in zip(seeds, chunk_sizes)
+                    ]
+                    try:
+                        results = [future.result() for future in job.each(futures)]
+                    except jobs.JobCancelled:
+                        executor.shutdown(cancel_futures=True)
+                        raise
+        finally:
+            shm.close()
+            shm.unlink()
+        return np.vstack(results)
+
+    @staticmethod
+    def to_float(value):
+        return None if value is None else float(value)
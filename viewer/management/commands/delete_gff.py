@@ -1,9 +1,12 @@
-from django.core.management.base import BaseCommand
-from viewer.models import Genome, Sequence, Feature
-from django.db import transaction
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from viewer.models import Genome, Sequence
+from viewer import deletion
 
 class Command(BaseCommand):
-    help = 'Deletes all Genome, Sequence, and Feature entries from the database'
+    help = ('Deletes Genome, Sequence and Feature entries with everything that depends on them, '
+            'either all of them or only the given genomes or contigs')
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -11,30 +14,73 @@ class Command(BaseCommand):
             action='store_true',
             help='Force deletion without asking for confirmation',
         )
+        parser.add_argument(
+            '--genome',
+            type=str,
+            nargs='+',
+            default=None,
+            help='Only delete these genomes (by name)',
+        )
+        parser.add_argument(
+            '--contig',
+            type=str,
+            nargs='+',
+            default=None,
+            help='Only delete these contigs (by name), keeping their genomes',
+        )
 
     def handle(self, *args, **options):
         force = options['force']
 
+        if options['genome'] and options['contig']:
+            raise CommandError('Give either --genome or --contig, not both.')
+
+        if options['genome']:
+            genomes = list(Genome.objects.filter(name__in=options['genome']))
+            missing = set(options['genome']) - {genome.name for genome in genomes}
+            if missing:
+                raise CommandError(f"Genomes not found: {', '.join(sorted(missing))}")
+            target = f"{len(genomes)} genome(s) and all their data"
+        elif options['contig']:
+            sequence_ids = list(Sequence.objects.filter(contig__in=options['contig']).values_list('id', flat=True))
+            if not sequence_ids:
+                raise CommandError('No matching contigs found.')
+            target = f"{len(sequence_ids)} contig(s) and all their data"
+        else:
+            target = "all Genome, Sequence, and Feature entries"
+
         if not force:
-            confirm = input("Are you sure you want to delete all Genome, Sequence, and Feature entries? This action cannot be undone. (yes/no): ")
+            confirm = input(f"Are you sure you want to delete {target}? This action cannot be undone. (yes/no): ")
             if confirm.lower() != 'yes':
                 self.stdout.write(self.style.WARNING("Operation cancelled."))
                 return
 
-        try:
-            with transaction.atomic():
-                feature_count = Feature.objects.count()
-                sequence_count = Sequence.objects.count()
-                genome_count = Genome.objects.count()
-
-                Feature.objects.all().delete()
-                Sequence.objects.all().delete()
-                Genome.objects.all().delete()
+        started = time.perf_counter()
+        verbose = options['verbosity'] > 1
 
-                self.stdout.write(self.style.SUCCESS(f"Successfully deleted:"))
-                self.stdout.write(f"  - {feature_count} Feature entries")
-                self.stdout.write(f"  - {sequence_count} Sequence entries")
-                self.stdout.write(f"  - {genome_count} Genome entries")
+        def progress(table, rows):
+            if verbose:
+                self.stdout.write(f"  {table}: {rows} rows")
 
+        try:
+            if options['genome']:
+                removed = None
+                for i, genome in enumerate(genomes, 1):
+                    genome_removed = deletion.delete_genome(genome, progress)
+                    removed = genome_removed if removed is None else removed + genome_removed
+                    self.stdout.write(
+                        f"Deleted genome {i}/{len(genomes)}: {genome.name} "
+                        f"({sum(genome_removed.values())} rows, {time.perf_counter() - started:.1f}s elapsed)"
+                    )
+            elif options['contig']:
+                removed = deletion.delete_sequences(sequence_ids, progress)
+            else:
+                removed = deletion.delete_all(progress)
         except Exception as e:
             self.stderr.write(self.style.ERROR(f"An error occurred while deleting entries: {str(e)}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Successfully deleted in {time.perf_counter() - started:.1f}s:"))
+        for table, rows in removed.items():
+            if rows:
+                self.stdout.write(f"  - {rows} {table} rows")
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from viewer.models import Interaction
+from viewer import deletion, interaction_store
 
 class Command(BaseCommand):
     help = 'Delete all Interaction records from the database.'
@@ -8,6 +9,9 @@ class Command(BaseCommand):
         count = Interaction.objects.count()
         if count == 0:
             self.stdout.write(self.style.WARNING('No interactions found to delete.'))
+            # A store built from files can exist without table rows; delete_all() drops it otherwise
+            interaction_store.delete_pairs()
         else:
-            Interaction.objects.all().delete()
-            self.stdout.write(self.style.SUCCESS(f'Successfully deleted {count} interactions.'))
\ No newline at end of file
+            # Emptied with one TRUNCATE / DELETE instead of collecting every row, along with the on-disk store
+            deletion.delete_all(tables=[Interaction])
+            self.stdout.write(self.style.SUCCESS(f'Successfully deleted {count} interactions.'))
@@ -0,0 +1,21 @@
+import argparse
+
+from django.core.management import get_commands
+from django.core.management.base import BaseCommand, CommandError
+from viewer import jobs
+
+class Command(BaseCommand):
+    help = ('Queue a management command to be run by `manage.py run_jobs`, e.g. '
+            '`manage.py enqueue_job generate_stats`. Arguments after the command name are passed to it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_command', type=str, help='Name of the management command to run')
+        parser.add_argument('arguments', nargs=argparse.REMAINDER, help='Arguments of the command')
+
+    def handle(self, *args, **options):
+        command = options['job_command']
+        if command not in get_commands():
+            raise CommandError(f"Unknown command: {command}")
+
+        job = jobs.enqueue(command, options['arguments'])
+        self.stdout.write(self.style.SUCCESS(f"Queued job {job.id}: {' '.join([command, *job.arguments])}"))
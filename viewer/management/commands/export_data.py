@@ -0,0 +1,109 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from viewer.models import Sequence
+from viewer import export
+from viewer.routing import read_from_replica
+
+class Command(BaseCommand):
+    help = ('Stream sequences as FASTA, features as GFF3 or BED, a track as bedGraph, or repeat '
+            'regions with flanks as FASTA, GFF3 or BED to a file or stdout. Memory use stays '
+            'constant however much is exported.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'kind',
+            choices=['fasta', 'gff3', 'bed', 'bedgraph', 'repeat_regions'],
+            help='What to export.'
+        )
+        parser.add_argument('--genome', type=str, default=None, help='Only export this genome.')
+        parser.add_argument('--contig', type=str, default=None, help='Only export this contig.')
+        parser.add_argument(
+            '--start',
+            type=int,
+            default=None,
+            help='0-based start of the region to export (with --contig).'
+        )
+        parser.add_argument(
+            '--end',
+            type=int,
+            default=None,
+            help='0-based exclusive end of the region to export (with --contig).'
+        )
+        parser.add_argument(
+            '--type',
+            type=str,
+            nargs='+',
+            default=None,
+            help='Only export features of these types (gff3, bed).'
+        )
+        parser.add_argument('--data_source', type=str, default=None, help='Track to export (bedgraph).')
+        parser.add_argument(
+            '--method',
+            type=str,
+            default=None,
+            help='Only export repeat regions found by this method (repeat_regions).'
+        )
+        parser.add_argument(
+            '--flank',
+            type=int,
+            default=0,
+            help='Bases added either side of each repeat region in FASTA output (repeat_regions, default: 0).'
+        )
+        parser.add_argument(
+            '--format',
+            type=str,
+            choices=export.REPEAT_FORMATS,
+            default='fasta',
+            help='Output format of repeat_regions (default: fasta).'
+        )
+        parser.add_argument('--output', type=str, default=None, help='Write to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if (options['start'] is not None or options['end'] is not None) and not options['contig']:
+            raise CommandError('--start and --end need --contig.')
+
+        out = open(options['output'], 'w') if options['output'] else sys.stdout
+        written = 0
+        try:
+            # Exports only read, so they can be served by the replica if there is one
+            with read_from_replica():
+                for line in self.lines(options):
+                    out.write(line)
+                    written += 1
+        finally:
+            if options['output']:
+                out.close()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} lines to {options['output']}"))
+
+    def lines(self, options):
+        kind = options['kind']
+        genome, contig = options['genome'], options['contig']
+        start, end = options['start'], options['end']
+
+        if kind == 'fasta':
+            return export.fasta(export.sequences_for(genome=genome, contig=contig), start, end)
+
+        if kind in export.FEATURE_FORMATS:
+            features = export.features_for(genome=genome, contig=contig, start=start, end=end, types=options['type'])
+            return export.gff3(features) if kind == 'gff3' else export.bed(features)
+
+        if kind == 'bedgraph':
+            if not contig or not options['data_source']:
+                raise CommandError('bedgraph needs --contig and --data_source.')
+            sequences = Sequence.objects.filter(contig=contig)
+            if genome:
+                sequences = sequences.filter(genome__name=genome)
+            sequence = sequences.only('id', 'contig').first()
+            if sequence is None:
+                raise CommandError(f'Contig {contig} not found.')
+            return export.bedgraph(sequence, options['data_source'], start, end)
+
+        if genome is None and options['method'] is None:
+            raise CommandError('repeat_regions needs --genome and/or --method.')
+        features = export.repeat_regions_for(genome=genome, method=options['method'])
+        if options['format'] == 'fasta':
+            return export.repeat_region_fasta(features, max(options['flank'], 0))
+        return export.gff3(features) if options['format'] == 'gff3' else export.bed(features)
@@ -1,6 +1,7 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db.models import Sum, Count, Q
 from viewer.models import Genome, Sequence, Feature, RepeatRegionMethod, CasGene
+from viewer import assembly, jobs, repeat_calls
 import re
 import logging
 
@@ -11,25 +12,45 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Generate statistics for genomes'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat_calls_only',
+            action='store_true',
+            help='Only rebuild the repeat call table used by the method analytics from the existing '
+                 'repeat region method associations',
+        )
+
     def handle(self, *args, **options):
         total_genomes = Genome.objects.count()
+        # When run as a background job, genomes finished before a restart are skipped
+        job = jobs.current()
+        job.start(total=total_genomes)
+
+        if options['repeat_calls_only']:
+            for i, genome in enumerate(Genome.objects.order_by('id'), 1):
+                if job.is_done(genome.name):
+                    continue
+                written = repeat_calls.rebuild(genome)
+                self.stdout.write(f"Indexed {written} repeat calls for genome {i}/{total_genomes}: {genome.name}")
+                job.checkpoint(genome.name)
+            self.stdout.write(self.style.SUCCESS('Successfully rebuilt repeat calls'))
+            return
+
         self.stdout.write(f"Processing {total_genomes} genomes...\n")
 
         # Define regex patterns
         crispr_pattern = re.compile(r'\bCRISPR\b', re.IGNORECASE)
         cas_pattern = re.compile(r'\bcas\d*[a-z]?\b', re.IGNORECASE)
 
-        for i, genome in enumerate(Genome.objects.all(), 1):
+        failed = []
+        for i, genome in enumerate(Genome.objects.order_by('id'), 1):
+            if job.is_done(genome.name):
+                continue
             self.stdout.write(f"Processing genome {i}/{total_genomes}: {genome.name}")
 
             try:
-                # Calculate total length and update sequence lengths
-                total_length = 0
-                for sequence in genome.sequences.all():
-                    sequence.length = len(sequence.sequence)
-                    sequence.save()
-                    total_length += sequence.length
-                genome.total_length = total_length
+                # Total length, contig count, N50 and L50 from the contig lengths set at load time
+                assembly.update_genome(genome)
 
                 # Use database aggregation for feature counts
                 feature_count = Feature.objects.filter(sequence__genome=genome).count()
@@ -43,7 +64,7 @@ class Command(BaseCommand):
                 cas_gene_entries = []
 
                 # Fetch all relevant features once to minimize database queries
-                features = Feature.objects.filter(sequence__genome=genome)
+                features = Feature.objects.filter(sequence__genome=genome).defer('attributes')
 
                 # Clear existing RepeatRegionMethod associations
                 RepeatRegionMethod.objects.filter(genome=genome).delete()
@@ -100,6 +121,7 @@ class Command(BaseCommand):
                 genome.save()
 
                 # Update RepeatRegionMethod with associated repeats
+                complete = True
                 for method, repeat_features in method_repeats.items():
                     try:
                         method_entry, created = RepeatRegionMethod.objects.get_or_create(genome=genome, method=method)
@@ -111,6 +133,11 @@ class Command(BaseCommand):
                     except Exception as e:
                         logger.error(f"Error associating repeats with method '{method}' for genome '{genome.name}': {e}")
                         self.stderr.write(f"Error associating repeats with method '{method}' for genome '{genome.name}': {e}")
+                        complete = False
+
+                # Copy the associations into the repeat call table read by the analytics
+                written = repeat_calls.rebuild(genome)
+                self.stdout.write(f"Indexed {written} repeat calls for genome {genome.name}")
 
                 # Save genome statistics again if needed
                 genome.save()
@@ -120,36 +147,27 @@ class Command(BaseCommand):
             except Exception as e:
                 logger.error(f"Error processing genome '{genome.name}': {e}")
                 self.stderr.write(f"Error processing genome '{genome.name}': {e}")
+                complete = False
 
+            # Genomes that failed are not checkpointed, so a resumed job processes them again
+            if complete:
+                job.checkpoint(genome.name)
+            else:
+                failed.append(genome.name)
+
+        if failed:
+            raise CommandError(f"Statistics failed for {len(failed)} genome(s): {', '.join(failed)}")
         self.stdout.write(self.style.SUCCESS('Successfully generated statistics'))
 
     def construct_description(self, feature):
         """
-        Constructs the description from the feature's attributes.
-        Adjust this method based on how descriptions are built in your application.
+        Constructs the description from the feature's name, gene and product columns.
         """
-        if feature.attributes is None:
-            return ""
-        
-        name = feature.attributes.get('Name', [''])[0] if isinstance(feature.attributes.get('Name'), list) else feature.attributes.get('Name', '')
-        gene = feature.attributes.get('gene', [''])[0] if isinstance(feature.attributes.get('gene'), list) else feature.attributes.get('gene', '')
-        product = feature.attributes.get('product', [''])[0] if isinstance(feature.attributes.get('product'), list) else feature.attributes.get('product', '')
-        return f"{name} {gene} {product}".strip()
+        return f"{feature.name} {feature.gene} {feature.product}".strip()
 
     def extract_cas_gene_name(self, feature):
         """
-        Extracts the Cas gene name from the feature's attributes.
-        Adjust this method based on how Cas gene names are stored in your attributes.
+        Extracts the Cas gene name from the feature's name, gene and product columns.
         """
-        if feature.attributes is None:
-            return 'Unknown Cas gene'
-
         # Priority: Name > gene > product
-        if 'Name' in feature.attributes and feature.attributes['Name']:
-            return feature.attributes['Name'][0] if isinstance(feature.attributes['Name'], list) else feature.attributes['Name']
-        elif 'gene' in feature.attributes and feature.attributes['gene']:
-            return feature.attributes['gene'][0] if isinstance(feature.attributes['gene'], list) else feature.attributes['gene']
-        elif 'product' in feature.attributes and feature.attributes['product']:
-            return feature.attributes['product'][0] if isinstance(feature.attributes['product'], list) else feature.attributes['product']
-        else:
-            return 'Unknown Cas gene'
\ No newline at end of file
+        return feature.name or feature.gene or feature.product or 'Unknown Cas gene'
@@ -0,0 +1,161 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from viewer.models import Genome, Sequence, Feature, NucleotideData, Interaction, FEATURE_ATTRIBUTE_COLUMNS, attribute_columns
+from viewer.bulk import copy_rows
+from viewer.search import index_genome
+from viewer import assembly, interaction_store, synthetic
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic dataset of genomes, contigs, features, tracks and interactions at a named scale.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=str,
+            choices=sorted(synthetic.SCALES),
+            default='S',
+            help='Dataset size: S (10 genomes), M (100), L (1000) or XL (10000). Default: S.'
+        )
+        parser.add_argument(
+            '--genomes',
+            type=int,
+            default=None,
+            help='Override the number of genomes of the chosen scale.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed for the random number generator (default: 0).'
+        )
+        parser.add_argument(
+            '--prefix',
+            type=str,
+            default='SYN',
+            help='Prefix for generated genome and contig names (default: SYN).'
+        )
+        parser.add_argument(
+            '--data_source',
+            type=str,
+            default='dummy',
+            help='Name of the data source for generated tracks.'
+        )
+        parser.add_argument(
+            '--no_tracks',
+            action='store_true',
+            help='Do not generate per-base track values.'
+        )
+        parser.add_argument(
+            '--no_interactions',
+            action='store_true',
+            help='Do not generate interactions.'
+        )
+        parser.add_argument(
+            '--index',
+            action='store_true',
+            help='Build the feature search index for generated genomes.'
+        )
+
+    def handle(self, *args, **options):
+        scale = synthetic.SCALES[options['scale']]
+        n_genomes = options['genomes'] or scale['genomes']
+        seed = options['seed']
+        prefix = options['prefix']
+        data_source = options['data_source']
+
+        existing = set(Genome.objects.filter(name__startswith=prefix).values_list('name', flat=True))
+        self.stdout.write(f"Generating {n_genomes} synthetic genomes at scale {options['scale']} with seed {seed}.")
+
+        totals = {'genomes': 0, 'sequences': 0, 'features': 0, 'track_values': 0, 'interactions': 0}
+        for i in range(n_genomes):
+            name = f"{prefix}_{options['scale']}_{i:05d}"
+            if name in existing:
+                self.stdout.write(f"Genome {name} already exists. Skipping...")
+                continue
+
+            # Each genome gets its own stream so output does not depend on which genomes are skipped
+            rng = np.random.default_rng([seed, i])
+            with transaction.atomic():
+                counts = self.generate_genome(rng, name, scale, data_source, options)
+            if options['index']:
+                index_genome(Genome.objects.get(name=name))
+
+            totals['genomes'] += 1
+            for key, value in counts.items():
+                totals[key] += value
+            self.stdout.write(
+                f"Generated genome {i + 1}/{n_genomes}: {name} "
+                f"({counts['sequences']} contigs, {counts['features']} features, "
+                f"{counts['track_values']} track values, {counts['interactions']} interactions)"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            "Synthetic data generation complete: " + ', '.join(f"{value} {key}" for key, value in totals.items())
+        ))
+
+    def generate_genome(self, rng, name, scale, data_source, options):
+        n_contigs = int(rng.integers(scale['contigs'][0], scale['contigs'][1] + 1))
+        lengths = rng.integers(scale['contig_length'][0], scale['contig_length'][1] + 1, size=n_contigs)
+        with_track = rng.random(n_contigs) < scale['track_fraction']
+
+        genome = Genome.objects.create(name=name)
+        texts = [synthetic.random_sequence(rng, int(length)) for length in lengths]
+        sequences = Sequence.objects.bulk_create([
+            Sequence(genome=genome, contig=f"{name}_{index + 1}", sequence=text, **assembly.contig_fields(text))
+            for index, text in enumerate(texts)
+        ])
+
+        counts = {'sequences': len(sequences), 'features': 0, 'track_values': 0, 'interactions': 0}
+        repeat_region_count = 0
+        cas_gene_count = 0
+        for sequence, has_track in zip(sequences, with_track):
+            features = synthetic.random_features(rng, sequence.length)
+            counts['features'] += copy_rows(
+                Feature,
+                ['sequence', 'source', 'type', 'start', 'end', 'strand', 'attributes', *FEATURE_ATTRIBUTE_COLUMNS],
+                (
+                    (sequence.id, *row, *attribute_columns(row[-1]).values())
+                    for row in zip(
+                        features['source'].tolist(),
+                        features['type'].tolist(),
+                        features['start'].tolist(),
+                        features['end'].tolist(),
+                        features['strand'].tolist(),
+                        features['attributes'],
+                    )
+                ),
+            )
+            repeat_region_count += int((features['type'] == 'repeat_region').sum())
+            cas_gene_count += sum(1 for attributes in features['attributes'] if attributes.get('gene', '').startswith(('cas', 'csn')))
+
+            if has_track and not options['no_tracks']:
+                values = synthetic.track_values(rng, sequence.length)
+                counts['track_values'] += copy_rows(
+                    NucleotideData,
+                    ['sequence', 'position', 'data_source', 'value'],
+                    zip([sequence.id] * len(values), range(1, len(values) + 1), [data_source] * len(values), values.tolist()),
+                )
+
+            if not options['no_interactions']:
+                from_positions, to_positions, weights = synthetic.dummy_interactions(rng, sequence.length)
+                counts['interactions'] += copy_rows(
+                    Interaction,
+                    ['from_sequence', 'to_sequence', 'from_position', 'to_position', 'weight'],
+                    zip(
+                        [sequence.id] * len(weights), [sequence.id] * len(weights),
+                        from_positions.tolist(), to_positions.tolist(), weights.tolist(),
+                    ),
+                )
+
+        if not options['no_interactions']:
+            # Contig ids can be reused after deletions; drop any stored pairs so the viewer reads the table
+            interaction_store.delete_pairs([sequence.id for sequence in sequences])
+
+        assembly.update_genome(genome)
+        genome.feature_count = counts['features']
+        genome.repeat_region_count = repeat_region_count
+        genome.has_crispr_repeat = repeat_region_count > 0
+        genome.cas_gene_count = cas_gene_count
+        genome.save()
+        return counts
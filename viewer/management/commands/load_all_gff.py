@@ -1,7 +1,8 @@
 import os
 import random
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.core.management import call_command
+from viewer import jobs
 
 class Command(BaseCommand):
     help = 'Loads a subset of .gff files from ../datasets/merged_gff3/ using the load_data command'
@@ -13,6 +14,11 @@ class Command(BaseCommand):
             default=None,
             help='Limit the number of GFF files to process (randomly selected)'
         )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Reload every file, even those unchanged since they were last loaded'
+        )
 
     def handle(self, *args, **options):
         # Set the directory path
@@ -29,15 +35,29 @@ class Command(BaseCommand):
         else:
             self.stdout.write(self.style.SUCCESS(f"Processing all {len(gff_files)} files."))
 
+        # load_data checkpoints each file when run as a background job
+        job = jobs.current()
+        job.start(total=len(gff_files))
+
         # Process the selected files
+        failed = []
         for filename in gff_files:
             file_path = os.path.join(gff_directory, filename)
+            if job.is_done(file_path):
+                continue
             
             self.stdout.write(self.style.SUCCESS(f"Processing: {filename}"))
             
-            # Call the load_data command
-            call_command('load_data', file_path, force=True)
+            # Call the load_data command, which skips the file if it is unchanged
+            try:
+                call_command('load_data', file_path, force=options['force'])
+            except CommandError as e:
+                self.stderr.write(self.style.ERROR(str(e)))
+                failed.append(filename)
+                continue
             
             self.stdout.write(self.style.SUCCESS(f"Finished processing: {filename}\n"))
 
+        if failed:
+            raise CommandError(f"Loading failed for {len(failed)} file(s): {', '.join(failed)}")
         self.stdout.write(self.style.SUCCESS("All selected .gff files have been processed."))
\ No newline at end of file
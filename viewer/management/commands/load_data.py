@@ -1,6 +1,10 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from viewer.models import Genome, Sequence, Feature
+from viewer.search import index_genome
+from viewer import assembly, data_version, deletion, ingest, jobs, metrics
 import os
+import time
 import json
 from django.conf import settings
 import gffutils
@@ -9,13 +13,15 @@ import tempfile
 from pathlib import Path
 
 class Command(BaseCommand):
-    help = 'Load sequences and features into the database from GFF files in a directory'
+    help = ('Load sequences and features into the database from GFF files in a directory (or a single GFF file). '
+            'Files unchanged since they were last loaded are skipped; changed ones are diffed against the '
+            'database and only the differences are written.')
 
     def add_arguments(self, parser):
         parser.add_argument(
             'gff_directory',
             type=str,
-            help='Path to the directory containing GFF files',
+            help='Path to the directory containing GFF files, or to a single GFF file',
         )
         parser.add_argument(
             '--strain_name',
@@ -26,7 +32,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Force update by removing existing entries before loading new ones',
+            help='Force update by removing existing entries before loading new ones, even if the file is unchanged',
         )
         parser.add_argument(
             '--test',
@@ -34,171 +40,113 @@ class Command(BaseCommand):
             default=None,
             help='Limit the number of genomes to process (for testing)',
         )
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            help='Report what would change without writing to the database',
+        )
+        parser.add_argument(
+            '--baseline',
+            action='store_true',
+            help='Record files of genomes that are already loaded in the manifest without loading them again',
+        )
+        parser.add_argument(
+            '--report',
+            type=str,
+            default=None,
+            help='Write the status and feature diff of every file as JSON to this path',
+        )
 
     def handle(self, *args, **options):
         gff_directory = options['gff_directory']
         strain_name = options['strain_name'].strip()
         force_update = options['force']
         test_limit = options['test']
+        dry_run = options['dry_run']
 
-        if not os.path.isdir(gff_directory):
+        if os.path.isfile(gff_directory) and gff_directory.endswith('.gff'):
+            gff_directory, gff_files = os.path.dirname(gff_directory), [os.path.basename(gff_directory)]
+        elif os.path.isdir(gff_directory):
+            gff_files = sorted(f for f in os.listdir(gff_directory) if f.endswith('.gff'))
+        else:
             self.stderr.write(self.style.ERROR(f"Directory not found: {gff_directory}"))
             return
 
-        gff_files = [f for f in os.listdir(gff_directory) if f.endswith('.gff')]
         if test_limit:
             gff_files = gff_files[:test_limit]
 
         total_genomes_processed = 0
         total_sequences_loaded = 0
         total_features_loaded = 0
+        statuses = {ingest.NEW: 0, ingest.CHANGED: 0, ingest.UNCHANGED: 0}
+        report = []
+        failed = []
+        # When run as a background job, files finished before a restart are skipped
+        job = jobs.current()
+        job.start(total=len(gff_files))
 
         for gff_file in gff_files:
             gff_path = os.path.join(gff_directory, gff_file)
-            genome_name = Path(gff_file).stem
-
-            # Check if genome already exists
-            if Genome.objects.filter(name=genome_name).exists() and not force_update:
-                self.stdout.write(f"Genome {genome_name} already exists. Skipping...")
+            if job.is_done(gff_path):
                 continue
+            genome_name = Path(gff_file).stem
+            source = ingest.SourceFile(gff_path, 'gff')
+            genome_obj = Genome.objects.filter(name=genome_name).first()
 
-            self.stdout.write(self.style.NOTICE(f"Processing {gff_file}..."))
-
-            sequences_data = []
-            features_data = []
-
-            # Create or get the Genome object
-            genome_obj, genome_created = Genome.objects.get_or_create(
-                name=genome_name,
-                defaults={'strain_name': None if strain_name == 'NA' else strain_name}
-            )
-
-            if not genome_created and force_update:
-                self.stdout.write(f"Forcing update for Genome: {genome_obj.name}")
-                Sequence.objects.filter(genome=genome_obj).delete()
-                Feature.objects.filter(sequence__genome=genome_obj).delete()
+            if not force_update:
+                status = source.status
+                statuses[status] += 1
+                if status == ingest.UNCHANGED:
+                    if source.touched and not dry_run:
+                        source.record()
+                    self.stdout.write(f"{gff_file} is unchanged. Skipping...")
+                    report.append({'file': gff_file, 'status': status})
+                    job.checkpoint(gff_path)
+                    continue
+                if status == ingest.NEW and genome_obj is not None and options['baseline']:
+                    if not dry_run:
+                        source.record(genome_obj)
+                    self.stdout.write(f"Recorded {gff_file} for loaded genome {genome_name}.")
+                    report.append({'file': gff_file, 'status': 'baseline'})
+                    job.checkpoint(gff_path)
+                    continue
+            else:
+                status = ingest.CHANGED if source.entry else ingest.NEW
 
-            sequences_loaded = 0
-            features_loaded = 0
+            self.stdout.write(self.style.NOTICE(f"Processing {gff_file} ({status})..."))
+            started = time.perf_counter()
 
             try:
-                # Split GFF into annotations and FASTA sections
-                gff_lines = []
-                fasta_lines = []
-                in_fasta = False
-
-                with open(gff_path, 'r') as f:
-                    for line in f:
-                        if line.startswith('##FASTA'):
-                            in_fasta = True
-                            self.stdout.write("Found ##FASTA section. Parsing sequences from FASTA.")
-                            continue
-                        if in_fasta:
-                            fasta_lines.append(line)
-                        else:
-                            gff_lines.append(line)
-
-                # Create a temporary GFF file without the FASTA section for gffutils
-                with tempfile.NamedTemporaryFile(mode='w+', delete=False) as temp_gff:
-                    temp_gff.writelines(gff_lines)
-                    temp_gff_path = temp_gff.name
-
-                # Create a gffutils database
-                db = gffutils.create_db(temp_gff_path, dbfn=':memory:', force=True, keep_order=True, merge_strategy='merge', sort_attribute_values=True)
-
-                # Process FASTA sequences if available
-                if fasta_lines:
-                    fasta_content = ''.join(fasta_lines)
-                    fasta_handle = tempfile.NamedTemporaryFile(mode='w+', delete=False)
-                    fasta_handle.write(fasta_content)
-                    fasta_handle.close()
-
-                    for record in SeqIO.parse(fasta_handle.name, 'fasta'):
-                        contig_name = record.id
-                        sequence_str = str(record.seq)
-                        sequence_obj, created = Sequence.objects.get_or_create(
-                            genome=genome_obj,
-                            contig=contig_name,
-                            defaults={'sequence': sequence_str}
-                        )
-                        if created:
-                            self.stdout.write(self.style.SUCCESS(f"Created Sequence: {contig_name}"))
-                            sequences_loaded += 1
-                        else:
-                            self.stdout.write(f"Sequence already exists: {contig_name}")
-
-                    # Remove temporary FASTA file
-                    os.unlink(fasta_handle.name)
-
-                # Remove temporary GFF file
-                os.unlink(temp_gff_path)
-
-                # Process features
-                self.stdout.write("Processing all feature types...")
-                for feature in db.all_features():
-                    contig = feature.seqid
-                    try:
-                        sequence_obj = Sequence.objects.get(genome=genome_obj, contig=contig)
-                    except Sequence.DoesNotExist:
-                        self.stderr.write(
-                            self.style.ERROR(f"Sequence '{contig}' not found for feature '{feature.id}'. Skipping feature.")
-                        )
-                        continue
+                sequences, features = self.parse_gff(gff_path)
 
-                    # Sanitize 'score' field
-                    score = feature.attributes.get('score', [None])[0]
-                    if score == 'NA' or score is None:
-                        score = None
+                if genome_obj is None or force_update:
+                    if dry_run:
+                        summary = {'added': len(features), 'removed': 0, 'changed': 0, 'unchanged': 0}
+                        sequences_loaded = len(sequences)
                     else:
-                        try:
-                            score = float(score)
-                        except ValueError:
-                            score = None
-
-                    # Determine strand
-                    strand = None
-                    if feature.strand == 1:
-                        strand = '+'
-                    elif feature.strand == -1:
-                        strand = '-'
-
-                    feature_data = {
-                        'sequence': sequence_obj,
-                        'source': feature.source,
-                        'type': feature.featuretype,
-                        'start': feature.start,
-                        'end': feature.end,
-                        'score': score,
-                        'strand': strand,
-                        'phase': feature.frame,
-                        'attributes': {k: v[0] for k, v in feature.attributes.items()} if feature.attributes else {}
-                    }
-
-                    if force_update:
-                        Feature.objects.update_or_create(
-                            sequence=sequence_obj,
-                            start=feature.start,
-                            end=feature.end,
-                            type=feature.featuretype,
-                            defaults=feature_data
+                        genome_obj, sequences_loaded, summary = self.load_genome(
+                            genome_name, strain_name, sequences, features
                         )
-                        features_loaded += 1
-                    else:
-                        _, created = Feature.objects.get_or_create(
-                            sequence=sequence_obj,
-                            start=feature.start,
-                            end=feature.end,
-                            type=feature.featuretype,
-                            defaults=feature_data
-                        )
-                        if created:
-                            features_loaded += 1
-                        else:
-                            self.stdout.write(f"Feature already exists: {feature.id}. Skipping...")
+                else:
+                    sequences_loaded, summary = self.sync_genome(genome_obj, sequences, features, dry_run)
+
+                features_loaded = summary['added'] + summary['changed']
+                metrics.record_ingest(Feature._meta.db_table, features_loaded, time.perf_counter() - started)
+
+                if not dry_run:
+                    if features_loaded or summary['removed']:
+                        # Extract searchable text into the feature search index
+                        indexed = index_genome(genome_obj)
+                        self.stdout.write(f"Indexed {indexed} features for search.")
+                    source.record(genome_obj)
 
                 self.stdout.write(self.style.SUCCESS(f"Data loading complete for {gff_file}."))
                 self.stdout.write(f"Sequences processed: {sequences_loaded}")
-                self.stdout.write(f"Features processed: {features_loaded}")
+                self.stdout.write(
+                    f"Features added: {summary['added']}, removed: {summary['removed']}, "
+                    f"changed: {summary['changed']}, unchanged: {summary['unchanged']}"
+                )
+                report.append({'file': gff_file, 'status': status, 'sequences': sequences_loaded, **summary})
 
                 total_sequences_loaded += sequences_loaded
                 total_features_loaded += features_loaded
@@ -206,8 +154,192 @@ class Command(BaseCommand):
 
             except Exception as e:
                 self.stderr.write(self.style.ERROR(f"An error occurred during data loading for {gff_file}: {str(e)}"))
+                report.append({'file': gff_file, 'status': 'error', 'error': str(e)})
+                # Not checkpointed, so a resumed job tries the file again
+                failed.append(gff_file)
+                continue
+
+            job.checkpoint(gff_path)
+
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2)
 
         self.stdout.write(self.style.SUCCESS("All GFF files processed."))
+        self.stdout.write(
+            f"Files new: {statuses[ingest.NEW]}, changed: {statuses[ingest.CHANGED]}, "
+            f"unchanged: {statuses[ingest.UNCHANGED]}"
+        )
         self.stdout.write(f"Total genomes processed: {total_genomes_processed}")
         self.stdout.write(f"Total sequences loaded: {total_sequences_loaded}")
-        self.stdout.write(f"Total features loaded: {total_features_loaded}")
\ No newline at end of file
+        self.stdout.write(f"Total features loaded: {total_features_loaded}")
+        if failed:
+            raise CommandError(f"Loading failed for {len(failed)} file(s): {', '.join(failed)}")
+
+    def parse_gff(self, gff_path):
+        """
+        Returns ({contig: sequence} from the ##FASTA section, [(contig, feature dict)]).
+        """
+        # Split GFF into annotations and FASTA sections
+        gff_lines = []
+        fasta_lines = []
+        in_fasta = False
+
+        with open(gff_path, 'r') as f:
+            for line in f:
+                if line.startswith('##FASTA'):
+                    in_fasta = True
+                    self.stdout.write("Found ##FASTA section. Parsing sequences from FASTA.")
+                    continue
+                if in_fasta:
+                    fasta_lines.append(line)
+                else:
+                    gff_lines.append(line)
+
+        # Create a temporary GFF file without the FASTA section for gffutils
+        with tempfile.NamedTemporaryFile(mode='w+', delete=False) as temp_gff:
+            temp_gff.writelines(gff_lines)
+            temp_gff_path = temp_gff.name
+
+        try:
+            # Create a gffutils database
+            db = gffutils.create_db(temp_gff_path, dbfn=':memory:', force=True, keep_order=True, merge_strategy='merge', sort_attribute_values=True)
+        finally:
+            # Remove temporary GFF file
+            os.unlink(temp_gff_path)
+
+        # Process FASTA sequences if available
+        sequences = {}
+        if fasta_lines:
+            fasta_handle = tempfile.NamedTemporaryFile(mode='w+', delete=False)
+            fasta_handle.write(''.join(fasta_lines))
+            fasta_handle.close()
+
+            for record in SeqIO.parse(fasta_handle.name, 'fasta'):
+                sequences.setdefault(record.id, str(record.seq))
+
+            # Remove temporary FASTA file
+            os.unlink(fasta_handle.name)
+
+        features = []
+        for feature in db.all_features():
+            # Sanitize 'score' field
+            score = feature.attributes.get('score', [None])[0]
+            if score == 'NA' or score is None:
+                score = None
+            else:
+                try:
+                    score = float(score)
+                except ValueError:
+                    score = None
+
+            # Determine strand
+            strand = None
+            if feature.strand == 1:
+                strand = '+'
+            elif feature.strand == -1:
+                strand = '-'
+
+            features.append((feature.seqid, {
+                'source': feature.source,
+                'type': feature.featuretype,
+                'start': feature.start,
+                'end': feature.end,
+                'score': score,
+                'strand': strand,
+                'phase': feature.frame,
+                'attributes': {k: v[0] for k, v in feature.attributes.items()} if feature.attributes else {}
+            }))
+        return sequences, features
+
+    def known_features(self, features, sequence_ids):
+        """
+        Drops features on contigs that have no sequence.
+        """
+        known = []
+        for contig, feature in features:
+            if contig not in sequence_ids:
+                self.stderr.write(
+                    self.style.ERROR(f"Sequence '{contig}' not found for feature at {feature['start']}-{feature['end']}. Skipping feature.")
+                )
+                continue
+            known.append((contig, feature))
+        return known
+
+    def load_genome(self, genome_name, strain_name, sequences, features):
+        """
+        Loads a genome from scratch, replacing its sequences and features if it exists.
+        Returns (genome, sequences loaded, feature summary).
+        """
+        with transaction.atomic():
+            genome_obj, genome_created = Genome.objects.get_or_create(
+                name=genome_name,
+                defaults={'strain_name': None if strain_name == 'NA' else strain_name}
+            )
+            if not genome_created:
+                self.stdout.write(f"Forcing update for Genome: {genome_obj.name}")
+                deletion.delete_sequences(
+                    Sequence.objects.filter(genome=genome_obj).order_by('id').values_list('id', flat=True)
+                )
+
+            Sequence.objects.bulk_create(
+                [
+                    Sequence(genome=genome_obj, contig=contig, sequence=sequence, **assembly.contig_fields(sequence))
+                    for contig, sequence in sequences.items()
+                ]
+            )
+            sequence_ids = dict(Sequence.objects.filter(genome=genome_obj).values_list('contig', 'id'))
+
+            diff = ingest.diff_features([], self.known_features(features, sequence_ids))
+            ingest.apply_diff(diff, sequence_ids)
+            assembly.update_genome(genome_obj)
+            ingest.update_feature_counts(genome_obj)
+        return genome_obj, len(sequences), diff.summary()
+
+    def sync_genome(self, genome_obj, sequences, features, dry_run):
+        """
+        Brings a loaded genome in line with a changed file, writing only what differs.
+        Returns (sequences created, updated or removed, feature summary).
+        """
+        stored_sequences = dict(Sequence.objects.filter(genome=genome_obj).values_list('contig', 'id'))
+        sequence_ids = dict(stored_sequences)
+        sequences_loaded = 0
+
+        with transaction.atomic():
+            for contig, sequence in sequences.items():
+                if contig not in stored_sequences:
+                    if not dry_run:
+                        sequence_ids[contig] = Sequence.objects.create(
+                            genome=genome_obj, contig=contig, sequence=sequence, **assembly.contig_fields(sequence)
+                        ).id
+                    else:
+                        sequence_ids[contig] = None
+                    self.stdout.write(self.style.SUCCESS(f"Created Sequence: {contig}"))
+                    sequences_loaded += 1
+                elif not Sequence.objects.filter(id=stored_sequences[contig], sequence=sequence).exists():
+                    if not dry_run:
+                        Sequence.objects.filter(id=stored_sequences[contig]).update(
+                            sequence=sequence, **assembly.contig_fields(sequence)
+                        )
+                    self.stdout.write(f"Updated Sequence: {contig}")
+                    sequences_loaded += 1
+
+            # Contigs the file no longer has a sequence or feature on
+            in_file = set(sequences) | {contig for contig, _ in features}
+            removed = [sequence_id for contig, sequence_id in stored_sequences.items() if contig not in in_file]
+            for contig in sorted(set(stored_sequences) - in_file):
+                self.stdout.write(f"Removed Sequence: {contig}")
+
+            diff = ingest.diff_features(
+                ingest.stored_features(genome_obj), self.known_features(features, sequence_ids)
+            )
+            if not dry_run:
+                ingest.apply_diff(diff, sequence_ids)
+                if removed:
+                    deletion.delete_sequences(removed)
+                if sequences_loaded or removed:
+                    assembly.update_genome(genome_obj)
+                    data_version.bump()
+                if diff or removed:
+                    ingest.update_feature_counts(genome_obj)
+        return sequences_loaded + len(removed), diff.summary()
@@ -1,6 +1,9 @@
 from django.core.management.base import BaseCommand, CommandError
 from viewer.models import Sequence, Interaction
-import random
+from viewer.bulk import copy_rows
+from viewer import interaction_store
+from viewer.synthetic import dummy_interactions
+import numpy as np
 
 class Command(BaseCommand):
     help = 'Generate refined dummy interactions between nucleotides for sequences.'
@@ -62,13 +65,13 @@ class Command(BaseCommand):
         interaction_range = options.get('range')
         intensity_distribution = options.get('intensity_distribution')
 
+        rng = np.random.default_rng(seed)
         if seed is not None:
-            random.seed(seed)
             self.stdout.write(self.style.WARNING(f'Random seed set to {seed}'))
 
         sequences = []
         if options['all']:
-            sequences = Sequence.objects.all()
+            sequences = Sequence.objects.defer('sequence')
             if not sequences.exists():
                 raise CommandError('No sequences found in the database.')
             self.stdout.write(f'Generating dummy interactions for all {sequences.count()} sequences.')
@@ -77,71 +80,36 @@ class Command(BaseCommand):
             if not contig:
                 raise CommandError('Please provide a contig name or use --all to generate data for all sequences.')
             try:
-                sequence = Sequence.objects.get(contig=contig)
+                sequence = Sequence.objects.defer('sequence').get(contig=contig)
                 sequences = [sequence]
             except Sequence.DoesNotExist:
                 raise CommandError(f'Sequence with contig "{contig}" does not exist.')
 
         for sequence in sequences:
-            sequence_length = len(sequence.sequence)
+            sequence_length = sequence.length
             self.stdout.write(f'\nGenerating dummy interactions for sequence "{sequence.contig}" with length {sequence_length}.')
 
-            interactions_bulk = []
-
-            # Initialize the first site
-            current_site = random.randint(1, max_step)
-
-            while current_site <= sequence_length:
-                # Define the range for potential interaction partners
-                min_pos = max(1, current_site - interaction_range)
-                max_pos = min(sequence_length, current_site + interaction_range)
-
-                # Exclude the current site to prevent self-interaction
-                potential_partners = list(range(min_pos, current_site)) + list(range(current_site + 1, max_pos + 1))
-
-                if not potential_partners:
-                    # No potential partners available; skip interaction generation for this site
-                    self.stdout.write(self.style.WARNING(f'  - No potential partners for site {current_site}. Skipping.'))
-                else:
-                    # Select 'num_interactions_per_site' unique partners randomly
-                    selected_partners = random.sample(
-                        potential_partners,
-                        min(num_interactions_per_site, len(potential_partners))
-                    )
-
-                    for partner in selected_partners:
-                        # Define weight based on intensity distribution
-                        if intensity_distribution == 'uniform':
-                            weight = round(random.uniform(0.1, 1.0), 4)
-                        elif intensity_distribution == 'weighted':
-                            # Example: 80% interactions with lower weights, 20% with higher weights
-                            weight = round(random.choices(
-                                population=[round(random.uniform(0.1, 0.5), 4), round(random.uniform(0.6, 1.0), 4)],
-                                weights=[80, 20],
-                                k=1
-                            )[0], 4)
-
-                        interaction = Interaction(
-                            from_sequence=sequence,
-                            to_sequence=sequence,
-                            from_position=current_site,
-                            to_position=partner,
-                            weight=weight
-                        )
-                        interactions_bulk.append(interaction)
-
-                        # To ensure no too much memory usage, bulk create in batches
-                        if len(interactions_bulk) >= 10000:
-                            Interaction.objects.bulk_create(interactions_bulk)
-                            self.stdout.write(f'  - Generated interactions up to position {current_site}.')
-                            interactions_bulk = []
-
-                # Determine the next site using a random step between min_step and max_step
-                step = random.randint(min_step, max_step)
-                current_site += step
-
-            if interactions_bulk:
-                Interaction.objects.bulk_create(interactions_bulk)
-                self.stdout.write(f'  - Generated all interactions for "{sequence.contig}".')
+            from_positions, to_positions, weights = dummy_interactions(
+                rng,
+                sequence_length,
+                min_step=min_step,
+                max_step=max_step,
+                per_site=num_interactions_per_site,
+                interaction_range=interaction_range,
+                distribution=intensity_distribution,
+            )
+
+            generated = copy_rows(
+                Interaction,
+                ['from_sequence', 'to_sequence', 'from_position', 'to_position', 'weight'],
+                zip(
+                    [sequence.id] * len(weights), [sequence.id] * len(weights),
+                    from_positions.tolist(), to_positions.tolist(), weights.tolist(),
+                ),
+            )
+            self.stdout.write(f'  - Generated {generated} interactions for "{sequence.contig}".')
+            # The on-disk store no longer has every interaction of the contig; the viewer reads the table
+            # until build_interaction_store is run again
+            interaction_store.delete_pairs([sequence.id])
 
             self.stdout.write(self.style.SUCCESS(f'Dummy interactions generation completed for "{sequence.contig}".'))
\ No newline at end of file
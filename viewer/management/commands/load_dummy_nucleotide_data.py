@@ -1,6 +1,8 @@
-import random
+import numpy as np
 from django.core.management.base import BaseCommand, CommandError
 from viewer.models import Sequence, NucleotideData
+from viewer.bulk import copy_rows
+from viewer.synthetic import track_values
 
 class Command(BaseCommand):
     help = 'Load dummy nucleotide data for a specified contig or for all contigs.'
@@ -33,13 +35,13 @@ class Command(BaseCommand):
         seed = options.get('seed')
         data_source = options.get('data_source')
 
+        rng = np.random.default_rng(seed)
         if seed is not None:
-            random.seed(seed)
             self.stdout.write(self.style.WARNING(f'Random seed set to {seed}'))
 
         sequences = []
         if options['all']:
-            sequences = Sequence.objects.all()
+            sequences = Sequence.objects.defer('sequence')
             if not sequences.exists():
                 raise CommandError('No sequences found in the database.')
             self.stdout.write(f'Loading dummy data for all {sequences.count()} sequences.')
@@ -48,44 +50,33 @@ class Command(BaseCommand):
             if not contig:
                 raise CommandError('Please provide a contig name or use --all to load data for all sequences.')
             try:
-                sequence = Sequence.objects.get(contig=contig)
+                sequence = Sequence.objects.defer('sequence').get(contig=contig)
                 sequences = [sequence]
             except Sequence.DoesNotExist:
                 raise CommandError(f'Sequence with contig "{contig}" does not exist.')
 
         for sequence in sequences:
-            sequence_length = len(sequence.sequence)
+            sequence_length = sequence.length
             self.stdout.write(f'\nLoading dummy data for sequence "{sequence.contig}" with length {sequence_length}.')
 
             # Fetch existing nucleotide data **for the specific data source** to avoid duplicates
-            existing_positions = set(
-                NucleotideData.objects.filter(sequence=sequence, data_source=data_source).values_list('position', flat=True)
+            existing_positions = np.fromiter(
+                NucleotideData.objects.filter(sequence=sequence, data_source=data_source).values_list('position', flat=True),
+                dtype=np.int64
             )
             self.stdout.write(f'Found {len(existing_positions)} existing nucleotide data entries for data_source "{data_source}".')
 
             # Create dummy data for positions without existing data
-            nucleotide_data_bulk = []
-            for pos in range(1, sequence_length + 1):
-                if pos in existing_positions:
-                    continue  # Skip positions that already have data for this data_source
+            positions = np.arange(1, sequence_length + 1)
+            if len(existing_positions):
+                positions = positions[~np.isin(positions, existing_positions)]
+            values = track_values(rng, len(positions))
 
-                value = round(random.uniform(-1, 1), 4)  # Random float between -1 and 1
-                nucleotide_data_bulk.append(NucleotideData(
-                    sequence=sequence,
-                    position=pos,
-                    data_source=data_source,
-                    value=value
-                ))
-
-                # Bulk create in batches to optimize performance
-                if len(nucleotide_data_bulk) >= 10000:
-                    NucleotideData.objects.bulk_create(nucleotide_data_bulk)
-                    nucleotide_data_bulk = []
-                    self.stdout.write(f'  - Loaded data up to position {pos} for data_source "{data_source}".')
-
-            # Create any remaining data
-            if nucleotide_data_bulk:
-                NucleotideData.objects.bulk_create(nucleotide_data_bulk)
-                self.stdout.write(f'  - Loaded data up to position {sequence_length} for data_source "{data_source}".')
+            loaded = copy_rows(
+                NucleotideData,
+                ['sequence', 'position', 'data_source', 'value'],
+                zip([sequence.id] * len(positions), positions.tolist(), [data_source] * len(positions), values.tolist()),
+            )
+            self.stdout.write(f'  - Loaded {loaded} values up to position {sequence_length} for data_source "{data_source}".')
 
             self.stdout.write(self.style.SUCCESS(f'Dummy nucleotide data loading completed for "{sequence.contig}" with data_source "{data_source}".'))
\ No newline at end of file
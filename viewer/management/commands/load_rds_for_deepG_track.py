@@ -1,10 +1,10 @@
 import os
-import re
-import pyreadr
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
 from django.core.management.base import BaseCommand, CommandError
-from viewer.models import Genome, Sequence, Feature, NucleotideData
+from viewer.models import Genome, Sequence
+from viewer.search import index_features
+from viewer import deepg, ingest, jobs
 
 class Command(BaseCommand):
     help = 'Load nucleotide data from .rds files into the database for deepG track and detect CRISPR regions.'
@@ -27,258 +27,189 @@ class Command(BaseCommand):
             action='store_true',
             help='Perform a dry run without modifying the database.'
         )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Process every file, even those unchanged since they were last loaded.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of processes decoding files and calling regions (default: number of CPUs).'
+        )
 
     def handle(self, *args, **options):
         folder = options['folder']
-        data_source = options['data_source']
         dry_run = options['dry_run']
+        workers = max(1, options['workers'])
 
         if not os.path.isdir(folder):
             raise CommandError(f'The folder "{folder}" does not exist or is not a directory.')
 
         # Get list of .rds files in the folder
-        rds_files = [f for f in os.listdir(folder) if f.endswith('.rds')]
+        rds_files = sorted(f for f in os.listdir(folder) if f.endswith('.rds'))
         if not rds_files:
             raise CommandError(f'No .rds files found in the folder "{folder}".')
 
         self.stdout.write(f'Found {len(rds_files)} .rds files in the folder.')
 
-        for filename in tqdm(rds_files, desc='Processing files'):
-            file_path = os.path.join(folder, filename)
+        tasks = self.resolve_files(folder, rds_files, options['force'], dry_run)
+        self.stdout.write(f'Decoding {len(tasks)} files in {workers} process(es).')
+
+        # As a background job, files loaded before a restart are skipped as unchanged
+        job = jobs.current()
+        job.start(total=len(tasks))
 
+        # Workers decode files and call regions; this process writes the results as they arrive
+        if workers == 1 or len(tasks) < 2:
+            results = ((task, self.call_regions(task)) for task in tasks)
+            for task, result in tqdm(job.each(results), total=len(tasks), desc='Processing files'):
+                self.write_regions(task, result, dry_run)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(deepg.call_regions, task[1]): task for task in tasks}
+            try:
+                for future in tqdm(job.each(as_completed(futures)), total=len(tasks), desc='Processing files'):
+                    task = futures[future]
+                    self.write_regions(task, self.call_regions(task, future), dry_run)
+            except jobs.JobCancelled:
+                executor.shutdown(cancel_futures=True)
+                raise
+
+    def resolve_files(self, folder, rds_files, force, dry_run):
+        """
+        Matches files to their sequences, skipping unchanged ones unless forced.
+        Unchanged files with a new mtime get their manifest entry refreshed
+        unless this is a dry run.
+        Returns [(filename, path, source file, genome, sequence)].
+        """
+        names = {}
+        for filename in rds_files:
             # Extract genome name and contig index from the filename
-            # Example filename: 'GCA_012932375.1_ASM1293237v1_genomic_1.rds'
-            match = re.match(r'^(.*?_genomic)_(\d+)\.rds$', filename)
-            if not match:
+            parsed = deepg.parse_filename(filename)
+            if parsed is None:
                 self.stdout.write(self.style.WARNING(
                     f'Skipping file "{filename}" - filename does not match expected pattern.'
                 ))
                 continue
+            names[filename] = parsed
 
-            genome_name = match.group(1)
-            contig_index = int(match.group(2))
+        sources = ingest.SourceFile.many([os.path.join(folder, filename) for filename in names], 'rds')
 
-            try:
-                # Fetch the Genome object based on genome_name
-                genome = Genome.objects.get(name=genome_name)
-            except Genome.DoesNotExist:
+        # Contigs of every genome named by a file, keyed by the index their names end with, in one query
+        genomes = {}
+        contigs = {}
+        rows = Genome.objects.filter(
+            name__in={genome_name for genome_name, _ in names.values()}
+        ).order_by('id', 'sequences__id').values_list(
+            'id', 'name', 'sequences__id', 'sequences__contig', 'sequences__length'
+        )
+        for genome_id, genome_name, sequence_id, contig, length in rows:
+            genomes.setdefault(genome_name, Genome(id=genome_id, name=genome_name))
+            if sequence_id is not None and deepg.contig_index(contig) is not None:
+                sequence = Sequence(id=sequence_id, contig=contig, genome_id=genome_id, length=length)
+                contigs.setdefault((genome_name, deepg.contig_index(contig)), []).append(sequence)
+
+        tasks = []
+        for (filename, (genome_name, contig_index)), source in zip(names.items(), sources):
+            if not force and source.status == ingest.UNCHANGED:
+                if source.touched and not dry_run:
+                    source.record()
+                self.stdout.write(f'Skipping file "{filename}" - unchanged since it was last loaded.')
+                continue
+
+            genome = genomes.get(genome_name)
+            if genome is None:
                 self.stdout.write(self.style.WARNING(
                     f'No Genome found with name "{genome_name}" for file "{filename}". Skipping.'
                 ))
                 continue
 
-            # Find sequences where genome matches and contig ends with '_[contig_index]'
-            sequences = Sequence.objects.filter(
-                genome=genome,
-                contig__endswith=f'_{contig_index}'
-            )
-            if not sequences.exists():
+            sequences = contigs.get((genome_name, contig_index), [])
+            if not sequences:
                 self.stdout.write(self.style.WARNING(
                     f'No sequences found for genome "{genome_name}" and contig index {contig_index} in file "{filename}".'
                 ))
                 continue
 
-            if sequences.count() > 1:
+            if len(sequences) > 1:
                 self.stdout.write(self.style.WARNING(
                     f'Multiple sequences found for genome "{genome_name}" and contig index {contig_index} in file "{filename}". Using the first one.'
                 ))
 
-            sequence = sequences.first()
-            sequence_length = len(sequence.sequence)
-            self.stdout.write(
-                f'Processing sequence "{sequence.contig}" from file "{filename}" with length {sequence_length}.'
-            )
-
-            try:
-                # Read the .rds file using pyreadr
-                result = pyreadr.read_r(file_path)
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f'Failed to read .rds file "{filename}": {e}'
-                ))
-                continue
-
-            # Assuming the DataFrame is the first object in the R workspace
-            if len(result) == 0:
-                self.stdout.write(self.style.ERROR(
-                    f'No DataFrame found in file "{filename}". Skipping.'
-                ))
-                continue
-
-            df = next(iter(result.values()))
-            if not {'position', 'pred'}.issubset(df.columns):
-                self.stdout.write(self.style.ERROR(
-                    f'Required columns "position" and "pred" not found in file "{filename}". Skipping.'
-                ))
-                continue
-
-            # Ensure position and pred columns are numeric
-            df['position'] = pd.to_numeric(df['position'], errors='coerce')
-            df['pred'] = pd.to_numeric(df['pred'], errors='coerce')
-            df.dropna(subset=['position', 'pred'], inplace=True)
-
-            # Convert positions to integers
-            df['position'] = df['position'].astype(int)
-
-            # Create states_df similar to R code
-            states_df = df[['position', 'pred']].copy()
-            states_df.rename(columns={'pred': 'conf_CRISPR'}, inplace=True)
-            states_df['conf_non_CRISPR'] = 1 - states_df['conf_CRISPR']
-            states_df['seq_end'] = states_df['position']
-
-            # Sort by seq_end
-            states_df = states_df[['seq_end', 'conf_CRISPR', 'conf_non_CRISPR']].sort_values('seq_end').reset_index(drop=True)
+            tasks.append((filename, source.path, source, genome, sequences[0]))
+        return tasks
 
-            # Debugging: Log first few rows
-            self.stdout.write(f'First 5 rows of DataFrame from "{filename}":')
-            self.stdout.write(str(states_df.head()))
-
-            # Call the filter_crispr function
-            regions = self.filter_crispr(
-                states_df=states_df,
-                crispr_gap=10,       # Adjusted parameters based on your R function
-                conf_cutoff=0.5,
-                pos_rate=0.8,
-                min_seq_len=120,
-                maxlen=200
-            )
-
-            if regions:
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Found {len(regions)} CRISPR regions in sequence "{sequence.contig}" from file "{filename}".'
-                    )
-                )
-                for idx, region_df in enumerate(regions):
-                    start_index = int(region_df['seq_end'].min())
-                    end_index = int(region_df['seq_end'].max())
-                    region_length = end_index - start_index + 1
-
-                    if dry_run:
-                        self.stdout.write(
-                            f'  Region {idx + 1}: Start={start_index}, End={end_index}, Length={region_length}'
-                        )
-                    else:
-                        # Create Feature object
-                        Feature.objects.create(
-                            sequence=sequence,
-                            type='repeat_region',
-                            start=start_index,
-                            end=end_index,
-                            strand='.',  # Use '.' if strand information is not available
-                            source='deepG'
-                        )
-            else:
-                self.stdout.write(
-                    f'No CRISPR regions found in sequence "{sequence.contig}" from file "{filename}".'
-                )
-
-            # Continue with loading NucleotideData if needed
-            # [The rest of your code for loading nucleotide data goes here...]
-
-    def filter_crispr(self, states_df,
-                      crispr_gap=10,
-                      conf_cutoff=0.5,
-                      pos_rate=0.8,
-                      min_seq_len=120,
-                      maxlen=200):
+    def call_regions(self, task, future=None):
         """
-        Filters CRISPR regions based on specified criteria.
+        Returns the result of deepg.call_regions for a file, run here or by a worker.
         """
-        required_columns = {'conf_CRISPR', 'conf_non_CRISPR', 'seq_end'}
-        if not required_columns.issubset(states_df.columns):
-            raise ValueError(f"states_df must contain columns: {required_columns}")
-
-        if states_df['seq_end'].duplicated().any():
-            raise ValueError("positions should all be unique (seq_end column in states_df)")
-
-        # Calculate step size
-        if len(states_df) >= 2:
-            step = states_df['seq_end'].iloc[1] - states_df['seq_end'].iloc[0]
-        else:
-            step = 1  # Default step size if only one position present
-
-        # Filter states_df to only include rows where conf_CRISPR > conf_cutoff
-        states_df = states_df[states_df['conf_CRISPR'] > conf_cutoff].copy()
-        states_df.sort_values('seq_end', inplace=True)
-        row_num = len(states_df)
-
-        crispr_list = []
-        if row_num == 0:
-            self.stdout.write("All confidence scores below conf_cutoff")
-            return crispr_list
-
-        crispr_index = 1
-        crispr_start = states_df['seq_end'].iloc[0]
+        try:
+            return future.result() if future is not None else deepg.call_regions(task[1])
+        except Exception as e:
+            return None, [('ERROR', f'Failed to process file "{task[0]}": {e}')]
 
-        if row_num > 1:
-            for i in range(row_num - 1):
-                current_pos = states_df['seq_end'].iloc[i]
-                next_pos = states_df['seq_end'].iloc[i + 1]
-
-                if (abs(current_pos - next_pos) > crispr_gap) and (i != row_num - 2):
-                    index = (states_df['seq_end'] >= crispr_start) & (states_df['seq_end'] <= current_pos)
-                    region = states_df.loc[index].copy()
-                    crispr_list.append(region)
-                    crispr_start = next_pos
-                    crispr_index += 1
+    def write_regions(self, task, result, dry_run):
+        """
+        Logs what a worker found in a file and stores its regions.
+        """
+        filename, _, source, genome, sequence = task
+        regions, log = result
 
-                if i == row_num - 2:
-                    # Last iteration
-                    if abs(current_pos - next_pos) <= crispr_gap:
-                        index = states_df['seq_end'] >= crispr_start
-                        region = states_df.loc[index].copy()
-                        crispr_list.append(region)
-                    else:
-                        index = (states_df['seq_end'] >= crispr_start) & (states_df['seq_end'] <= current_pos)
-                        region = states_df.loc[index].copy()
-                        crispr_list.append(region)
+        self.stdout.write(
+            f'Processing sequence "{sequence.contig}" from file "{filename}" with length {sequence.length}.'
+        )
+        for style, line in log:
+            self.stdout.write(getattr(self.style, style)(line) if style else line)
+        if regions is None:
+            return
 
-                        # Single sample at end
-                        crispr_index += 1
-                        region = states_df.iloc[[row_num - 1]].copy()
-                        crispr_list.append(region)
+        if regions:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Found {len(regions)} CRISPR regions in sequence "{sequence.contig}" from file "{filename}".'
+                )
+            )
         else:
-            # Only one row
-            region = states_df.copy()
-            crispr_list.append(region)
+            self.stdout.write(
+                f'No CRISPR regions found in sequence "{sequence.contig}" from file "{filename}".'
+            )
 
-        # Filter by positivity rate
-        filtered_crispr_list = []
-        for df in crispr_list:
-            seq_len = df['seq_end'].iloc[-1] - df['seq_end'].iloc[0]
-            num_possible_pos_pred = ((seq_len - 1) / step) + 1
-            cov_rate = len(df) / num_possible_pos_pred if num_possible_pos_pred > 0 else 0
-            if cov_rate >= pos_rate:
-                filtered_crispr_list.append(df)
-            else:
-                self.stdout.write(
-                    self.style.WARNING(
-                        f'    - Discarded region due to low coverage rate: '
-                        f'Coverage Rate={cov_rate:.2f}'
-                    )
-                )
+        parsed = []
+        for idx, (start_index, end_index) in enumerate(regions):
+            region_length = end_index - start_index + 1
 
-        # Filter by size
-        final_crispr_list = []
-        for df in filtered_crispr_list:
-            seq_len = df['seq_end'].iloc[-1] - df['seq_end'].iloc[0] + 1
-            if seq_len >= min_seq_len:
-                final_crispr_list.append(df)
-            else:
+            if dry_run:
                 self.stdout.write(
-                    self.style.WARNING(
-                        f'    - Discarded region due to insufficient length: '
-                        f'Length={seq_len}'
-                    )
+                    f'  Region {idx + 1}: Start={start_index}, End={end_index}, Length={region_length}'
                 )
-
-        # Optionally compute seq_middle or other attributes
-        # for df in final_crispr_list:
-        #     df['seq_middle'] = df['seq_end'] - (maxlen / 2)
-
+            parsed.append((sequence.contig, {
+                'type': 'repeat_region',
+                'start': start_index,
+                'end': end_index,
+                'strand': '.',  # Use '.' if strand information is not available
+                'source': 'deepG',
+                'score': None,
+                'phase': None,
+                'attributes': None,
+            }))
+
+        # Replace only the regions that differ from those loaded from an earlier version of the file
+        diff = ingest.diff_features(
+            ingest.stored_features(genome, sequence=sequence, type='repeat_region', source='deepG'), parsed
+        )
+        summary = diff.summary()
         self.stdout.write(
-            f'  - Detected {len(final_crispr_list)} potential CRISPR regions after filtering.'
+            f'Regions added: {summary["added"]}, removed: {summary["removed"]}, '
+            f'unchanged: {summary["unchanged"]}'
         )
 
-        return final_crispr_list
\ No newline at end of file
+        if not dry_run:
+            created_features = ingest.apply_diff(diff, {sequence.contig: sequence.id})
+            for feature in created_features:
+                feature.sequence = sequence
+            if created_features:
+                index_features(created_features)
+            source.record(genome)
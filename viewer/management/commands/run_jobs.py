@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from viewer import jobs
+
+class Command(BaseCommand):
+    help = ('Run queued background jobs (see enqueue_job), one at a time, resuming those of workers '
+            'that stopped. Several workers can share the queue.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when the queue is empty instead of waiting for more jobs',
+        )
+
+    def handle(self, *args, **options):
+        worker = jobs.worker_name()
+        self.stdout.write(f"Worker {worker} waiting for jobs...")
+
+        while True:
+            close_old_connections()
+            job = jobs.claim(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(settings.JOB_POLL_SECONDS)
+                continue
+
+            resumed = f" (attempt {job.attempts}, resuming at {job.progress_done})" if job.attempts > 1 else ''
+            self.stdout.write(self.style.NOTICE(
+                f"Running job {job.id}: {' '.join([job.command, *job.arguments])}{resumed}"
+            ))
+            started = time.perf_counter()
+            status = jobs.run(job, stdout=self.stdout, stderr=self.stderr)
+            style = self.style.SUCCESS if status == job.DONE else self.style.ERROR
+            self.stdout.write(style(f"Job {job.id} {status} after {time.perf_counter() - started:.1f}s"))
+            if status == job.FAILED:
+                job.refresh_from_db(fields=['error'])
+                self.stderr.write(job.error)
+
+        self.stdout.write("No more queued jobs.")
@@ -0,0 +1,39 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from viewer.routing import replica_alias
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database over the replica, standing in for replication when '
+            'trying read/write routing locally with two SQLite files. PostgreSQL replicas are kept '
+            'in sync by the server.')
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError(f"No '{settings.DATABASE_REPLICA_ALIAS}' database is configured.")
+
+        primary, replica = settings.DATABASES[DEFAULT_DB_ALIAS], settings.DATABASES[alias]
+        for name, database in (('primary', primary), ('replica', replica)):
+            if database['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(f'The {name} is not an SQLite database.')
+        if str(primary['NAME']) == str(replica['NAME']):
+            raise CommandError('The primary and replica use the same file.')
+
+        started = time.perf_counter()
+        # Readers of the replica in this process must reconnect to see the copy
+        connections[alias].close()
+        source = sqlite3.connect(str(primary['NAME']))
+        target = sqlite3.connect(str(replica['NAME']))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {primary['NAME']} to {replica['NAME']} in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,325 @@
+"""
+Process-shared metrics in the Prometheus text exposition format.
+
+Each process buffers increments in memory, and a background thread adds
+them every settings.METRICS_FLUSH_INTERVAL seconds to a small SQLite file
+(settings.METRICS_DB) with an upsert, so counters from all gunicorn workers
+and from management commands are summed in one place and survive process
+restarts. Requests never wait on the file. The /metrics view renders it.
+"""
+import atexit
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# name -> (type, help)
+METRICS = {
+    'viewer_requests_total': ('counter', 'Requests served, by view and status code.'),
+    'viewer_request_duration_seconds': ('histogram', 'Request latency by view.'),
+    'viewer_db_queries': ('histogram', 'Database queries per request by view.'),
+    'viewer_cache_requests_total': ('counter', 'Cache lookups by cache and result.'),
+    'viewer_store_bytes_read_total': ('counter', 'Bytes read from on-disk stores.'),
+    'viewer_ingested_rows_total': ('counter', 'Rows written by ingestion, by table.'),
+    'viewer_ingest_seconds_total': ('counter', 'Time spent writing ingested rows, by table.'),
+}
+
+BUCKETS = {
+    'viewer_request_duration_seconds': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    'viewer_db_queries': (1, 2, 5, 10, 25, 50, 100, 250, 1000),
+}
+
+_lock = threading.Lock()
+_pending = {}
+# Process id the flush thread was started in; a forked worker starts its own
+_flusher_pid = None
+
+# Connection of this process to the file, opened (and the table created) once
+_flush_lock = threading.Lock()
+_db = None
+_db_pid = None
+
+_query_counter = contextvars.ContextVar('metrics_query_counter', default=None)
+
+
+def _key(name, labels):
+    return name, json.dumps(labels, sort_keys=True)
+
+
+def inc(name, labels=None, value=1.0):
+    """
+    Adds value to a counter.
+    """
+    key = _key(name, labels or {})
+    with _lock:
+        _pending[key] = _pending.get(key, 0.0) + value
+    if _flusher_pid != os.getpid():
+        _start_flusher()
+
+
+def observe(name, value, labels=None):
+    """
+    Records one observation of a histogram.
+    """
+    labels = labels or {}
+    for bound in BUCKETS[name]:
+        if value <= bound:
+            inc(f'{name}_bucket', dict(labels, le=str(bound)))
+    inc(f'{name}_bucket', dict(labels, le='+Inf'))
+    inc(f'{name}_sum', labels, value)
+    inc(f'{name}_count', labels)
+
+
+def record_cache(cache, hit):
+    inc('viewer_cache_requests_total', {'cache': cache, 'result': 'hit' if hit else 'miss'})
+
+
+def record_store_read(store, nbytes):
+    inc('viewer_store_bytes_read_total', {'store': store}, nbytes)
+
+
+def record_ingest(table, rows, seconds):
+    inc('viewer_ingested_rows_total', {'table': table}, rows)
+    inc('viewer_ingest_seconds_total', {'table': table}, seconds)
+
+
+def _start_flusher():
+    global _flusher_pid
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0))
+        flush()
+
+
+def _connect():
+    """
+    Returns this process's connection to the metrics file. Callers hold _flush_lock.
+    """
+    global _db, _db_pid
+    if _db is None or _db_pid != os.getpid():
+        path = settings.METRICS_DB
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS samples (name TEXT, labels TEXT, value REAL, PRIMARY KEY (name, labels))'
+        )
+        _db, _db_pid = db, os.getpid()
+    return _db
+
+
+def _disconnect():
+    global _db
+    if _db is not None and _db_pid == os.getpid():
+        _db.close()
+    _db = None
+
+
+def flush():
+    """
+    Adds buffered increments of this process to the shared file. Called by
+    the flush thread, at exit and before rendering.
+    """
+    with _lock:
+        pending = list(_pending.items())
+        _pending.clear()
+    if not pending:
+        return
+    with _flush_lock:
+        try:
+            db = _connect()
+            with db:
+                db.executemany(
+                    'INSERT INTO samples (name, labels, value) VALUES (?, ?, ?) '
+                    'ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value',
+                    [(name, labels, value) for (name, labels), value in pending],
+                )
+        except sqlite3.Error:
+            _disconnect()
+            # Keep the increments for the next attempt rather than losing them
+            with _lock:
+                for key, value in pending:
+                    _pending[key] = _pending.get(key, 0.0) + value
+
+
+atexit.register(flush)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    # 'le' goes last, as exporters conventionally write it
+    keys = sorted(labels, key=lambda key: (key == 'le', key))
+    return '{' + ','.join(f'{key}="{_escape(labels[key])}"' for key in keys) + '}'
+
+
+def render():
+    """
+    Returns all metrics in the text exposition format.
+    """
+    flush()
+    with _flush_lock:
+        rows = _connect().execute('SELECT name, labels, value FROM samples ORDER BY name, labels').fetchall()
+
+    samples = {}
+    for name, labels, value in rows:
+        samples[name, labels] = value
+
+    lines = []
+    for base, (metric_type, help_text) in METRICS.items():
+        lines.append(f'# HELP {base} {help_text}')
+        lines.append(f'# TYPE {base} {metric_type}')
+        if metric_type == 'histogram':
+            lines.extend(_histogram_lines(base, samples))
+        else:
+            for (name, labels), value in samples.items():
+                if name == base:
+                    lines.append(f'{name}{_format_labels(json.loads(labels))} {value:g}')
+
+    # Hit ratios derived from the cache counters
+    caches = {}
+    for (name, labels), value in samples.items():
+        if name != 'viewer_cache_requests_total':
+            continue
+        labels = json.loads(labels)
+        hits, total = caches.get(labels['cache'], (0.0, 0.0))
+        caches[labels['cache']] = (hits + (value if labels['result'] == 'hit' else 0.0), total + value)
+    lines.append('# HELP viewer_cache_hit_ratio Fraction of cache lookups that were hits.')
+    lines.append('# TYPE viewer_cache_hit_ratio gauge')
+    for cache, (hits, total) in sorted(caches.items()):
+        lines.append(f'viewer_cache_hit_ratio{_format_labels({"cache": cache})} {hits / total if total else 0:g}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(base, samples):
+    """
+    Writes every bucket of each label set in bound order, including empty ones.
+    """
+    lines = []
+    for name, labels in samples:
+        if name != f'{base}_count':
+            continue
+        labels = json.loads(labels)
+        for bound in [str(bound) for bound in BUCKETS[base]] + ['+Inf']:
+            value = samples.get(_key(f'{base}_bucket', dict(labels, le=bound)), 0.0)
+            lines.append(f'{base}_bucket{_format_labels(dict(labels, le=bound))} {value:g}')
+        for suffix in ('_sum', '_count'):
+            value = samples.get(_key(f'{base}{suffix}', labels), 0.0)
+            lines.append(f'{base}{suffix}{_format_labels(labels)} {value:g}')
+    return lines
+
+
+class QueryCounter:
+    """
+    The queries of one request, counted from any thread.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.count += 1
+
+
+def _count_query(execute, sql, params, many, context):
+    # Counts toward the request whose context this query runs in, if any
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.add()
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter(connection, **kwargs):
+    # First in the list, so the pop() of an execute_wrapper() block entered before
+    # the connection was opened removes that block's wrapper and not this one
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _count_query)
+
+
+connection_created.connect(_install_query_counter)
+
+
+@contextmanager
+def count_queries():
+    """
+    Counts queries this thread runs toward the current request. Connections
+    count toward the request of the context each query runs in from when
+    they open (sync_to_async and async views copy it to their threads), so
+    this only adds the counter to connections opened before this module was
+    loaded.
+    """
+    for alias in connections:
+        _install_query_counter(connections[alias])
+    yield
+
+
+class MetricsMiddleware:
+    """
+    Records request counts, latency and query counts per view. Under ASGI,
+    queries of sync views are counted in the thread they run in through the
+    request context.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        counter = QueryCounter()
+        token = _query_counter.set(counter)
+        start = time.perf_counter()
+        try:
+            with count_queries():
+                response = self.get_response(request)
+        finally:
+            _query_counter.reset(token)
+        self.record(request, response, time.perf_counter() - start, counter.count)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = _query_counter.set(counter)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_counter.reset(token)
+        self.record(request, response, time.perf_counter() - start, counter.count)
+        return response
+
+    def record(self, request, response, duration, queries):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        inc('viewer_requests_total', {'view': view, 'status': str(response.status_code)})
+        observe('viewer_request_duration_seconds', duration, {'view': view})
+        observe('viewer_db_queries', queries, {'view': view})
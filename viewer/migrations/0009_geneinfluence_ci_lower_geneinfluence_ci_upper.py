@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0008_alter_geneinfluence_p_value'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geneinfluence',
+            name='ci_lower',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='geneinfluence',
+            name='ci_upper',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
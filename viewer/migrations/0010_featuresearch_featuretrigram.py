@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0009_geneinfluence_ci_lower_geneinfluence_ci_upper'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeatureSearch',
+            fields=[
+                ('feature', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search', serialize=False, to='viewer.feature')),
+                ('text', models.TextField()),
+                ('gram_count', models.IntegerField(default=0)),
+                ('genome', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='viewer.genome')),
+                ('sequence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='viewer.sequence')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['gram_count', 'feature'], name='viewer_feat_gram_co_892dda_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FeatureTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('feature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='viewer.feature')),
+                ('genome', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='viewer.genome')),
+                ('sequence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='viewer.sequence')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'genome', 'sequence', 'feature'], name='feature_trigram_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0010_featuresearch_featuretrigram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepeatCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=200)),
+                ('start', models.IntegerField()),
+                ('end', models.IntegerField()),
+                ('length', models.IntegerField()),
+                ('feature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='viewer.feature')),
+                ('genome', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='viewer.genome')),
+                ('sequence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='viewer.sequence')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['method', 'genome', 'length'], name='repeat_call_method_idx'), models.Index(fields=['method', 'sequence', 'start', 'end'], name='repeat_call_location_idx')],
+            },
+        ),
+    ]
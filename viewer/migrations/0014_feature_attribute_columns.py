@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0013_job'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='feature',
+            name='feature_attributes_idx',
+        ),
+        migrations.AddField(
+            model_name='feature',
+            name='gene',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='feature',
+            name='locus_tag',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='feature',
+            name='name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='feature',
+            name='product',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='feature',
+            index=models.Index(fields=['type', 'gene'], name='feature_type_gene_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feature',
+            index=models.Index(fields=['name'], name='feature_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feature',
+            index=models.Index(fields=['locus_tag'], name='feature_locus_tag_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feature',
+            index=models.Index(fields=['product'], name='feature_product_idx'),
+        ),
+    ]
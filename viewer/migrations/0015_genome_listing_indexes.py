@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0014_feature_attribute_columns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='genome',
+            index=models.Index(fields=['cas_gene_count', 'id'], name='genome_cas_gene_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genome',
+            index=models.Index(fields=['repeat_region_count', 'id'], name='genome_repeat_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genome',
+            index=models.Index(fields=['total_length', 'id'], name='genome_total_length_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genome',
+            index=models.Index(condition=models.Q(('repeat_region_count__gt', 0)), fields=['name', 'id'], name='genome_crispr_name_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0015_genome_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='genome',
+            name='contig_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genome',
+            name='l50',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genome',
+            name='n50',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sequence',
+            name='gc_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sequence',
+            name='iupac_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sequence',
+            name='n_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
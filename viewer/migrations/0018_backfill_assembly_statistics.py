@@ -0,0 +1,50 @@
+from django.db import migrations
+
+AMBIGUITY_CODES = 'RYSWKMBDHV'
+BATCH_SIZE = 100
+
+
+def backfill(apps, schema_editor):
+    # Same counts as viewer.assembly, against the historical models
+    Genome = apps.get_model('viewer', 'Genome')
+    Sequence = apps.get_model('viewer', 'Sequence')
+
+    last_id = 0
+    while True:
+        rows = list(Sequence.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'sequence')[:BATCH_SIZE])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updated = []
+        for sequence_id, text in rows:
+            upper = text.upper()
+            updated.append(Sequence(
+                id=sequence_id,
+                length=len(text),
+                gc_count=upper.count('G') + upper.count('C'),
+                n_count=upper.count('N'),
+                iupac_count=sum(upper.count(code) for code in AMBIGUITY_CODES),
+            ))
+        Sequence.objects.bulk_update(updated, ['length', 'gc_count', 'n_count', 'iupac_count'])
+
+    for genome in Genome.objects.all():
+        lengths = sorted(Sequence.objects.filter(genome=genome).values_list('length', flat=True), reverse=True)
+        total = sum(lengths)
+        n50 = l50 = covered = 0
+        for count, length in enumerate(lengths, 1):
+            covered += length
+            if covered * 2 >= total:
+                n50, l50 = length, count
+                break
+        Genome.objects.filter(id=genome.id).update(total_length=total, contig_count=len(lengths), n50=n50, l50=l50)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0017_data_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -11,13 +11,31 @@ class Genome(models.Model):
     has_crispr_repeat = models.BooleanField(default=False)
     cas_gene_count = models.IntegerField(default=0)
 
+    # Assembly statistics from the contig lengths (see viewer/assembly.py)
+    contig_count = models.IntegerField(default=0)
+    n50 = models.BigIntegerField(default=0)
+    l50 = models.IntegerField(default=0)
+
     def __str__(self):
         return self.name
+
+    class Meta:
+        # Keyset pagination of the genome table by each sort (see viewer/genome_listing.py)
+        indexes = [
+            models.Index(fields=['cas_gene_count', 'id'], name='genome_cas_gene_count_idx'),
+            models.Index(fields=['repeat_region_count', 'id'], name='genome_repeat_count_idx'),
+            models.Index(fields=['total_length', 'id'], name='genome_total_length_idx'),
+            models.Index(
+                fields=['name', 'id'], condition=models.Q(repeat_region_count__gt=0), name='genome_crispr_name_idx'
+            ),
+        ]
     
 class GeneInfluence(models.Model):
     gene_name = models.CharField(max_length=255)
     coefficient = models.FloatField()
     p_value = models.FloatField(null=True, blank=True)  # Allow null values
+    ci_lower = models.FloatField(null=True, blank=True)  # Bootstrap confidence interval
+    ci_upper = models.FloatField(null=True, blank=True)
     is_cas_gene = models.BooleanField(default=False)
     full_equation = models.TextField(null=True, blank=True)
 
@@ -32,13 +50,43 @@ class Sequence(models.Model):
     contig = models.CharField(max_length=200)
     sequence = models.TextField()
     length = models.IntegerField(default=0)  # New field for contig length
+    # Base counts, set with length when the sequence is loaded (see viewer/assembly.py)
+    gc_count = models.IntegerField(default=0)
+    n_count = models.IntegerField(default=0)
+    iupac_count = models.IntegerField(default=0)  # Ambiguity codes other than N
 
     def __str__(self):
         return f"{self.genome.name} - {self.contig}"
 
+    @property
+    def gc_content(self):
+        """
+        Fraction of G and C among the called (non-N) bases, or None.
+        """
+        called = self.length - self.n_count
+        return self.gc_count / called if called > 0 else None
+
     class Meta:
         unique_together = ('genome', 'contig')
 
+# GFF attributes copied into indexed columns of Feature: column -> attribute
+FEATURE_ATTRIBUTE_COLUMNS = {'product': 'product', 'gene': 'gene', 'name': 'Name', 'locus_tag': 'locus_tag'}
+FEATURE_ATTRIBUTE_MAX_LENGTH = 255
+
+
+def attribute_columns(attributes):
+    """
+    Returns the FEATURE_ATTRIBUTE_COLUMNS values of a feature's attributes,
+    taking the first item of list values and '' for missing ones.
+    """
+    columns = {}
+    for column, key in FEATURE_ATTRIBUTE_COLUMNS.items():
+        value = (attributes or {}).get(key) or ''
+        if isinstance(value, list):
+            value = value[0] if value else ''
+        columns[column] = str(value)[:FEATURE_ATTRIBUTE_MAX_LENGTH]
+    return columns
+
 class Feature(models.Model):
     id = models.AutoField(primary_key=True)
     sequence = models.ForeignKey(Sequence, on_delete=models.CASCADE, related_name='features')
@@ -50,15 +98,58 @@ class Feature(models.Model):
     strand = models.CharField(max_length=1, null=True, blank=True)
     phase = models.CharField(max_length=1, null=True, blank=True)
     attributes = models.JSONField(null=True, blank=True)
+    # Copies of attributes read by views, search and stats (see attribute_columns)
+    product = models.CharField(max_length=FEATURE_ATTRIBUTE_MAX_LENGTH, blank=True, default='')
+    gene = models.CharField(max_length=FEATURE_ATTRIBUTE_MAX_LENGTH, blank=True, default='')
+    name = models.CharField(max_length=FEATURE_ATTRIBUTE_MAX_LENGTH, blank=True, default='')
+    locus_tag = models.CharField(max_length=FEATURE_ATTRIBUTE_MAX_LENGTH, blank=True, default='')
 
     def __str__(self):
         return f"{self.type} ({self.start}-{self.end}) on {self.sequence.contig}"
 
+    def save(self, *args, **kwargs):
+        # bulk_create and bulk_update callers set the columns themselves
+        for column, value in attribute_columns(self.attributes).items():
+            setattr(self, column, value)
+        super().save(*args, **kwargs)
+
     class Meta:
         indexes = [
             models.Index(fields=['sequence', 'type']),
             models.Index(fields=['sequence', 'start', 'end']),
-            models.Index(fields=['sequence', 'attributes'], name='feature_attributes_idx'),
+            models.Index(fields=['type', 'gene'], name='feature_type_gene_idx'),
+            models.Index(fields=['name'], name='feature_name_idx'),
+            models.Index(fields=['locus_tag'], name='feature_locus_tag_idx'),
+            models.Index(fields=['product'], name='feature_product_idx'),
+        ]
+
+class FeatureSearch(models.Model):
+    feature = models.OneToOneField(Feature, on_delete=models.CASCADE, primary_key=True, related_name='search')
+    genome = models.ForeignKey(Genome, on_delete=models.CASCADE, related_name='+')
+    sequence = models.ForeignKey(Sequence, on_delete=models.CASCADE, related_name='+')
+    text = models.TextField()  # Lowercased type, product, gene, Name and locus_tag
+    gram_count = models.IntegerField(default=0)  # Distinct trigrams in text, used for ranking
+
+    def __str__(self):
+        return f"Search entry for feature {self.feature_id}: {self.text}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['gram_count', 'feature']),
+        ]
+
+class FeatureTrigram(models.Model):
+    trigram = models.CharField(max_length=3)
+    feature = models.ForeignKey(Feature, on_delete=models.CASCADE, related_name='+')
+    genome = models.ForeignKey(Genome, on_delete=models.CASCADE, related_name='+')
+    sequence = models.ForeignKey(Sequence, on_delete=models.CASCADE, related_name='+')
+
+    def __str__(self):
+        return f"{self.trigram} -> feature {self.feature_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trigram', 'genome', 'sequence', 'feature'], name='feature_trigram_idx'),
         ]
 
 class NucleotideData(models.Model):
@@ -107,6 +198,41 @@ class RepeatRegionMethod(models.Model):
     def __str__(self):
         return f"{self.genome.name} - {self.method}: {self.count}"
     
+class IngestedFile(models.Model):
+    # Source files already loaded, so loaders can skip those that have not
+    # changed since (see viewer/ingest.py)
+    path = models.CharField(max_length=1024, unique=True)  # Absolute path
+    kind = models.CharField(max_length=10)  # 'gff' or 'rds'
+    genome = models.ForeignKey(Genome, on_delete=models.CASCADE, null=True, blank=True, related_name='ingested_files')
+    sha256 = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    mtime_ns = models.BigIntegerField()
+    ingested_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.path} ({self.sha256[:12]})"
+
+class RepeatCall(models.Model):
+    # One row per repeat region found by a method, copied from Feature and the
+    # RepeatRegionMethod.repeats relation so method analytics can count, measure
+    # and overlap calls from the indexes alone (see viewer/repeat_calls.py)
+    genome = models.ForeignKey(Genome, on_delete=models.CASCADE, related_name='+')
+    sequence = models.ForeignKey(Sequence, on_delete=models.CASCADE, related_name='+')
+    feature = models.ForeignKey(Feature, on_delete=models.CASCADE, related_name='+')
+    method = models.CharField(max_length=200)
+    start = models.IntegerField()
+    end = models.IntegerField()
+    length = models.IntegerField()  # end - start + 1
+
+    def __str__(self):
+        return f"{self.method} call {self.start}-{self.end} on sequence {self.sequence_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['method', 'genome', 'length'], name='repeat_call_method_idx'),
+            models.Index(fields=['method', 'sequence', 'start', 'end'], name='repeat_call_location_idx'),
+        ]
+
 class CasGene(models.Model):
     genome = models.ForeignKey(Genome, on_delete=models.CASCADE, related_name='cas_genes')
     name = models.CharField(max_length=255)
@@ -116,4 +242,52 @@ class CasGene(models.Model):
         unique_together = ('genome', 'name')
 
     def __str__(self):
-        return f"{self.genome.name} - {self.name}: {self.count}"
\ No newline at end of file
+        return f"{self.genome.name} - {self.name}: {self.count}"
+
+class Job(models.Model):
+    # A management command queued for the run_jobs worker, with its progress
+    # (see viewer/jobs.py)
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [(status, status) for status in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)]
+
+    command = models.CharField(max_length=100)
+    arguments = models.JSONField(default=list)  # Command-line arguments of the command
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    cancel_requested = models.BooleanField(default=False)
+    progress_done = models.IntegerField(default=0)
+    progress_total = models.IntegerField(null=True, blank=True)
+    progress_at_start = models.IntegerField(default=0)  # progress_done when the current attempt started
+    message = models.CharField(max_length=255, blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.id} {self.command} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='job_queue_idx'),
+        ]
+
+class JobCheckpoint(models.Model):
+    # A unit of work (genome, file, ...) a job has finished, skipped when it is resumed
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='checkpoints')
+    key = models.CharField(max_length=1024)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('job', 'key')
+
+class DataVersion(models.Model):
+    # Single row counting writes of genome data, part of the data version
+    # that derived values are cached under (see viewer/data_version.py)
+    counter = models.BigIntegerField(default=0)
@@ -0,0 +1,172 @@
+"""
+On-demand profiling of single requests for staff users.
+
+Appending ?_profile=cpu or ?_profile=mem to any URL runs the request under a
+profiler and returns the profile instead of the page:
+
+    ?_profile=cpu                   sampled stacks in collapsed (flame graph) format
+    ?_profile=cpu&_format=pstats    deterministic cProfile output, loadable with pstats
+    ?_profile=mem                   allocated bytes per stack in collapsed format
+    ?_profile=mem&_format=top       top allocation sites as text
+
+At most REQUEST_PROFILING_MAX_CONCURRENT requests are profiled at a time;
+further ones get a 429. Profiling needs the request to run on one thread,
+so under ASGI it is refused with a 501 and other requests pass straight through.
+"""
+import cProfile
+import marshal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+
+def _frame_label(code):
+    module = code.co_filename.rsplit('/', 1)[-1]
+    return f"{module}:{code.co_name}"
+
+
+def collapsed(stacks):
+    """
+    Formats a Counter of root-to-leaf stack tuples as collapsed stack lines.
+    """
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of one thread at a fixed interval.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.slots = threading.BoundedSemaphore(getattr(settings, 'REQUEST_PROFILING_MAX_CONCURRENT', 1))
+        self.interval = getattr(settings, 'REQUEST_PROFILING_SAMPLE_INTERVAL', 0.001)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        mode = request.GET.get('_profile')
+        if mode not in ('cpu', 'mem'):
+            return self.get_response(request)
+
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_staff:
+            return self.get_response(request)
+
+        if not self.slots.acquire(blocking=False):
+            return HttpResponse('Too many profiled requests in progress.', status=429, content_type='text/plain')
+        try:
+            output_format = request.GET.get('_format')
+            if mode == 'cpu':
+                return self.profile_cpu(request, output_format)
+            return self.profile_mem(request, output_format)
+        finally:
+            self.slots.release()
+
+    async def __acall__(self, request):
+        # Only the query string is checked here, so the user is not loaded for other requests
+        if request.GET.get('_profile') not in ('cpu', 'mem'):
+            return await self.get_response(request)
+
+        user = await request.auser() if hasattr(request, 'auser') else None
+        if user is None or not user.is_staff:
+            return await self.get_response(request)
+        return HttpResponse('Request profiling is only available under WSGI.', status=501, content_type='text/plain')
+
+    def profile_cpu(self, request, output_format):
+        start = time.perf_counter()
+        if output_format == 'pstats':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                self.get_response(request)
+            finally:
+                profiler.disable()
+            profiler.create_stats()
+            response = HttpResponse(marshal.dumps(profiler.stats), content_type='application/octet-stream')
+            response['Content-Disposition'] = 'attachment; filename="request.prof"'
+        else:
+            sampler = StackSampler(threading.get_ident(), self.interval)
+            sampler.start()
+            try:
+                self.get_response(request)
+            finally:
+                sampler.stop()
+            response = HttpResponse(collapsed(sampler.stacks), content_type='text/plain')
+        response['X-Profile-Duration-Ms'] = f'{(time.perf_counter() - start) * 1000:.1f}'
+        return response
+
+    def profile_mem(self, request, output_format):
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start(25)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        try:
+            self.get_response(request)
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not already_tracing:
+                tracemalloc.stop()
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        after = after.filter_traces(filters)
+        before = before.filter_traces(filters)
+
+        if output_format == 'top':
+            lines = [f'Peak traced memory: {peak / 1024:.1f} KiB', '']
+            lines.extend(str(stat) for stat in after.compare_to(before, 'lineno')[:50])
+            body = '\n'.join(lines) + '\n'
+        else:
+            stacks = Counter()
+            for stat in after.compare_to(before, 'traceback'):
+                if stat.size_diff <= 0:
+                    continue
+                # Traceback frames are ordered from the oldest to the most recent call
+                stack = tuple(f"{frame.filename.rsplit('/', 1)[-1]}:{frame.lineno}" for frame in stat.traceback)
+                stacks[stack] += stat.size_diff
+            body = collapsed(stacks)
+
+        response = HttpResponse(body, content_type='text/plain')
+        response['X-Profile-Peak-Bytes'] = str(peak)
+        return response
@@ -0,0 +1,365 @@
+"""
+Reads behind the contig viewer and its track endpoints.
+
+Each function does one independent read and returns plain data, so the
+synchronous views call them one after another while the async views
+(viewer/async_views.py) issue them concurrently.
+"""
+import json
+
+from django.db.models import Q
+from django.db.models.functions import Substr
+from django.shortcuts import get_object_or_404
+
+from .models import Sequence, Feature, Interaction, NucleotideData
+
+
+def feature_description(feature):
+    return feature.product
+
+
+def feature_summary(feature):
+    return {
+        'id': feature.id,
+        'type': feature.type,
+        'start': feature.start,
+        'end': feature.end,
+        'description': feature_description(feature),
+    }
+
+
+def get_sequence(contig_name):
+    """
+    Returns the contig without its sequence text; its length is a column
+    and the displayed part is read with sequence_segment().
+    """
+    return get_object_or_404(Sequence.objects.defer('sequence'), contig=contig_name)
+
+
+def sequence_segment(sequence_id, start, end):
+    """
+    Returns the 0-based half-open slice [start, end) of a contig's sequence,
+    cut by the database.
+    """
+    if end <= start:
+        return ''
+    return Sequence.objects.filter(id=sequence_id).values_list(
+        Substr('sequence', start + 1, end - start), flat=True
+    ).get()
+
+
+def get_feature(feature_id):
+    """
+    Returns the feature or None if it does not exist.
+    """
+    try:
+        return Feature.objects.get(id=feature_id)
+    except Feature.DoesNotExist:
+        return None
+
+
+def viewer_region(request, sequence_length):
+    """
+    Parses the viewer's query parameters into a dict. start and end are a
+    0-based half-open window clamped to the sequence.
+    """
+    try:
+        start = int(request.GET.get('start'))
+    except (TypeError, ValueError):
+        start = 0
+
+    try:
+        end = int(request.GET.get('end'))
+    except (TypeError, ValueError):
+        end = min(sequence_length, start + 5000)
+
+    try:
+        highlighted_start = int(request.GET.get('highlighted_start'))
+        highlighted_end = int(request.GET.get('highlighted_end'))
+    except (TypeError, ValueError):
+        highlighted_start = None
+        highlighted_end = None
+
+    # Left as given if it is not a number, and then nothing is highlighted
+    position = request.GET.get('position')
+    try:
+        position = int(position) if position else None
+    except ValueError:
+        pass
+
+    return {
+        'start': max(start, 0),
+        'end': min(end, sequence_length),
+        'highlighted_start': highlighted_start,
+        'highlighted_end': highlighted_end,
+        'color_by': request.GET.get('color_by', 'nucleotide'),
+        'position': position,
+        'selected_feature_id': request.GET.get('selected_feature'),
+    }
+
+
+def data_sources(sequence_id):
+    return list(
+        NucleotideData.objects.filter(sequence_id=sequence_id).values_list('data_source', flat=True).distinct()
+    )
+
+
+def track_values(sequence_id, data_source, start, end):
+    """
+    Returns [{'position', 'value'}] of one data source for positions in
+    [start, end] (1-based, inclusive).
+    """
+    return list(
+        NucleotideData.objects.filter(
+            sequence_id=sequence_id,
+            position__gte=start,
+            position__lte=end,
+            data_source=data_source
+        ).order_by('position').values('position', 'value')
+    )
+
+
+def track_segment(sequence_id, data_source, start, end):
+    """
+    Returns one value (or None) per nucleotide of the 0-based window [start, end).
+    """
+    values = [None] * (end - start)
+    rows = NucleotideData.objects.filter(
+        sequence_id=sequence_id,
+        position__gte=start + 1,
+        position__lte=end,
+        data_source=data_source
+    ).values_list('position', 'value')
+    for position, value in rows:
+        idx = position - (start + 1)
+        if 0 <= idx < len(values):
+            values[idx] = value
+    return values
+
+
+def displayed_features(sequence_id, start, end):
+    """
+    Returns the non-gene features overlapping the window, ordered by start.
+    """
+    features = Feature.objects.filter(
+        sequence_id=sequence_id, start__lte=end, end__gte=start
+    ).exclude(type='gene').defer('attributes').order_by('start')
+    return [feature_summary(feature) for feature in features]
+
+
+def feature_coverage(features, start, end):
+    """
+    Returns how features cover the 0-based window [start, end) as runs
+    [run_start, run_end, feature_ids] of 1-based inclusive positions, each a
+    maximal stretch covered by the same features. Uncovered stretches are
+    left out, so the size depends on the number of features, not bases.
+    """
+    first, last = start + 1, end
+    events = {}
+    for feature in features:
+        lo, hi = max(feature['start'], first), min(feature['end'], last)
+        if lo > hi:
+            continue
+        events.setdefault(lo, []).append((feature['id'], True))
+        events.setdefault(hi + 1, []).append((feature['id'], False))
+
+    runs = []
+    active = {}  # Covering feature ids, in the order they started
+    positions = sorted(events)
+    for position, next_position in zip(positions, positions[1:]):
+        for feature_id, starts in events[position]:
+            if starts:
+                active[feature_id] = None
+            else:
+                active.pop(feature_id, None)
+        if active:
+            runs.append([position, next_position - 1, list(active)])
+    return runs
+
+
+def all_features(sequence_id):
+    """
+    Returns every feature of the sequence with its summary statistics per data source.
+    """
+    features = Feature.objects.filter(sequence_id=sequence_id).defer('attributes').order_by('start').prefetch_related(
+        'summary_stats'
+    )
+    rows = []
+    for feature in features:
+        stats_by_source = {}
+        for stat in feature.summary_stats.all():
+            stats_by_source[stat.data_source] = {
+                'mean_value': stat.mean_value,
+                'standard_deviation': stat.standard_deviation,
+            }
+        rows.append({
+            'id': feature.id,
+            'type': feature.type,
+            'source': feature.source,
+            'start': feature.start,
+            'end': feature.end,
+            'score': feature.score,
+            'strand': feature.strand,
+            'phase': feature.phase,
+            'description': feature_description(feature),
+            'summary_stats': stats_by_source,
+        })
+    return rows
+
+
+def interactions(sequence_id, start, end):
+    """
+    Returns interactions with either end in the 0-based window [start, end),
+    from the sorted interaction store if it has been built for this contig.
+    """
+    from . import interaction_store  # Pulls in numpy; only needed once a contig is viewed
+
+    stored = interaction_store.query_window(sequence_id, sequence_id, start + 1, end)
+    if stored is not None:
+        return interaction_store.window_as_dicts(stored)
+
+    return list(
+        Interaction.objects.filter(
+            from_sequence_id=sequence_id,
+            to_sequence_id=sequence_id
+        ).filter(
+            Q(from_position__gte=start + 1, from_position__lte=end) |
+            Q(to_position__gte=start + 1, to_position__lte=end)
+        ).values('from_position', 'to_position', 'weight')
+    )
+
+
+def highlighted_feature(sequence_id, position):
+    """
+    Returns a feature covering position, or None.
+    """
+    if not isinstance(position, int):
+        return None
+    return Feature.objects.filter(sequence_id=sequence_id, start__lte=position, end__gte=position).first()
+
+
+def viewer_context(sequence, region, segment, available_data_sources, nucleotide_data, features_data,
+                   all_features_data, interactions_data, heatmap_data, highlighted):
+    """
+    Assembles the template context of viewer.html from the reads above.
+    """
+    start, end = region['start'], region['end']
+    sequence_length = sequence.length
+
+    # Calculate navigator position percentages
+    navigator_percent_start = (start / sequence_length) * 100 if sequence_length > 0 else 0
+    navigator_percent_end = ((end / sequence_length) * 100) - navigator_percent_start if sequence_length > 0 else 0
+
+    return {
+        'contig_name': sequence.contig,
+        'position': region['position'],
+        'highlighted_feature': highlighted,
+        'sequence': sequence,
+        'sequence_segment': segment,
+        'start': start,
+        'end': end,
+        'navigator_percent_start': navigator_percent_start,
+        'navigator_percent_width': navigator_percent_end,
+        'highlighted_feature_start': region['highlighted_start'],
+        'highlighted_feature_end': region['highlighted_end'],
+        'sequence_length': sequence_length,
+        'features': json.dumps(features_data),
+        'feature_coverage': json.dumps(feature_coverage(features_data, start, end)),
+        'displayed_features': features_data,
+        'all_features': all_features_data,
+        'available_data_sources': available_data_sources,
+        'color_by': region['color_by'],
+        'nucleotide_data': json.dumps(nucleotide_data) if nucleotide_data else 'null',
+        'interactions_json': json.dumps(interactions_data),
+        'data_sources': available_data_sources,
+        'heatmap_data': json.dumps(heatmap_data),
+        'selected_feature_id': region['selected_feature_id'],
+    }
+
+
+def coalesce(windows, gap):
+    """
+    Merges 0-based half-open windows [(start, end)] that overlap or lie
+    within gap of each other. Returns sorted [(start, end)] spans.
+    """
+    spans = []
+    for start, end in sorted(windows):
+        if spans and start <= spans[-1][1] + gap:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return [tuple(span) for span in spans]
+
+
+def _in_spans(start_field, end_field, spans):
+    condition = Q()
+    for start, end in spans:
+        condition |= Q(**{f'{start_field}__lte': end, f'{end_field}__gte': start})
+    return condition
+
+
+def batch_regions(regions, data_sources=None, gap=1000):
+    """
+    Reads sequence slices, non-gene features (as displayed_features) and
+    track values (as track_segment) of many 0-based half-open regions, given
+    as dicts with sequence (a Sequence with only id and contig loaded), start
+    and end. Regions on the same contig are coalesced into spans, merging
+    those within gap bases of each other, and each contig is read with one
+    query per kind of data however many regions it has. data_sources limits
+    the tracks returned; by default every track of the contig is.
+
+    Returns (one dict per region in input order, number of spans read).
+    """
+    by_sequence = {}
+    for region in regions:
+        by_sequence.setdefault(region['sequence'].id, []).append(region)
+
+    results = {}
+    span_count = 0
+    for sequence_id, sequence_regions in by_sequence.items():
+        spans = coalesce([(region['start'], region['end']) for region in sequence_regions], gap)
+        span_count += len(spans)
+
+        # All span slices of the contig in one query, cut by the database
+        slices = Sequence.objects.filter(id=sequence_id).values(**{
+            f'span_{i}': Substr('sequence', start + 1, end - start) for i, (start, end) in enumerate(spans)
+        }).get()
+        span_sequences = [slices[f'span_{i}'] for i in range(len(spans))]
+
+        features = list(
+            Feature.objects.filter(_in_spans('start', 'end', spans), sequence_id=sequence_id)
+            .exclude(type='gene').defer('attributes').order_by('start')
+        )
+
+        track_rows = NucleotideData.objects.filter(
+            sequence_id=sequence_id
+        ).filter(Q(*[Q(position__gte=start + 1, position__lte=end) for start, end in spans], _connector=Q.OR))
+        if data_sources is not None:
+            track_rows = track_rows.filter(data_source__in=data_sources)
+        tracks = {}
+        for data_source, position, value in track_rows.values_list('data_source', 'position', 'value'):
+            tracks.setdefault(data_source, {})[position] = value
+        sources = sorted(tracks) if data_sources is None else list(data_sources)
+
+        for region in sequence_regions:
+            start, end = region['start'], region['end']
+            span_index = next(i for i, (span_start, span_end) in enumerate(spans) if span_start <= start and end <= span_end)
+            span_start = spans[span_index][0]
+            # Substr stops at the end of the contig, and so do the regions
+            end = max(min(end, span_start + len(span_sequences[span_index])), start)
+            results[id(region)] = {
+                'contig': region['sequence'].contig,
+                'start': start,
+                'end': end,
+                'sequence': span_sequences[span_index][start - span_start:end - span_start],
+                'features': [
+                    feature_summary(feature) for feature in features
+                    if feature.start <= end and feature.end >= start
+                ],
+                'tracks': {
+                    data_source: [tracks.get(data_source, {}).get(position) for position in range(start + 1, end + 1)]
+                    for data_source in sources
+                },
+            }
+
+    return [results[id(region)] for region in regions], span_count
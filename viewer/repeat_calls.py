@@ -0,0 +1,84 @@
+"""
+Denormalised repeat calls for method-level analytics.
+
+RepeatCall holds one narrow row per repeat region and method, copied from
+Feature through the RepeatRegionMethod.repeats relation when statistics are
+generated. Its indexes lead with the method, so counts and length
+statistics per method are answered from (method, genome, length) and
+overlaps between methods are computed from (method, sequence, start, end)
+without touching Feature or the join tables.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import transaction
+
+from .bulk import copy_rows
+from .models import RepeatCall, RepeatRegionMethod
+
+FIELDS = ('genome_id', 'sequence_id', 'feature_id', 'method', 'start', 'end', 'length')
+
+
+def rebuild(genome):
+    """
+    Replaces the repeat calls of a genome from its RepeatRegionMethod entries.
+    Returns the number of calls written.
+    """
+    memberships = RepeatRegionMethod.repeats.through.objects.filter(
+        repeatregionmethod__genome=genome,
+        feature__type='repeat_region',
+    ).values_list(
+        'repeatregionmethod__method', 'feature__sequence_id', 'feature_id', 'feature__start', 'feature__end'
+    ).order_by('feature__sequence_id', 'feature__start')
+
+    rows = (
+        (genome.id, sequence_id, feature_id, method, start, end, end - start + 1)
+        for method, sequence_id, feature_id, start, end in memberships.iterator(chunk_size=5000)
+    )
+    with transaction.atomic():
+        RepeatCall.objects.filter(genome=genome).delete()
+        return copy_rows(RepeatCall, FIELDS, rows)
+
+
+def calls_by_method():
+    """
+    Returns {method: {sequence_id: [(start, end), ...] sorted by start}},
+    listing calls with the same location once.
+    """
+    calls = defaultdict(lambda: defaultdict(list))
+    rows = RepeatCall.objects.order_by('method', 'sequence_id', 'start', 'end').values_list(
+        'method', 'sequence_id', 'start', 'end'
+    ).distinct()
+    for method, sequence_id, start, end in rows.iterator(chunk_size=10000):
+        calls[method][sequence_id].append((start, end))
+    return calls
+
+
+def count_overlaps(calls1, calls2, min_overlap, fraction=None):
+    """
+    Counts pairs of calls from two {sequence_id: sorted [(start, end)]} maps
+    that overlap on the same sequence. The overlap of a pair is
+    min(end) - max(start); it must be at least min_overlap, or, if fraction
+    is given, at least that fraction of both calls' end - start.
+    """
+    overlaps = 0
+    for sequence_id, intervals1 in calls1.items():
+        intervals2 = calls2.get(sequence_id)
+        if not intervals2:
+            continue
+        starts2 = [start for start, _ in intervals2]
+        longest2 = max(end - start for start, end in intervals2)
+        for start1, end1 in intervals1:
+            # Only calls starting within reach of this one can overlap it
+            first = bisect_left(starts2, start1 - longest2)
+            last = bisect_left(starts2, end1)
+            for start2, end2 in intervals2[first:last]:
+                overlap = min(end1, end2) - max(start1, start2)
+                if fraction:
+                    length1, length2 = end1 - start1, end2 - start2
+                    if (length1 > 0 and length2 > 0
+                            and overlap / length1 >= fraction and overlap / length2 >= fraction):
+                        overlaps += 1
+                elif overlap >= min_overlap:
+                    overlaps += 1
+    return overlaps
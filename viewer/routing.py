@@ -0,0 +1,177 @@
+"""
+Read/write routing between the primary database and a read-only replica.
+
+Writes always go to 'default'. Reads go to the replica alias
+(settings.DATABASE_REPLICA_ALIAS) only while serving a GET or HEAD request,
+or inside read_from_replica(); management commands, ingestion and
+analytics otherwise read the primary and so always see their own writes.
+
+Replicas lag, so after a request writes, the rest of that request reads
+the primary, and the response sets a cookie that keeps the client on the
+primary for settings.DATABASE_STICKY_SECONDS (sessions, admin edits). If
+the replica cannot be reached, reads fall back to the primary and the
+replica is probed again after settings.DATABASE_REPLICA_RETRY_SECONDS.
+
+To try this locally with two SQLite files, point 'default' and 'replica'
+at different files and copy the primary over with `manage.py sync_replica`.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_COOKIE = 'db_primary_until'
+
+
+class RoutingState:
+    """
+    Routing of one request (or read_from_replica block). Shared, not copied,
+    by the threads its context is copied to, so a write on any of them pins
+    the whole request to the primary.
+    """
+
+    def __init__(self, read_replica):
+        self.read_replica = read_replica
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing', default=None)
+_replica_down_until = 0.0
+_probe_lock = threading.Lock()
+
+
+def replica_alias():
+    """
+    Returns the replica alias, or None if no replica is configured.
+    """
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def replica_available(alias):
+    """
+    Checks the replica connection of this thread, at most once per retry
+    interval after a failure.
+    """
+    global _replica_down_until
+    if time.monotonic() < _replica_down_until:
+        return False
+    connection = connections[alias]
+    if connection.connection is not None:
+        # Open connections are checked by CONN_HEALTH_CHECKS when reused
+        return True
+    try:
+        connection.ensure_connection()
+        return True
+    except DatabaseError as e:
+        with _probe_lock:
+            _replica_down_until = time.monotonic() + getattr(settings, 'DATABASE_REPLICA_RETRY_SECONDS', 30)
+        logger.warning('Replica %s unavailable, reading from the primary: %s', alias, e)
+        return False
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return None
+        if not state.read_replica:
+            return DEFAULT_DB_ALIAS
+        alias = replica_alias()
+        if alias is None or not replica_available(alias):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+            state.read_replica = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def read_from_replica():
+    """
+    Sends reads in the block to the replica, for read-only commands that
+    should not load the primary.
+    """
+    token = _state.set(RoutingState(read_replica=True))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+def _iterate_in(state, content):
+    token = _state.set(state)
+    try:
+        yield from content
+    finally:
+        _state.reset(token)
+
+
+class ReadReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        return RoutingState(read_replica=request.method in SAFE_METHODS and time.time() >= pinned_until)
+
+    def finish(self, state, response):
+        if response.streaming and not response.is_async:
+            # Streamed bodies are read after the view returns; keep them on the same database
+            response.streaming_content = _iterate_in(state, response.streaming_content)
+        if state.wrote:
+            sticky = getattr(settings, 'DATABASE_STICKY_SECONDS', 5)
+            response.set_cookie(
+                STICKY_COOKIE, f'{time.time() + sticky:.3f}', max_age=sticky, httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,183 @@
+"""
+Trigram inverted index over the searchable text of features.
+
+The index is plain tables (FeatureSearch and FeatureTrigram) so it works the
+same on PostgreSQL and SQLite. A query is answered by taking the features of
+its rarest trigram, keeping those that also contain every other trigram,
+confirming the substring match and ranking shorter (tighter) matches first.
+Queries shorter than a trigram are not answered.
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Feature, FeatureSearch, FeatureTrigram
+
+SEARCH_COLUMNS = ('product', 'gene', 'name', 'locus_tag')
+GRAM_SIZE = 3
+BATCH_SIZE = 5000
+DEFAULT_LIMIT = 100
+# Postings counted per query trigram when picking the rarest one
+GRAM_COUNT_CAP = 10000
+
+
+def search_text(feature_type, values):
+    """
+    Builds the normalised searchable text of a feature from its type and
+    SEARCH_COLUMNS values.
+    """
+    parts = [feature_type or '']
+    parts.extend(values)
+    seen = []
+    for part in parts:
+        part = part.strip().lower()
+        if part and part not in seen:
+            seen.append(part)
+    return ' '.join(seen)
+
+
+def trigrams(text):
+    """
+    Returns the set of distinct trigrams of a (normalised) text.
+    """
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def index_features(features):
+    """
+    (Re)builds index rows for an iterable of Feature objects in batches.
+    Features must have sequence loaded or carry sequence.genome_id.
+    Returns the number of features indexed.
+    """
+    indexed = 0
+    batch = []
+    for feature in features:
+        batch.append(feature)
+        if len(batch) >= BATCH_SIZE:
+            indexed += _index_batch(batch)
+            batch = []
+    if batch:
+        indexed += _index_batch(batch)
+    return indexed
+
+
+def _index_batch(features):
+    entries = []
+    grams = []
+    for feature in features:
+        text = search_text(feature.type, [getattr(feature, column) for column in SEARCH_COLUMNS])
+        feature_grams = trigrams(text)
+        genome_id = feature.sequence.genome_id
+        entries.append(FeatureSearch(
+            feature_id=feature.id,
+            genome_id=genome_id,
+            sequence_id=feature.sequence_id,
+            text=text,
+            gram_count=len(feature_grams),
+        ))
+        grams.extend(
+            FeatureTrigram(trigram=gram, feature_id=feature.id, genome_id=genome_id, sequence_id=feature.sequence_id)
+            for gram in feature_grams
+        )
+
+    feature_ids = [feature.id for feature in features]
+    with transaction.atomic():
+        FeatureTrigram.objects.filter(feature_id__in=feature_ids).delete()
+        FeatureSearch.objects.filter(feature_id__in=feature_ids).delete()
+        FeatureSearch.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+        FeatureTrigram.objects.bulk_create(grams, batch_size=BATCH_SIZE)
+    return len(entries)
+
+
+def index_genome(genome):
+    """
+    Rebuilds the search index for all features of a genome.
+    """
+    FeatureTrigram.objects.filter(genome=genome).delete()
+    FeatureSearch.objects.filter(genome=genome).delete()
+    features = Feature.objects.filter(sequence__genome=genome).select_related('sequence').only(
+        'id', 'type', *SEARCH_COLUMNS, 'sequence__genome_id'
+    ).order_by('id')
+    return index_features(features.iterator(chunk_size=BATCH_SIZE))
+
+
+def parse_cursor(cursor):
+    """
+    Parses a '<gram_count>:<feature_id>' keyset cursor. Returns None if invalid.
+    """
+    try:
+        gram_count, feature_id = cursor.split(':')
+        return int(gram_count), int(feature_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def search_features(query, genome_id=None, sequence_id=None, after=None, limit=DEFAULT_LIMIT):
+    """
+    Searches the index and returns (rows, next_cursor).
+
+    Rows are dicts with feature, location and description fields ordered by
+    rank. Scope is global unless genome_id and/or sequence_id are given.
+    Queries shorter than GRAM_SIZE return no rows.
+    """
+    query = query.strip().lower()
+    if len(query) < GRAM_SIZE:
+        return [], None
+
+    scope = {}
+    if genome_id is not None:
+        scope['genome_id'] = genome_id
+    if sequence_id is not None:
+        scope['sequence_id'] = sequence_id
+
+    # Count each trigram's postings up to a cap, so common grams cost at most GRAM_COUNT_CAP index rows
+    gram_counts = {
+        gram: FeatureTrigram.objects.filter(trigram=gram, **scope)[:GRAM_COUNT_CAP].count()
+        for gram in trigrams(query)
+    }
+    if not all(gram_counts.values()):
+        return [], None
+    rarest, *others = sorted(gram_counts, key=gram_counts.get)
+
+    # Candidates are the postings of the rarest trigram; every other trigram is an index probe per candidate
+    entries = FeatureSearch.objects.filter(
+        feature_id__in=FeatureTrigram.objects.filter(trigram=rarest, **scope).values('feature_id'),
+        text__contains=query,
+        **scope,
+    )
+    for gram in others:
+        entries = entries.filter(Exists(FeatureTrigram.objects.filter(
+            trigram=gram,
+            genome_id=OuterRef('genome_id'),
+            sequence_id=OuterRef('sequence_id'),
+            feature_id=OuterRef('feature_id'),
+        )))
+
+    cursor = parse_cursor(after) if after else None
+    if cursor:
+        gram_count, feature_id = cursor
+        entries = entries.filter(
+            Q(gram_count__gt=gram_count) | Q(gram_count=gram_count, feature_id__gt=feature_id)
+        )
+
+    rows = list(entries.order_by('gram_count', 'feature_id').values(
+        'feature_id', 'gram_count', 'genome_id', 'sequence__contig',
+        'feature__type', 'feature__start', 'feature__end', 'feature__product',
+    )[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1]['gram_count']}:{rows[-1]['feature_id']}"
+
+    results = [
+        {
+            'id': row['feature_id'],
+            'contig': row['sequence__contig'],
+            'type': row['feature__type'],
+            'start': row['feature__start'],
+            'end': row['feature__end'],
+            'description': row['feature__product'],
+        }
+        for row in rows
+    ]
+    return results, next_cursor
@@ -0,0 +1,271 @@
+"""
+Memory-mapped k-mer index over all contig sequences, for motif search.
+
+The index directory (settings.SEQUENCE_INDEX_DIR) holds:
+
+    text.u8          every contig as one byte per base (A=0, C=1, G=2, T=3,
+                     anything else 4), each followed by a separator byte 4
+    contigs.npy      (sequence id, offset of first base in text, length) per contig
+    offsets.npy      4**k + 1 bucket boundaries into positions.npy
+    positions.npy    text offsets of every valid base, grouped by the k-mer
+                     starting there and ascending within each group
+    meta.json        k and sizes
+
+Bases after a contig end or an N count as A when the k-mer is computed, so
+every position of the text is indexed and matches are confirmed against
+text.u8. Because groups are ordered by k-mer code, all k-mers sharing a
+prefix of j <= k bases form one contiguous slice of positions.npy. Seeds of
+any length up to k therefore take one slice each.
+
+Queries with up to m mismatches are split into m + 1 pieces. At least one
+piece of every hit matches exactly, so looking up each piece's seed and
+verifying the candidates finds all hits (pigeonhole principle).
+
+Everything is read through memory maps, so only the buckets and text pages
+a query touches are read from disk.
+"""
+import json
+import os
+import shutil
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+DEFAULT_K = 12
+MIN_SEED_LENGTH = 6
+MAX_CANDIDATES = 5000000
+CHUNK_SIZE = 50000000
+VERIFY_BATCH = 100000
+
+SEPARATOR = 4
+ENCODE = np.full(256, SEPARATOR, dtype=np.uint8)
+for _code, _bases in enumerate(('Aa', 'Cc', 'Gg', 'Tt')):
+    for _base in _bases:
+        ENCODE[ord(_base)] = _code
+
+
+def index_dir():
+    return settings.SEQUENCE_INDEX_DIR
+
+
+def encode(sequence):
+    return ENCODE[np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8)]
+
+
+def reverse_complement(codes):
+    return (3 - codes[::-1]).astype(np.uint8)
+
+
+def _kmer_codes(text, start, end, k):
+    """
+    Returns (codes, valid) for the k-mers starting at text[start:end]. valid
+    is False where the first base is not A, C, G or T.
+    """
+    window = np.full(end - start + k - 1, SEPARATOR, dtype=np.uint8)
+    stop = min(end + k - 1, len(text))
+    window[:stop - start] = text[start:stop]
+
+    n = end - start
+    bases = np.where(window < SEPARATOR, window, 0).astype(np.uint32)
+    codes = np.zeros(n, dtype=np.uint32)
+    for j in range(k):
+        codes = (codes << np.uint32(2)) | bases[j:j + n]
+    return codes, window[:n] < SEPARATOR
+
+
+def build(sequences, k=DEFAULT_K, chunk_size=CHUNK_SIZE):
+    """
+    Builds (replacing) the index from an iterable of (sequence_id, sequence).
+    Returns (contig count, indexed positions).
+    """
+    if not 4 <= k <= 14:
+        raise ValueError('k must be between 4 and 14.')
+
+    target = index_dir()
+    tmp = target + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    # Pass 1: encode contigs into one text file
+    contigs = []
+    offset = 0
+    with open(os.path.join(tmp, 'text.u8'), 'wb') as f:
+        for sequence_id, sequence in sequences:
+            codes = encode(sequence or '')
+            f.write(codes.tobytes())
+            f.write(bytes([SEPARATOR]))
+            contigs.append((sequence_id, offset, len(codes)))
+            offset += len(codes) + 1
+    np.save(os.path.join(tmp, 'contigs.npy'), np.array(contigs, dtype=np.int64).reshape(-1, 3))
+
+    text = np.memmap(os.path.join(tmp, 'text.u8'), dtype=np.uint8, mode='r') if offset else np.zeros(0, np.uint8)
+    total = len(text)
+
+    # Pass 2: count positions per k-mer to size the buckets
+    counts = np.zeros(4 ** k, dtype=np.int64)
+    for start in range(0, total, chunk_size):
+        codes, valid = _kmer_codes(text, start, min(start + chunk_size, total), k)
+        counts += np.bincount(codes[valid], minlength=4 ** k)
+
+    offsets = np.zeros(4 ** k + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    np.save(os.path.join(tmp, 'offsets.npy'), offsets)
+
+    # Pass 3: place each position in its bucket, chunks in text order so
+    # buckets come out ascending
+    dtype = np.uint32 if total < 2 ** 32 else np.uint64
+    positions_path = os.path.join(tmp, 'positions.npy')
+    indexed = int(offsets[-1])
+    if indexed == 0:
+        # Nothing to place, and a zero-length array cannot be memory-mapped
+        np.save(positions_path, np.zeros(0, dtype=dtype))
+    else:
+        positions = np.lib.format.open_memmap(positions_path, mode='w+', dtype=dtype, shape=(indexed,))
+        cursor = offsets[:-1].copy()
+        for start in range(0, total, chunk_size):
+            codes, valid = _kmer_codes(text, start, min(start + chunk_size, total), k)
+            chunk_positions = np.nonzero(valid)[0].astype(np.int64) + start
+            codes = codes[valid]
+            order = np.argsort(codes, kind='stable')
+            codes = codes[order]
+            kmers, first, group_counts = np.unique(codes, return_index=True, return_counts=True)
+            rank = np.arange(len(codes)) - np.repeat(first, group_counts)
+            positions[cursor[codes] + rank] = chunk_positions[order]
+            cursor[kmers] += group_counts
+        positions.flush()
+        del positions
+    del text
+
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'k': k, 'text_length': total, 'contigs': len(contigs), 'positions': indexed}, f)
+
+    # Swap the finished directory in so readers never see a partial index
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    _open.cache_clear()
+    return len(contigs), indexed
+
+
+def exists():
+    return os.path.isfile(os.path.join(index_dir(), 'meta.json'))
+
+
+@lru_cache(maxsize=1)
+def _open(path, mtime):
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    text_path = os.path.join(path, 'text.u8')
+    return {
+        'k': meta['k'],
+        'text': np.memmap(text_path, dtype=np.uint8, mode='r') if meta['text_length'] else np.zeros(0, np.uint8),
+        'contigs': np.load(os.path.join(path, 'contigs.npy')),
+        'offsets': np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r'),
+        'positions': np.load(os.path.join(path, 'positions.npy'), mmap_mode='r' if meta['positions'] else None),
+    }
+
+
+def load():
+    """
+    Returns the opened index, reopening it after a rebuild.
+    """
+    path = index_dir()
+    return _open(path, os.path.getmtime(os.path.join(path, 'meta.json')))
+
+
+def _seed_candidates(index, pattern, mismatches):
+    """
+    Returns candidate text offsets for pattern from the seeds of its m + 1 pieces.
+    """
+    k = index['k']
+    bounds = np.linspace(0, len(pattern), mismatches + 2).astype(int)
+    candidates = []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        if b - a < MIN_SEED_LENGTH:
+            raise ValueError(
+                f'Queries with {mismatches} mismatches must be at least '
+                f'{MIN_SEED_LENGTH * (mismatches + 1)} bases long.'
+            )
+        seed = pattern[a:a + min(b - a, k)]
+        code = 0
+        for base in seed:
+            code = (code << 2) | int(base)
+        shift = 2 * (k - len(seed))
+        lo = int(index['offsets'][code << shift])
+        hi = int(index['offsets'][(code + 1) << shift])
+        if hi - lo > MAX_CANDIDATES:
+            raise ValueError('Query matches too many positions; make it longer or allow fewer mismatches.')
+        candidates.append(np.asarray(index['positions'][lo:hi], dtype=np.int64) - a)
+    return np.unique(np.concatenate(candidates))
+
+
+def _verify(index, pattern, candidates, mismatches):
+    """
+    Returns (contig rows, 0-based starts within contig, mismatch counts) of
+    candidates that lie within one contig and match with few enough mismatches.
+    """
+    contigs = index['contigs']
+    text = index['text']
+    n = len(pattern)
+    candidates = candidates[(candidates >= 0) & (candidates + n <= len(text))]
+
+    rows, starts, counts = [], [], []
+    for batch_start in range(0, len(candidates), VERIFY_BATCH):
+        batch = candidates[batch_start:batch_start + VERIFY_BATCH]
+        row = np.searchsorted(contigs[:, 1], batch, side='right') - 1
+        inside = batch + n <= contigs[row, 1] + contigs[row, 2]
+        batch, row = batch[inside], row[inside]
+
+        # One pattern column at a time, so memory stays O(batch) for any query
+        # length; candidates are dropped as soon as they have too many mismatches
+        differences = np.zeros(len(batch), dtype=np.int32)
+        for step in range(n):
+            differences += text[batch + step] != pattern[step]
+            keep = differences <= mismatches
+            if not keep.all():
+                batch, row, differences = batch[keep], row[keep], differences[keep]
+            if len(batch) == 0:
+                break
+        rows.append(row)
+        starts.append(batch - contigs[row, 1])
+        counts.append(differences)
+
+    if not rows:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.int64)
+    return np.concatenate(rows), np.concatenate(starts), np.concatenate(counts)
+
+
+def search(query, mismatches=0, strand='both', limit=100):
+    """
+    Finds query in all indexed contigs with at most mismatches substitutions.
+    Returns (hits, truncated), hits as dicts with sequence_id, 1-based
+    inclusive start and end on the forward strand, strand and mismatches,
+    ordered by contig and position.
+    """
+    pattern = encode(query.strip())
+    if len(pattern) == 0 or (pattern == SEPARATOR).any():
+        raise ValueError('Queries may only contain A, C, G and T.')
+
+    index = load()
+    strands = {'+': pattern, '-': reverse_complement(pattern)}
+    if strand != 'both':
+        strands = {strand: strands[strand]}
+
+    found = []
+    for name, codes in strands.items():
+        rows, starts, counts = _verify(index, codes, _seed_candidates(index, codes, mismatches), mismatches)
+        found.extend(zip(rows.tolist(), starts.tolist(), [name] * len(rows), counts.tolist()))
+    found.sort()
+
+    contigs = index['contigs']
+    hits = [
+        {
+            'sequence_id': int(contigs[row, 0]),
+            'start': start + 1,
+            'end': start + len(pattern),
+            'strand': name,
+            'mismatches': count,
+        }
+        for row, start, name, count in found[:limit]
+    ]
+    return hits, len(found) > limit
@@ -0,0 +1,126 @@
+"""
+Vectorised generators for synthetic genomes, features, tracks and interactions.
+
+Everything is drawn from a numpy Generator so that output is deterministic
+for a given seed. Functions return numpy arrays (or lists built from them);
+writing to the database is left to the callers.
+"""
+import numpy as np
+
+NUCLEOTIDES = np.frombuffer(b'ACGT', dtype=np.uint8)
+
+# Named dataset sizes for load tests and benchmarks
+SCALES = {
+    'S': {'genomes': 10, 'contigs': (1, 3), 'contig_length': (20000, 100000), 'track_fraction': 1.0},
+    'M': {'genomes': 100, 'contigs': (1, 5), 'contig_length': (50000, 500000), 'track_fraction': 0.5},
+    'L': {'genomes': 1000, 'contigs': (1, 10), 'contig_length': (50000, 1000000), 'track_fraction': 0.1},
+    'XL': {'genomes': 10000, 'contigs': (1, 20), 'contig_length': (50000, 1000000), 'track_fraction': 0.01},
+}
+
+FEATURE_TYPES = np.array(['gene', 'CDS', 'tRNA', 'repeat_region'])
+FEATURE_TYPE_WEIGHTS = np.array([0.45, 0.45, 0.07, 0.03])
+REPEAT_METHODS = np.array(['CRISPRCasFinder', 'CRISPRidentify', 'deepG'])
+CAS_GENES = np.array(['cas1', 'cas2', 'cas3', 'cas5', 'cas6', 'cas7', 'cas8', 'cas9', 'csn2'])
+FEATURES_PER_KB = 1.0
+CAS_GENE_RATE = 0.005
+
+
+def random_sequence(rng, length):
+    """
+    Returns a random nucleotide string of the given length.
+    """
+    return NUCLEOTIDES[rng.integers(0, 4, size=length)].tobytes().decode('ascii')
+
+
+def random_features(rng, sequence_length, features_per_kb=FEATURES_PER_KB):
+    """
+    Returns a dict of feature columns (sorted by start) for one contig.
+    """
+    n = rng.poisson(sequence_length / 1000 * features_per_kb)
+    types = rng.choice(FEATURE_TYPES, size=n, p=FEATURE_TYPE_WEIGHTS)
+    lengths = np.clip(rng.lognormal(mean=6.7, sigma=0.5, size=n), 60, 5000).astype(np.int64)
+    starts = np.sort(rng.integers(1, max(sequence_length - 60, 2), size=n))
+    ends = np.minimum(starts + lengths - 1, sequence_length)
+    strands = rng.choice(np.array(['+', '-']), size=n)
+    is_repeat = types == 'repeat_region'
+    sources = np.where(is_repeat, rng.choice(REPEAT_METHODS, size=n), 'Prodigal')
+    is_cas = (types == 'CDS') & (rng.random(n) < CAS_GENE_RATE)
+    gene_ids = rng.integers(0, 5000, size=n)
+    cas_names = rng.choice(CAS_GENES, size=n)
+
+    attributes = []
+    for i in range(n):
+        if is_repeat[i]:
+            attributes.append({'rpt_family': 'CRISPR', 'product': 'CRISPR array'})
+        elif is_cas[i]:
+            attributes.append({'gene': str(cas_names[i]), 'Name': str(cas_names[i]), 'product': f'CRISPR-associated protein {cas_names[i].capitalize()}'})
+        else:
+            attributes.append({'gene': f'gen{gene_ids[i]}', 'locus_tag': f'SYN_{gene_ids[i]:05d}', 'product': f'hypothetical protein {gene_ids[i]}'})
+
+    return {
+        'type': types,
+        'source': sources,
+        'start': starts,
+        'end': ends,
+        'strand': strands,
+        'attributes': attributes,
+    }
+
+
+def track_values(rng, length):
+    """
+    Returns per-base track values in [-1, 1] rounded to four decimals.
+    """
+    return np.round(rng.uniform(-1, 1, size=length), 4)
+
+
+def dummy_interactions(rng, sequence_length, min_step=100, max_step=500, per_site=5,
+                       interaction_range=50, distribution='weighted'):
+    """
+    Returns (from_positions, to_positions, weights) for interaction sites
+    spaced by random steps, each linked to partners within +/- range.
+    """
+    # Over-draw steps, then keep sites inside the sequence
+    n_steps = sequence_length // max(min_step, 1) + 1
+    sites = rng.integers(1, max_step + 1) + np.cumsum(
+        np.concatenate([[0], rng.integers(min_step, max_step + 1, size=n_steps)])
+    )
+    sites = sites[sites <= sequence_length]
+    if len(sites) == 0 or interaction_range <= 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.float64)
+
+    # Partner offsets in [-range, range] without 0, distinct per site. Offset
+    # i of the 2 * range is -range + i below range and -range + i + 1 above.
+    n_offsets = 2 * interaction_range
+    k = min(per_site, n_offsets)
+    if n_offsets <= 4 * k:
+        # Few offsets: shuffle them all for each site
+        picks = rng.random((len(sites), n_offsets)).argsort(axis=1)[:, :k]
+    else:
+        # Many offsets: draw k per site and redraw the sites that drew one twice,
+        # so the cost is O(sites * k) whatever the range
+        picks = rng.integers(0, n_offsets, size=(len(sites), k))
+        while True:
+            ordered = np.sort(picks, axis=1)
+            repeated = (ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+            if not repeated.any():
+                break
+            picks[repeated] = rng.integers(0, n_offsets, size=(int(repeated.sum()), k))
+    offsets = np.where(picks < interaction_range, picks - interaction_range, picks - interaction_range + 1)
+    from_positions = np.repeat(sites, k)
+    to_positions = from_positions + offsets.ravel()
+
+    # Drop partners falling off either end of the sequence
+    inside = (to_positions >= 1) & (to_positions <= sequence_length)
+    from_positions = from_positions[inside]
+    to_positions = to_positions[inside]
+
+    n = len(from_positions)
+    if distribution == 'uniform':
+        weights = rng.uniform(0.1, 1.0, size=n)
+    else:
+        # 80% interactions with lower weights, 20% with higher weights
+        strong = rng.random(n) < 0.2
+        weights = np.where(strong, rng.uniform(0.6, 1.0, size=n), rng.uniform(0.1, 0.5, size=n))
+    return from_positions, to_positions, np.round(weights, 4)
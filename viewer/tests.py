@@ -1,3 +1,237 @@
-from django.test import TestCase
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from viewer import genome_listing, metrics
+from viewer.ingest import diff_features, file_hash
+from viewer.models import Genome, IngestedFile, Job
+
+
+def feature(start, end, feature_type='CDS', feature_id=None, **values):
+    row = {
+        'type': feature_type,
+        'start': start,
+        'end': end,
+        'source': 'prodigal',
+        'score': None,
+        'strand': '+',
+        'phase': '0',
+        'attributes': {},
+    }
+    row.update(values)
+    if feature_id is not None:
+        row['id'] = feature_id
+    return row
+
+
+class DiffFeaturesTests(SimpleTestCase):
+    def test_identical_features_are_unchanged(self):
+        stored = [('c1', feature(1, 100, feature_id=1)), ('c1', feature(200, 300, feature_id=2))]
+        parsed = [('c1', feature(1, 100)), ('c1', feature(200, 300))]
+
+        diff = diff_features(stored, parsed)
+
+        self.assertFalse(diff)
+        self.assertEqual(diff.summary(), {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 2})
+
+    def test_added_and_removed(self):
+        stored = [('c1', feature(1, 100, feature_id=1)), ('c1', feature(200, 300, feature_id=2))]
+        parsed = [('c1', feature(1, 100)), ('c2', feature(200, 300))]
+
+        diff = diff_features(stored, parsed)
+
+        self.assertEqual(diff.added, [('c2', feature(200, 300))])
+        self.assertEqual(diff.removed, [2])
+        self.assertEqual(diff.changed, [])
+        self.assertEqual(diff.unchanged, 1)
+
+    def test_changed_values_keep_the_stored_id(self):
+        stored = [('c1', feature(1, 100, feature_id=7))]
+        parsed = [('c1', feature(1, 100, strand='-', attributes={'gene': 'cas9'}))]
+
+        diff = diff_features(stored, parsed)
+
+        self.assertEqual(diff.changed, [(7, parsed[0][1])])
+        self.assertEqual(diff.added, [])
+        self.assertEqual(diff.removed, [])
+
+    def test_type_is_part_of_the_key(self):
+        stored = [('c1', feature(1, 100, feature_type='gene', feature_id=1))]
+        parsed = [('c1', feature(1, 100, feature_type='CDS'))]
+
+        diff = diff_features(stored, parsed)
+
+        self.assertEqual(diff.added, parsed)
+        self.assertEqual(diff.removed, [1])
+
+    def test_duplicate_keys_are_paired_in_order(self):
+        stored = [
+            ('c1', feature(1, 100, feature_id=1, source='a')),
+            ('c1', feature(1, 100, feature_id=2, source='b')),
+            ('c1', feature(1, 100, feature_id=3, source='c')),
+        ]
+        parsed = [('c1', feature(1, 100, source='a')), ('c1', feature(1, 100, source='x'))]
+
+        diff = diff_features(stored, parsed)
+
+        self.assertEqual(diff.unchanged, 1)
+        self.assertEqual(diff.changed, [(2, parsed[1][1])])
+        self.assertEqual(diff.removed, [3])
+        self.assertEqual(diff.added, [])
+
+    def test_extra_duplicates_are_added(self):
+        stored = [('c1', feature(1, 100, feature_id=1))]
+        parsed = [('c1', feature(1, 100)), ('c1', feature(1, 100))]
+
+        diff = diff_features(stored, parsed)
+
+        self.assertEqual(diff.unchanged, 1)
+        self.assertEqual(diff.added, [parsed[1]])
+        self.assertEqual(diff.removed, [])
+
+
+class GenomeListingPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Lengths tie in threes so pages split inside runs of equal sort values
+        cls.genomes = [
+            Genome.objects.create(name=f'genome_{i:02d}', total_length=1000 * (i // 3))
+            for i in range(8)
+        ]
+
+    def names(self, genomes):
+        return [genome.name for genome in genomes]
+
+    def walk_forward(self, sort):
+        names = []
+        rows, previous_cursor, next_cursor = genome_listing.page(Genome.objects.all(), sort=sort, size=3)
+        self.assertIsNone(previous_cursor)
+        names.extend(self.names(rows))
+        while next_cursor:
+            rows, previous_cursor, next_cursor = genome_listing.page(
+                Genome.objects.all(), sort=sort, after=next_cursor, size=3
+            )
+            self.assertIsNotNone(previous_cursor)
+            names.extend(self.names(rows))
+        return names
+
+    def test_forward_pages_by_name(self):
+        self.assertEqual(self.walk_forward('name'), [genome.name for genome in self.genomes])
+
+    def test_forward_pages_with_ties(self):
+        # Descending length, ties broken by descending id
+        expected = self.names(sorted(self.genomes, key=lambda genome: (genome.total_length, genome.id), reverse=True))
+        names = self.walk_forward('length')
+        self.assertEqual(names, expected)
+        self.assertEqual(len(set(names)), len(self.genomes))
+
+    def test_backward_returns_the_previous_page(self):
+        first, _, next_cursor = genome_listing.page(Genome.objects.all(), sort='length', size=3)
+        _, previous_cursor, _ = genome_listing.page(
+            Genome.objects.all(), sort='length', after=next_cursor, size=3
+        )
+
+        rows, previous_of_first, next_of_first = genome_listing.page(
+            Genome.objects.all(), sort='length', before=previous_cursor, size=3
+        )
+
+        self.assertEqual(self.names(rows), self.names(first))
+        self.assertIsNone(previous_of_first)
+        self.assertIsNotNone(next_of_first)
+
+    def test_last_page(self):
+        rows, previous_cursor, next_cursor = genome_listing.page(Genome.objects.all(), sort='name', last=True, size=3)
+
+        self.assertEqual(self.names(rows), ['genome_05', 'genome_06', 'genome_07'])
+        self.assertIsNotNone(previous_cursor)
+        self.assertIsNone(next_cursor)
+
+        rows, _, _ = genome_listing.page(Genome.objects.all(), sort='name', before=previous_cursor, size=3)
+        self.assertEqual(self.names(rows), ['genome_02', 'genome_03', 'genome_04'])
+
+    def test_cursor_of_another_sort_gives_the_first_page(self):
+        _, _, next_cursor = genome_listing.page(Genome.objects.all(), sort='length', size=3)
+
+        rows, previous_cursor, _ = genome_listing.page(Genome.objects.all(), sort='name', after=next_cursor, size=3)
+
+        self.assertEqual(self.names(rows), ['genome_00', 'genome_01', 'genome_02'])
+        self.assertIsNone(previous_cursor)
+
+
+class LoadRdsTouchedFileTests(TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        self.path = os.path.join(self.folder, 'GCF_1_genomic_1.rds')
+        with open(self.path, 'wb') as f:
+            f.write(b'unchanged content')
+        # Same content as when it was loaded, but the file has been touched since
+        self.entry = IngestedFile.objects.create(
+            path=self.path, kind='rds', sha256=file_hash(self.path),
+            size=os.path.getsize(self.path), mtime_ns=os.stat(self.path).st_mtime_ns - 1,
+        )
+
+    def load(self, *args):
+        out = StringIO()
+        call_command('load_rds_for_deepG_track', '--folder', self.folder, '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_touched_file_is_skipped_and_its_mtime_recorded(self):
+        output = self.load()
+
+        self.assertIn('unchanged since it was last loaded', output)
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.mtime_ns, os.stat(self.path).st_mtime_ns)
+
+    def test_dry_run_leaves_the_manifest_alone(self):
+        mtime_ns = self.entry.mtime_ns
+
+        output = self.load('--dry_run')
+
+        self.assertIn('unchanged since it was last loaded', output)
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.mtime_ns, mtime_ns)
+
+
+class JobsStatusTests(TestCase):
+    def setUp(self):
+        Job.objects.create(command='load_data', arguments=['--folder', '/srv/data'], worker='host:1')
+
+    def test_anonymous_requests_are_refused(self):
+        response = self.client.get(reverse('jobs_status'))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(b'/srv/data', response.content)
+
+    def test_staff_see_job_details(self):
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+
+        response = self.client.get(reverse('jobs_status'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['jobs'][0]['arguments'], ['--folder', '/srv/data'])
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsQueryCountTests(TestCase):
+    def queries_observed(self, observe):
+        return [call.args[1] for call in observe.call_args_list if call.args[0] == 'viewer_db_queries']
+
+    def test_sync_view_under_wsgi(self):
+        with mock.patch.object(metrics, 'observe') as observe:
+            self.client.get(reverse('index'))
+
+        self.assertGreater(self.queries_observed(observe)[0], 0)
+
+    async def test_sync_view_under_asgi(self):
+        with mock.patch.object(metrics, 'observe') as observe:
+            await AsyncClient().get(reverse('index'))
+
+        self.assertGreater(self.queries_observed(observe)[0], 0)
@@ -1,19 +1,33 @@
 from django.urls import path
-from . import views
+from . import views, analytics_views, async_views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('genomes/<int:genome_id>/contigs', views.genome_contigs, name='genome_contigs'),
     path('viewer/<str:contig_name>/', views.viewer, name='viewer'),
     path('viewer/<str:contig_name>/heatmap-data', views.get_heatmap_data, name='get_heatmap_data'),
     path('viewer/<str:contig_name>/feature-data', views.get_feature_data, name='get_feature_data'),
+    path('async/viewer/<str:contig_name>/', async_views.viewer, name='viewer_async'),
+    path('async/viewer/<str:contig_name>/heatmap-data', async_views.get_heatmap_data, name='get_heatmap_data_async'),
+    path('async/viewer/<str:contig_name>/feature-data', async_views.get_feature_data, name='get_feature_data_async'),
+    path('viewer/<str:contig_name>/contact-matrix', views.get_contact_matrix, name='get_contact_matrix'),
     path('viewer/<str:contig_name>/search_features/', views.search_features, name='search_features'),
     path('viewer/<str:contig_name>/feature_info/', views.feature_info, name='feature_info'),
-    path('crispr_plot/', views.crispr_plot, name='crispr_plot'),
-    path('evaluation/', views.evaluation, name='evaluation'),
+    path('viewer/<str:contig_name>/export/fasta', views.export_fasta, name='export_fasta'),
+    path('viewer/<str:contig_name>/export/bedgraph', views.export_bedgraph, name='export_bedgraph'),
+    path('viewer/<str:contig_name>/export/<str:file_format>', views.export_features, name='export_features'),
+    path('export/repeat_regions', views.export_repeat_regions, name='export_repeat_regions'),
+    path('search/features/', views.search_features_global, name='search_features_global'),
+    path('regions/batch', views.batch_regions, name='batch_regions'),
+    path('search/sequence/', views.search_sequence, name='search_sequence'),
+    path('crispr_plot/', analytics_views.crispr_plot, name='crispr_plot'),
+    path('evaluation/', analytics_views.evaluation, name='evaluation'),
     path('about/', views.about, name='about'),
-    path('cas_heatmap/', views.cas_heatmap, name='cas_heatmap'),
+    path('cas_heatmap/', analytics_views.cas_heatmap, name='cas_heatmap'),
     path('dataprotection/', views.dataprotection, name='dataprotection'),
     path('imprint/', views.imprint, name='imprint'),
-    path('cas_interactions/', views.cas_interactions, name='cas_interactions'),
+    path('cas_interactions/', analytics_views.cas_interactions, name='cas_interactions'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('jobs/status', views.jobs_status, name='jobs_status'),
 
 ]
\ No newline at end of file
@@ -1,617 +1,301 @@
 from django.shortcuts import render, get_object_or_404
-from .models import Sequence, Feature, NucleotideData, Interaction, FeatureSummaryStat, Genome, RepeatRegionMethod, CasGene, GeneInfluence
-import json
-from django.db.models import Q, Avg, StdDev, F, Sum, Count
-from django.db.models.functions import Cast, Abs
-from django.db.models import FloatField
-from django.http import JsonResponse
-from django.core.paginator import Paginator
-from itertools import combinations
-import plotly.graph_objs as go
-import plotly.figure_factory as ff
-import numpy as np
-from scipy.cluster import hierarchy
+from .models import Sequence, Feature, Interaction, Genome, Job
+from django.db.models import F, Sum
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from urllib.parse import urlencode
+from . import search, metrics, region_data, export, jobs, genome_listing
+from .instrumentation import span
 
 
 def index(request):
     show_crispr = request.GET.get('show_crispr', 'false').lower() == 'true'
-    
-    genomes = Genome.objects.all()
-    
-    if show_crispr:
-        genomes = genomes.filter(repeat_region_count__gt=0)
-    
-    genomes = genomes.order_by('name')
-    
-    paginator = Paginator(genomes, 10)  # Show 10 genomes per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    query = request.GET.get('q', '').strip()
+    sort = request.GET.get('sort', genome_listing.DEFAULT_SORT)
+    if sort not in genome_listing.SORTS:
+        sort = genome_listing.DEFAULT_SORT
+
+    genomes = genome_listing.filtered_genomes(show_crispr, query)
+    rows, previous_cursor, next_cursor = genome_listing.page(
+        genomes, sort,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        last=request.GET.get('last') == 'true',
+    )
 
-    # Dashboard data
-    total_genomes = Genome.objects.count()
-    # Count distinct methods across all genomes
-    total_crispr_methods = RepeatRegionMethod.objects.values('method').distinct().count()
-    total_crispr_arrays = Feature.objects.filter(type='repeat_region').count()
+    # Parameters kept by the page links
+    listing_params = {'sort': sort}
+    if show_crispr:
+        listing_params['show_crispr'] = 'true'
+    if query:
+        listing_params['q'] = query
 
     context = {
-        'genomes': page_obj,
+        'genomes': genome_listing.with_details(rows),
         'show_crispr': show_crispr,
-        'total_genomes': total_genomes,
-        'total_crispr_methods': total_crispr_methods,
-        'total_crispr_arrays': total_crispr_arrays,
+        'query': query,
+        'sort': sort,
+        'genome_count': genome_listing.genome_count(show_crispr, query),
+        'listing_query': urlencode(listing_params),
+        'crispr_toggle_query': urlencode({**listing_params, 'show_crispr': 'false' if show_crispr else 'true'}),
+        'previous_query': urlencode({**listing_params, 'before': previous_cursor}) if previous_cursor else None,
+        'next_query': urlencode({**listing_params, 'after': next_cursor}) if next_cursor else None,
+        **genome_listing.dashboard_counts(),
     }
     return render(request, 'viewer/index.html', context)
 
 
-def cas_interactions(request):
-    TOP_N = 10  # Number of top genes to display
-
-    # Retrieve the full equation entry
-    equation_entry = GeneInfluence.objects.filter(gene_name='__equation__').first()
-    full_equation = equation_entry.full_equation if equation_entry else None
-
-    # Retrieve influence data excluding the equation entry
-    influences = GeneInfluence.objects.exclude(gene_name='__equation__')
-
-    # Get all influencers and sort them by the absolute value of their coefficients
-    all_influencers = list(influences)
-    all_influencers.sort(key=lambda x: abs(x.coefficient), reverse=True)
-
-    # Get top N influencers
-    top_influencers = all_influencers[:TOP_N]
-
-    context = {
-        'top_influencers': top_influencers,
-        'full_equation': full_equation,
-        'top_n': TOP_N,
-    }
-    return render(request, 'viewer/cas_interactions.html', context)
-
-def cas_heatmap(request):
-    # Get all unique Cas genes
-    cas_genes = list(CasGene.objects.values_list('name', flat=True).distinct())
-    
-    # Get all genomes
-    genomes = list(Genome.objects.all().order_by('name'))
-    
-    # Create a matrix of Cas gene presence
-    heatmap_data = []
-    for genome in genomes:
-        genome_cas_genes = genome.cas_genes.values_list('name', flat=True)
-        row = [1 if gene in genome_cas_genes else 0 for gene in cas_genes]
-        heatmap_data.append(row)
-    
-    # Convert to numpy array
-    heatmap_data = np.array(heatmap_data)
-    
-    # Perform clustering
-    row_linkage = hierarchy.linkage(heatmap_data, method='ward')
-    col_linkage = hierarchy.linkage(heatmap_data.T, method='ward')
-
-    # Reorder the data based on clustering
-    row_order = hierarchy.dendrogram(row_linkage, no_plot=True)['leaves']
-    col_order = hierarchy.dendrogram(col_linkage, no_plot=True)['leaves']
-
-    heatmap_data = heatmap_data[row_order, :][:, col_order]
-    
-    # Create heatmap
-    heatmap = go.Heatmap(
-        z=heatmap_data,
-        x=[cas_genes[i] for i in col_order],
-        y=[genomes[i].name for i in row_order],
-        colorscale=[[0, 'white'], [1, 'red']],
-    )
-    
-    layout = go.Layout(
-        title='Cas Gene Heatmap',
-        xaxis=dict(
-            title='Cas Genes',
-            tickangle=90,
-            side='bottom',
-            tickfont=dict(size=10),
-        ),
-        yaxis=dict(
-            title='Genomes',
-            tickfont=dict(size=10),
-            automargin=True,
-        ),
-        height=800,
-        width=1200,
-        margin=dict(l=200, r=50, b=200, t=50),
-    )
-    
-    fig = go.Figure(data=[heatmap], layout=layout)
-    
-    # Convert the figure to JSON
-    plot_json = fig.to_json()
-    
-    context = {
-        'plot_json': plot_json,
-    }
-    
-    return render(request, 'viewer/cas_heatmap.html', context)
+def genome_contigs(request, genome_id):
+    contigs = genome_listing.genome_contigs(genome_id)
+    if contigs is None:
+        return JsonResponse({'error': 'Genome not found'}, status=404)
+    return JsonResponse({'genome_id': genome_id, 'contigs': contigs})
 
 
 def viewer(request, contig_name):
-    position = request.GET.get('position')
-    start = request.GET.get('start')
-    end = request.GET.get('end')
-    sequence = get_object_or_404(Sequence, contig=contig_name)
-    
-    # Fetch all features related to this sequence
-    features = sequence.features.all()
-
-    # Get start and end positions from URL parameters
-    start_param = request.GET.get('start')
-    end_param = request.GET.get('end')
-    highlighted_feature_start = request.GET.get('highlighted_start')
-    highlighted_feature_end = request.GET.get('highlighted_end')
-
-    # Get color scheme from URL parameters
-    color_by = request.GET.get('color_by', 'nucleotide')
-
-    sequence_length = len(sequence.sequence)
-
-    # Validate and set default start and end positions
-    try:
-        start = int(start_param)
-    except (TypeError, ValueError):
-        start = 0
-
-    try:
-        end = int(end_param)
-    except (TypeError, ValueError):
-        end = min(sequence_length, start + 5000)
-
-    start = max(start, 0)
-    end = min(end, sequence_length)
-
-    # Convert highlighted feature positions to integers if they exist
-    try:
-        highlighted_feature_start = int(highlighted_feature_start)
-        highlighted_feature_end = int(highlighted_feature_end)
-    except (TypeError, ValueError):
-        highlighted_feature_start = None
-        highlighted_feature_end = None
+    sequence = region_data.get_sequence(contig_name)
+    region = region_data.viewer_region(request, sequence.length)
+    start, end = region['start'], region['end']
+    segment = region_data.sequence_segment(sequence.id, start, end)
 
     # Fetch available data sources
-    available_data_sources = list(sequence.nucleotide_data.values_list('data_source', flat=True).distinct())
-
-    sequence_segment = sequence.sequence[start:end]
+    available_data_sources = region_data.data_sources(sequence.id)
 
+    # Track values for the displayed segment, if coloured by a data source
     nucleotide_data = None
-    if color_by != 'nucleotide' and color_by in available_data_sources:
-        # Fetch nucleotide data for the displayed segment and selected data source
-        nucleotide_data_qs = sequence.nucleotide_data.filter(
-            position__gte=start + 1,
-            position__lte=end,
-            data_source=color_by
-        ).order_by('position')
-
-        # Prepare a list of values corresponding to the sequence segment
-        nucleotide_values = [None] * (end - start)
-        for nd in nucleotide_data_qs:
-            idx = nd.position - (start + 1)
-            if 0 <= idx < len(nucleotide_values):
-                nucleotide_values[idx] = nd.value
-
-        nucleotide_data = nucleotide_values
-
-    # Filter features that are within the displayed region
-    displayed_features = features.filter(start__lte=end, end__gte=start).exclude(type='gene').order_by('start')
-
-    # Prepare features data for JavaScript
-    features_data = []
-    for feature in displayed_features:
-        features_data.append({
-            'id': feature.id,
-            'type': feature.type,  # Added type here
-            'start': feature.start,
-            'end': feature.end,
-            'description': feature.attributes.get('product', '') if feature.attributes else '',
-        })
+    if region['color_by'] != 'nucleotide' and region['color_by'] in available_data_sources:
+        nucleotide_data = region_data.track_segment(sequence.id, region['color_by'], start, end)
 
-    # Calculate navigator position percentages
-    navigator_percent_start = (start / sequence_length) * 100 if sequence_length > 0 else 0
-    navigator_percent_end = ((end / sequence_length) * 100) - navigator_percent_start if sequence_length > 0 else 0
-
-    # Prepare all features data for the second table
-    all_features = features.order_by('start')
-    all_features_data = []
-    for feature in all_features:
-        description = feature.attributes.get('product', '') if feature.attributes else ''
-
-        # Fetch related summary statistics
-        summary_stats = feature.summary_stats.all()
-        stats_by_source = {}
-        for stat in summary_stats:
-            stats_by_source[stat.data_source] = {
-                'mean_value': stat.mean_value,
-                'standard_deviation': stat.standard_deviation,
-            }
-
-        all_features_data.append({
-            'id': feature.id,
-            'type': feature.type,
-            'source': feature.source,
-            'start': feature.start,
-            'end': feature.end,
-            'score': feature.score,
-            'strand': feature.strand,
-            'phase': feature.phase,
-            'description': description,
-            'summary_stats': stats_by_source,
-        })
+    # Features within the displayed region, and all features for the second table
+    features_data = region_data.displayed_features(sequence.id, start, end)
+    with span('viewer.features_json'):
+        all_features_data = region_data.all_features(sequence.id)
 
-    # Fetch interactions where either from_position or to_position is within the current range
-    interactions = Interaction.objects.filter(
-        from_sequence__contig=contig_name,
-        to_sequence__contig=contig_name
-    ).filter(
-        Q(from_position__gte=start + 1, from_position__lte=end) |
-        Q(to_position__gte=start + 1, to_position__lte=end)
-    )
-
-    # Prepare interactions data for JavaScript
-    interactions_data = [
-        {
-            'from_position': interaction.from_position,
-            'to_position': interaction.to_position,
-            'weight': interaction.weight,
-        }
-        for interaction in interactions
-    ]
+    with span('viewer.interactions'):
+        interactions_data = region_data.interactions(sequence.id, start, end)
 
-    # Add this new section to prepare heatmap data
+    # Track values over the selected feature, one entry per data source
     heatmap_data = []
-    selected_feature_id = request.GET.get('selected_feature')
-    if selected_feature_id:
-        try:
-            selected_feature = Feature.objects.get(id=selected_feature_id)
-            for data_source in available_data_sources:
-                nucleotide_data = NucleotideData.objects.filter(
-                    sequence=sequence,
-                    position__gte=selected_feature.start,
-                    position__lte=selected_feature.end,
-                    data_source=data_source
-                ).order_by('position')
-                
-                heatmap_data.append({
-                    'name': data_source,
-                    'values': list(nucleotide_data.values('position', 'value'))
-                })
-        except Feature.DoesNotExist:
-            pass
-
-    # Determine if a position is provided
-    if position:
-        try:
-            position = int(position)
-            # Find features that encompass the position
-            highlighted_feature = features.filter(start__lte=position, end__gte=position).first()
-        except ValueError:
-            highlighted_feature = None
-    else:
-        highlighted_feature = None
-        
-    context = {
-        'contig_name': contig_name,
-        'position': position,
-        'highlighted_feature': highlighted_feature,
-        'features': features,
-        'sequence': sequence,
-        'sequence_segment': sequence_segment,
-        'start': start,
-        'end': end,
-        'navigator_percent_start': navigator_percent_start,
-        'navigator_percent_width': navigator_percent_end,
-        'highlighted_feature_start': highlighted_feature_start,
-        'highlighted_feature_end': highlighted_feature_end,
-        'sequence_length': sequence_length,
-        'features': json.dumps(features_data),
-        'displayed_features': features_data,
-        'all_features': all_features_data,
-        'available_data_sources': available_data_sources,
-        'color_by': color_by,
-        'nucleotide_data': json.dumps(nucleotide_data) if nucleotide_data else 'null',
-        'interactions_json': json.dumps(interactions_data),
-        'data_sources': available_data_sources,  # Pass data sources to the template
-        'heatmap_data': json.dumps(heatmap_data),
-        'selected_feature_id': selected_feature_id,
-    }
-    return render(request, 'viewer/viewer.html', context)
-
-def crispr_plot(request):
-    genomes = Genome.objects.all().order_by('name')
-    methods = RepeatRegionMethod.objects.values_list('method', flat=True).distinct()
-    
-    scatter_data = []
-    for method1, method2 in combinations(methods, 2):
-        for genome in genomes:
-            count1 = Feature.objects.filter(
-                type='repeat_region',
-                repeat_methods__method=method1,
-                sequence__genome=genome
-            ).count()
-            count2 = Feature.objects.filter(
-                type='repeat_region',
-                repeat_methods__method=method2,
-                sequence__genome=genome
-            ).count()
-            scatter_data.append({
-                'genome_name': genome.name,
-                'method1': method1,
-                'method2': method2,
-                'count1': count1,
-                'count2': count2,
+    selected_feature = None
+    if region['selected_feature_id']:
+        selected_feature = region_data.get_feature(region['selected_feature_id'])
+    if selected_feature is not None:
+        for data_source in available_data_sources:
+            heatmap_data.append({
+                'name': data_source,
+                'values': region_data.track_values(
+                    sequence.id, data_source, selected_feature.start, selected_feature.end
+                ),
             })
 
-    context = {
-        'scatter_data': json.dumps(scatter_data),
-        'methods': list(methods),
-    }
-
-    return render(request, 'viewer/crispr_plot.html', context)
-
-def evaluation(request):
-    methods = list(RepeatRegionMethod.objects.values_list('method', flat=True).distinct().order_by('method'))
-
-    repeats_by_method = {}
-    counts_per_method = {}
-    avg_length_per_method = {}
-    std_dev_per_method = {}
-    crispr_fraction_per_method = {}
-    genome_lengths = {}
-    total_genome_length = 0
-
-    for genome in Genome.objects.all():
-        total_length = genome.sequences.aggregate(Sum('length'))['length__sum'] or 0
-        genome_lengths[genome.name] = total_length
-        total_genome_length += total_length
-
-    for method in methods:
-        repeats = Feature.objects.filter(
-            type='repeat_region',
-            repeat_methods__method=method
-        ).annotate(length=F('end') - F('start'))
-
-        repeats_set = set((r.sequence.contig, r.start, r.end) for r in repeats)
-        repeats_by_method[method] = repeats_set
-        counts_per_method[method] = len(repeats_set)
-
-        # Calculate average length and standard deviation
-        avg_length = repeats.aggregate(avg=Avg('length'))['avg']
-        std_dev = repeats.aggregate(std=StdDev('length'))['std']
-
-        avg_length_per_method[method] = round(avg_length, 2) if avg_length else 0
-        std_dev_per_method[method] = round(std_dev, 2) if std_dev else 0
-
-        # Calculate fraction of genome that is CRISPR
-        total_crispr_length = repeats.aggregate(Sum('length'))['length__sum'] or 0
-        crispr_fraction = (total_crispr_length / total_genome_length) if total_genome_length > 0 else 0
-        crispr_fraction_per_method[method] = crispr_fraction
-
-    total_repeats = len(set.union(*repeats_by_method.values())) if repeats_by_method else 0
-
-
-    def compute_overlap_matrix(min_overlap, percentage_overlap=None):
-        overlap_matrix = {}
-        for method1, method2 in combinations(methods, 2):
-            overlaps = 0
-            for repeat1 in repeats_by_method[method1]:
-                for repeat2 in repeats_by_method[method2]:
-                    if repeat1[0] != repeat2[0]:
-                        continue  # Different contigs
-                    overlap_start = max(repeat1[1], repeat2[1])
-                    overlap_end = min(repeat1[2], repeat2[2])
-                    overlap_length = overlap_end - overlap_start
-                    if percentage_overlap:
-                        repeat1_length = repeat1[2] - repeat1[1]
-                        repeat2_length = repeat2[2] - repeat2[1]
-                        if (overlap_length / repeat1_length >= percentage_overlap and 
-                            overlap_length / repeat2_length >= percentage_overlap):
-                            overlaps += 1
-                    elif overlap_length >= min_overlap:
-                        overlaps += 1
-            key = f"{method1}__{method2}"
-            overlap_matrix[key] = overlaps
-        return overlap_matrix
-
-    overlap_matrix_100nt = compute_overlap_matrix(100)
-    overlap_matrix_1nt = compute_overlap_matrix(1)
-    overlap_matrix_80percent = compute_overlap_matrix(1, 0.8)
-
-    genome_lengths = {}
-    for genome in Genome.objects.all():
-        total_length = genome.sequences.aggregate(Sum('length'))['length__sum'] or 0
-        genome_lengths[genome.name] = total_length
-
-    crisprs_per_1000nt = {}
-    for method in methods:
-        total_crisprs = 0
-        for genome_name, genome_length in genome_lengths.items():
-            crisprs_count = Feature.objects.filter(
-                type='repeat_region',
-                repeat_methods__method=method,
-                sequence__genome__name=genome_name
-            ).count()
-            total_crisprs += crisprs_count
-        
-        crisprs_per_1000nt[method] = (total_crisprs / total_genome_length) * 1000 if total_genome_length > 0 else 0
-
-
-    overlap_matrices = [
-        ('100nt', overlap_matrix_100nt, 'Overlap of Predictions between Methods (≥100 nt):'),
-        ('1nt', overlap_matrix_1nt, 'Overlap of Predictions between Methods (≥1 nt):'),
-        ('80percent', overlap_matrix_80percent, 'Overlap of Predictions between Methods (≥80% of sequence length):'),
-    ]
-
-    context = {
-        'methods': methods,
-        'counts_per_method': counts_per_method,
-        'avg_length_per_method': avg_length_per_method,
-        'std_dev_per_method': std_dev_per_method,
-        'total_repeats': total_repeats,
-        'overlap_matrices': overlap_matrices,
-        'crisprs_per_1000nt': crisprs_per_1000nt,
-        'crispr_fraction_per_method': crispr_fraction_per_method,
-    }
-
-    return render(request, 'viewer/evaluation.html', context)
-    def compute_overlap_matrix(min_overlap, percentage_overlap=None):
-        overlap_matrix = {}
-        for method1, method2 in combinations(methods, 2):
-            overlaps = 0
-            for repeat1 in repeats_by_method[method1]:
-                for repeat2 in repeats_by_method[method2]:
-                    if repeat1[0] != repeat2[0]:
-                        continue  # Different contigs
-                    overlap_start = max(repeat1[1], repeat2[1])
-                    overlap_end = min(repeat1[2], repeat2[2])
-                    overlap_length = overlap_end - overlap_start
-                    if percentage_overlap:
-                        repeat1_length = repeat1[2] - repeat1[1]
-                        repeat2_length = repeat2[2] - repeat2[1]
-                        if (overlap_length / repeat1_length >= percentage_overlap and 
-                            overlap_length / repeat2_length >= percentage_overlap):
-                            overlaps += 1
-                    elif overlap_length >= min_overlap:
-                        overlaps += 1
-            key = f"{method1}__{method2}"
-            overlap_matrix[key] = overlaps
-        return overlap_matrix
-
-    overlap_matrix_100nt = compute_overlap_matrix(100)
-    overlap_matrix_1nt = compute_overlap_matrix(1)
-    overlap_matrix_80percent = compute_overlap_matrix(1, 0.8)
-
-    overlap_matrices = [
-        ('100nt', overlap_matrix_100nt, 'Overlap of Predictions between Methods (≥100 nt):'),
-        ('1nt', overlap_matrix_1nt, 'Overlap of Predictions between Methods (≥1 nt):'),
-        ('80percent', overlap_matrix_80percent, 'Overlap of Predictions between Methods (≥80% of sequence length):'),
-    ]
-
-    context = {
-        'methods': methods,
-        'counts_per_method': counts_per_method,
-        'avg_length_per_method': avg_length_per_method,
-        'std_dev_per_method': std_dev_per_method,
-        'total_repeats': total_repeats,
-        'overlap_matrices': overlap_matrices,
-        'crisprs_per_1000nt': crisprs_per_1000nt,  # Add this line
-    }
-
-    return render(request, 'viewer/evaluation.html', context)
+    highlighted = region_data.highlighted_feature(sequence.id, region['position'])
 
-# View to handle AJAX requests for heatmap data
-def get_heatmap_data(request, contig_name):
-    sequence = get_object_or_404(Sequence, contig=contig_name)
+    context = region_data.viewer_context(
+        sequence, region, segment, available_data_sources, nucleotide_data, features_data,
+        all_features_data, interactions_data, heatmap_data, highlighted,
+    )
+    with span('viewer.render'):
+        return render(request, 'viewer/viewer.html', context)
+
+def feature_tracks(request, contig_name, key):
+    """
+    Returns the values of every data source over the feature_id feature,
+    under key in the JSON response.
+    """
+    sequence = region_data.get_sequence(contig_name)
     feature_id = request.GET.get('feature_id')
-    
+
     if not feature_id:
         return JsonResponse({'error': 'No feature selected'}, status=400)
-    
-    try:
-        feature = Feature.objects.get(id=feature_id)
-    except Feature.DoesNotExist:
+
+    feature = region_data.get_feature(feature_id)
+    if feature is None:
         return JsonResponse({'error': 'Feature not found'}, status=404)
-    
-    available_data_sources = list(sequence.nucleotide_data.values_list('data_source', flat=True).distinct())
-    heatmap_data = []
-    
-    for data_source in available_data_sources:
-        nucleotide_data_qs = NucleotideData.objects.filter(
-            sequence=sequence,
-            position__gte=feature.start,
-            position__lte=feature.end,
-            data_source=data_source
-        ).order_by('position')
-        
-        nucleotide_values = list(nucleotide_data_qs.values('position', 'value'))
-            
-        heatmap_data.append({
+
+    tracks = []
+    for data_source in region_data.data_sources(sequence.id):
+        tracks.append({
             'name': data_source,
-            'values': nucleotide_values
+            'values': region_data.track_values(sequence.id, data_source, feature.start, feature.end),
         })
-    
-    return JsonResponse({
-        'heatmap_data': heatmap_data,
-        'feature': {
-            'id': feature.id,
-            'start': feature.start,
-            'end': feature.end,
-            'type': feature.type,
-            'description': feature.attributes.get('product', '') if feature.attributes else '',
-        }
-    })
+    return JsonResponse({key: tracks, 'feature': region_data.feature_summary(feature)})
+
+# View to handle AJAX requests for heatmap data
+def get_heatmap_data(request, contig_name):
+    return feature_tracks(request, contig_name, 'heatmap_data')
 
 def get_feature_data(request, contig_name):
-    sequence = get_object_or_404(Sequence, contig=contig_name)
-    feature_id = request.GET.get('feature_id')
+    return feature_tracks(request, contig_name, 'feature_data')
 
-    if not feature_id:
-        return JsonResponse({'error': 'No feature selected'}, status=400)
 
+def get_contact_matrix(request, contig_name):
+    sequence = region_data.get_sequence(contig_name)
+    sequence_length = sequence.length
+
+    # Region defaults to the whole contig
     try:
-        feature = Feature.objects.get(id=feature_id)
-    except Feature.DoesNotExist:
-        return JsonResponse({'error': 'Feature not found'}, status=404)
+        start = max(int(request.GET.get('start', 1)), 1)
+        end = min(int(request.GET.get('end', sequence_length)), sequence_length)
+        max_bins = max(1, min(int(request.GET.get('max_bins', 500)), 2000))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid region'}, status=400)
 
-    available_data_sources = list(sequence.nucleotide_data.values_list('data_source', flat=True).distinct())
-    feature_data = []
+    if end < start:
+        return JsonResponse({'error': 'Invalid region'}, status=400)
 
-    for data_source in available_data_sources:
-        nucleotide_data_qs = NucleotideData.objects.filter(
-            sequence=sequence,
-            position__gte=feature.start,
-            position__lte=feature.end,
-            data_source=data_source
-        ).order_by('position')
+    from . import interaction_store
 
-        nucleotide_values = list(nucleotide_data_qs.values('position', 'value'))
+    # Pick the finest resolution that fits the region into max_bins bins
+    bin_size = interaction_store.choose_bin_size(start, end, max_bins)
+    matrix = interaction_store.query_contact_matrix(sequence.id, sequence.id, start, end, bin_size)
 
-        feature_data.append({
-            'name': data_source,
-            'values': nucleotide_values
-        })
+    if matrix is not None:
+        rows, cols, values = (part.tolist() for part in matrix)
+    else:
+        # Aggregate from the Interaction table if the store has not been built
+        first_bin = (start - 1) // bin_size
+        last_bin = (end - 1) // bin_size
+        binned = Interaction.objects.filter(
+            from_sequence=sequence,
+            to_sequence=sequence,
+        ).annotate(
+            row=(F('from_position') - 1) / bin_size,
+            col=(F('to_position') - 1) / bin_size,
+        ).filter(
+            row__gte=first_bin, row__lte=last_bin,
+            col__gte=first_bin, col__lte=last_bin,
+        ).values('row', 'col').annotate(value=Sum('weight')).order_by('row', 'col')
+        rows, cols, values = [], [], []
+        for entry in binned:
+            rows.append(entry['row'])
+            cols.append(entry['col'])
+            values.append(entry['value'])
 
     return JsonResponse({
-        'feature_data': feature_data,
-        'feature': {
-            'id': feature.id,
-            'start': feature.start,
-            'end': feature.end,
-            'type': feature.type,
-            'description': feature.attributes.get('product', '') if feature.attributes else '',
-        }
+        'contig': contig_name,
+        'start': start,
+        'end': end,
+        'bin_size': bin_size,
+        'rows': rows,
+        'cols': cols,
+        'values': [round(value, 6) for value in values],
     })
 
-
 def search_features(request, contig_name):
     sequence = get_object_or_404(Sequence, contig=contig_name)
     query = request.GET.get('q', '').strip()
     
     if not query:
         return JsonResponse({'features': []})
+    if len(query) < search.GRAM_SIZE:
+        return JsonResponse({'error': f'Query must be at least {search.GRAM_SIZE} characters'}, status=400)
     
-    # Search features by type or description (attributes->'product')
-    features = Feature.objects.filter(sequence=sequence).filter(
-        Q(type__icontains=query) |
-        Q(attributes__product__icontains=query)
-    ).values('id', 'type', 'start', 'end', 'attributes')[:100]  # Limit results for performance
+    # Search the trigram index by type, product, gene, Name and locus_tag
+    features_list, next_cursor = search.search_features(
+        query,
+        genome_id=sequence.genome_id,
+        sequence_id=sequence.id,
+        after=request.GET.get('after'),
+        limit=parse_limit(request.GET.get('limit')),
+    )
     
-    features_list = []
-    for feature in features:
-        attributes = feature['attributes'] or {}
-        features_list.append({
-            'id': feature['id'],
-            'type': feature['type'],
-            'start': feature['start'],
-            'end': feature['end'],
-            'description': attributes.get('product', ''),
+    return JsonResponse({'features': features_list, 'next': next_cursor})
+
+def search_features_global(request):
+    query = request.GET.get('q', '').strip()
+
+    if not query:
+        return JsonResponse({'features': []})
+    if len(query) < search.GRAM_SIZE:
+        return JsonResponse({'error': f'Query must be at least {search.GRAM_SIZE} characters'}, status=400)
+
+    # Narrow the scope to a genome and/or contig if requested
+    genome_id = None
+    sequence_id = None
+    genome_name = request.GET.get('genome')
+    contig_name = request.GET.get('contig')
+    if contig_name:
+        sequence = get_object_or_404(Sequence.objects.only('id', 'genome_id'), contig=contig_name)
+        genome_id, sequence_id = sequence.genome_id, sequence.id
+    elif genome_name:
+        genome_id = get_object_or_404(Genome.objects.only('id'), name=genome_name).id
+
+    features_list, next_cursor = search.search_features(
+        query,
+        genome_id=genome_id,
+        sequence_id=sequence_id,
+        after=request.GET.get('after'),
+        limit=parse_limit(request.GET.get('limit')),
+    )
+
+    return JsonResponse({'features': features_list, 'next': next_cursor})
+
+def search_sequence(request):
+    from . import sequence_index  # Pulls in numpy; only needed for sequence searches
+
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'hits': []})
+    if len(query) > settings.SEQUENCE_SEARCH_MAX_LENGTH:
+        return JsonResponse(
+            {'error': f'Queries may be at most {settings.SEQUENCE_SEARCH_MAX_LENGTH} bases long'}, status=400
+        )
+    if not sequence_index.exists():
+        return JsonResponse({'error': 'The sequence index has not been built'}, status=503)
+
+    try:
+        mismatches = int(request.GET.get('mismatches', 0))
+    except ValueError:
+        mismatches = -1
+    if not 0 <= mismatches <= settings.SEQUENCE_SEARCH_MAX_MISMATCHES:
+        return JsonResponse(
+            {'error': f'mismatches must be between 0 and {settings.SEQUENCE_SEARCH_MAX_MISMATCHES}'}, status=400
+        )
+
+    strand = request.GET.get('strand', 'both')
+    if strand not in ('both', '+', '-'):
+        return JsonResponse({'error': 'strand must be both, + or -'}, status=400)
+
+    try:
+        with span('search.sequence'):
+            hits, truncated = sequence_index.search(
+                query, mismatches=mismatches, strand=strand, limit=parse_limit(request.GET.get('limit'))
+            )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    contigs = dict(
+        Sequence.objects.filter(id__in={hit['sequence_id'] for hit in hits}).values_list('id', 'contig')
+    )
+    results = []
+    for hit in hits:
+        contig = contigs.get(hit['sequence_id'])
+        if contig is None:  # Deleted since the index was built
+            continue
+        window_start = max(hit['start'] - 2500, 0)
+        results.append({
+            'contig': contig,
+            'start': hit['start'],
+            'end': hit['end'],
+            'strand': hit['strand'],
+            'mismatches': hit['mismatches'],
+            'url': reverse('viewer', args=[contig]) + '?' + urlencode({
+                'start': window_start,
+                'end': window_start + 5000,
+                'highlighted_start': hit['start'],
+                'highlighted_end': hit['end'],
+            }),
         })
-    
-    return JsonResponse({'features': features_list})
+
+    return JsonResponse({'hits': results, 'truncated': truncated})
+
+def parse_limit(value, default=search.DEFAULT_LIMIT, maximum=500):
+    try:
+        return max(1, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return default
 
 def feature_info(request, contig_name):
     sequence = get_object_or_404(Sequence, contig=contig_name)
@@ -630,11 +314,176 @@ def feature_info(request, contig_name):
         'type': feature.type,
         'start': feature.start,
         'end': feature.end,
-        'description': feature.attributes.get('product', '') if feature.attributes else '',
+        'description': feature.product,
     }
     
     return JsonResponse({'feature': feature_data})
 
+def export_region(request):
+    """
+    Parses optional 0-based half-open start and end query parameters.
+    """
+    start = request.GET.get('start')
+    end = request.GET.get('end')
+    start = int(start) if start else None
+    end = int(end) if end else None
+    if start is not None and end is not None and end < start:
+        raise ValueError('end is before start')
+    return start, end
+
+def streaming_export(lines, filename, content_type='text/plain'):
+    response = StreamingHttpResponse(lines, content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def export_fasta(request, contig_name):
+    sequence = get_object_or_404(Sequence.objects.only('id', 'contig'), contig=contig_name)
+    try:
+        start, end = export_region(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid region'}, status=400)
+
+    sequences = export.sequences_for(contig=contig_name)
+    return streaming_export(export.fasta(sequences, start, end), f'{sequence.contig}.fasta')
+
+def export_features(request, contig_name, file_format):
+    sequence = get_object_or_404(Sequence.objects.only('id', 'contig'), contig=contig_name)
+    if file_format not in export.FEATURE_FORMATS:
+        return JsonResponse({'error': f'Unknown format {file_format}'}, status=404)
+    try:
+        start, end = export_region(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid region'}, status=400)
+
+    features = export.features_for(contig=sequence.contig, start=start, end=end,
+                                    types=request.GET.getlist('type'))
+    lines = export.gff3(features) if file_format == 'gff3' else export.bed(features)
+    return streaming_export(lines, f'{sequence.contig}.{file_format}')
+
+def export_bedgraph(request, contig_name):
+    sequence = get_object_or_404(Sequence.objects.only('id', 'contig'), contig=contig_name)
+    data_source = request.GET.get('data_source')
+    if not data_source:
+        return JsonResponse({'error': 'No data source given'}, status=400)
+    try:
+        start, end = export_region(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid region'}, status=400)
+
+    lines = export.bedgraph(sequence, data_source, start, end)
+    return streaming_export(lines, f'{sequence.contig}.{data_source}.bedgraph')
+
+def export_repeat_regions(request):
+    genome = request.GET.get('genome') or None
+    method = request.GET.get('method') or None
+    file_format = request.GET.get('format', 'fasta')
+    if genome is None and method is None:
+        return JsonResponse({'error': 'Give a genome and/or method'}, status=400)
+    if file_format not in export.REPEAT_FORMATS:
+        return JsonResponse({'error': f'format must be one of {", ".join(export.REPEAT_FORMATS)}'}, status=400)
+    try:
+        flank = max(int(request.GET.get('flank', 0)), 0)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid flank'}, status=400)
+
+    features = export.repeat_regions_for(genome=genome, method=method)
+    if file_format == 'fasta':
+        lines = export.repeat_region_fasta(features, flank)
+    else:
+        lines = export.gff3(features) if file_format == 'gff3' else export.bed(features)
+    name = '_'.join(part for part in (genome, method) if part)
+    return streaming_export(lines, f'repeat_regions_{name}.{file_format}')
+
+def batch_regions(request):
+    """
+    Sequence, features and tracks of many regions in one response. Regions
+    are given as region=contig:start-end (0-based, half-open), or selected
+    as the repeat_region features of a genome and/or method with flank bases
+    either side, the windows the index page links to.
+    """
+    limit = settings.BATCH_REGION_LIMIT
+    region_params = request.GET.getlist('region')
+    genome = request.GET.get('genome') or None
+    method = request.GET.get('method') or None
+
+    regions = []
+    if region_params:
+        parsed = []
+        for value in region_params:
+            contig, _, window = value.rpartition(':')
+            try:
+                start, end = (int(part) for part in window.split('-'))
+            except ValueError:
+                return JsonResponse({'error': f'Invalid region {value}'}, status=400)
+            if not contig or start < 0 or end < start:
+                return JsonResponse({'error': f'Invalid region {value}'}, status=400)
+            parsed.append((contig, start, end))
+        if len(parsed) > limit:
+            return JsonResponse({'error': f'At most {limit} regions can be fetched at once'}, status=400)
+
+        sequences = {
+            sequence.contig: sequence
+            for sequence in Sequence.objects.filter(contig__in={contig for contig, _, _ in parsed}).only('id', 'contig')
+        }
+        missing = sorted({contig for contig, _, _ in parsed} - set(sequences))
+        if missing:
+            return JsonResponse({'error': f'Contigs not found: {", ".join(missing)}'}, status=404)
+        regions = [{'sequence': sequences[contig], 'start': start, 'end': end} for contig, start, end in parsed]
+    elif genome is not None or method is not None:
+        try:
+            flank = max(int(request.GET.get('flank', 500)), 0)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid flank'}, status=400)
+        features = list(
+            export.repeat_regions_for(genome=genome, method=method)
+            .select_related('sequence').only('id', 'start', 'end', 'sequence__id', 'sequence__contig')[:limit + 1]
+        )
+        if len(features) > limit:
+            return JsonResponse({'error': f'More than {limit} repeat regions match; narrow the selection'}, status=400)
+        regions = [
+            {'sequence': feature.sequence, 'start': max(feature.start - flank, 0), 'end': feature.end + flank,
+             'feature_id': feature.id}
+            for feature in features
+        ]
+    else:
+        return JsonResponse({'error': 'Give region parameters, or a genome and/or method'}, status=400)
+
+    if sum(region['end'] - region['start'] for region in regions) > settings.BATCH_REGION_MAX_BASES:
+        return JsonResponse(
+            {'error': f'At most {settings.BATCH_REGION_MAX_BASES} bases can be fetched at once'}, status=400
+        )
+
+    data_sources = request.GET.getlist('track') or None
+    results, spans = region_data.batch_regions(regions, data_sources, gap=settings.BATCH_REGION_MERGE_GAP)
+    for region, result in zip(regions, results):
+        if 'feature_id' in region:
+            result['feature_id'] = region['feature_id']
+    return JsonResponse({'regions': results, 'spans_read': spans})
+
+def jobs_status(request):
+    """
+    Status, progress and throughput of the running and the latest other
+    background jobs. Staff only, since jobs carry server paths, worker
+    hosts and tracebacks.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+
+    limit = parse_limit(request.GET.get('limit'), default=50)
+    job_list = Job.objects.all()
+    if request.GET.get('status'):
+        job_list = job_list.filter(status=request.GET['status'])
+    running = list(job_list.filter(status=Job.RUNNING).order_by('started_at'))
+    others = list(job_list.exclude(status=Job.RUNNING).order_by('-created_at', '-id')[:limit])
+    now = timezone.now()
+    return JsonResponse({
+        'jobs': [jobs.job_summary(job, now) for job in running + others],
+        'queued': Job.objects.filter(status=Job.QUEUED).count(),
+    })
+
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def about(request):
     return render(request, 'viewer/about.html')
 